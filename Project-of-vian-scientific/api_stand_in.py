@@ -0,0 +1,902 @@
+#!/usr/bin/env python3
+"""
+Local API Stand-In for Vian Scientific Platform
+In-memory HTTP server that mimics the backend endpoints exercised by the test suites
+"""
+
+import base64
+import json
+import mimetypes
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from audit_store import PartitionedAuditStore
+from audit_writer import AuditWriter
+from http_compression import COMPRESSION_MIN_BYTES, StreamCompressor, compress, negotiate
+from password_hashing import HashingPool, PasswordHasher, calibrate
+from principal_cache import PRINCIPAL_TTL, PrincipalCache
+from query_profiler import QueryProfiler
+from rate_limiter import RATE_LIMIT_ATTEMPTS, RATE_LIMIT_IP_ATTEMPTS, RateLimiter
+
+ADMIN_EMAIL = "vrventures.333@gmail.com"
+ADMIN_PASSWORD = "Admin@123"
+API_PREFIX = "/api"
+
+CATEGORIES = [
+    ("analytical-vials", "Analytical Vials & Closures"),
+    ("syringe-filters", "Syringe Filters"),
+    ("hplc-accessories", "HPLC Accessories"),
+    ("gc-accessories", "GC Accessories"),
+    ("dissolution-accessories", "Dissolution Accessories"),
+    ("weighing-accessories", "Weighing Accessories"),
+    ("cleaning-validation-plates", "Cleaning Validation Plates"),
+    ("ftir-accessories", "FTIR Accessories"),
+]
+PRODUCTS_PER_CATEGORY = 4
+HASH_COST = 0.005  # Seconds per password verification; real PBKDF2 is calibrated to it
+NDJSON_BATCH = 500  # List items per chunk when streaming NDJSON
+MAX_PAGE_SIZE = 500
+MAX_BULK_PRODUCTS = 1000  # Products per bulk upsert request
+MAX_BULK_DELETE = 1000  # Ids per bulk delete request
+PAGE_SORT = {"created_at": 1, "id": 1}  # Keyset order of paginated lists
+AUDIT_CLOSE_TIMEOUT = 5.0  # Seconds stop() waits for queued audit entries; the rest stay in the spool
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@lru_cache(maxsize=None)
+def stand_in_hasher(hash_cost: float) -> PasswordHasher:
+    """A PBKDF2 hasher whose verification takes about hash_cost seconds on this machine"""
+    if hash_cost <= 0:
+        return PasswordHasher(iterations=1)
+    return PasswordHasher(iterations=calibrate(hash_cost * 1000)["iterations"])
+
+
+def is_strong_password(password: str) -> bool:
+    return (len(password) >= 8 and any(c.isdigit() for c in password)
+            and any(c.isalpha() for c in password))
+
+
+class APIError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class StandInStore:
+    """All API state, guarded by one lock"""
+
+    def __init__(self, products_per_category: int = PRODUCTS_PER_CATEGORY,
+                 rate_limit_attempts: int = RATE_LIMIT_ATTEMPTS, audit_insert_cost: float = 0.0,
+                 audit_retention_days: Optional[int] = None, audit_archive_dir: Optional[str] = None,
+                 hasher: Optional[PasswordHasher] = None, principal_ttl: float = PRINCIPAL_TTL,
+                 limiter: Optional[RateLimiter] = None):
+        self.lock = threading.RLock()
+        self.hasher = hasher or stand_in_hasher(HASH_COST)
+        self.principals = PrincipalCache(principal_ttl)
+        self.user_reads = 0  # User documents loaded to authenticate a request
+        self.profiler: Optional[QueryProfiler] = None
+        self.limiter = limiter or RateLimiter(rate_limit_attempts)
+        self.audit_insert_cost = audit_insert_cost  # Seconds per audit insert, standing in for a database round-trip
+        self.audit_writer: Optional[AuditWriter] = None
+        self.request_audit = threading.local()  # Inline-mode entries of the current request, inserted after it
+        self.audit_inserts = 0  # Sink calls, i.e. database round-trips for audit entries
+        self.audit_retention_day = None  # Retention runs on the first insert of each day
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.tokens: Dict[str, str] = {}
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self.quotes: Dict[str, Dict[str, Any]] = {}
+        self.content: Dict[str, Dict[str, Any]] = {}
+        self.audit_logs = PartitionedAuditStore(audit_retention_days, audit_archive_dir)
+        self.reset_codes: Dict[str, Tuple[str, float]] = {}  # email -> (code hash, expiry)
+        self.outbox: List[Dict[str, str]] = []  # Reset emails the backend would have sent
+        # Seed ids are derived from natural keys so every stand-in instance has the same catalog
+        self.categories = [
+            {"id": str(uuid.uuid5(uuid.NAMESPACE_URL, slug)), "slug": slug, "name": name, "description": f"{name} for laboratories"}
+            for slug, name in CATEGORIES
+        ]
+
+        self.create_user(ADMIN_EMAIL, self.hasher.hash(ADMIN_PASSWORD), "Vian Admin", "admin")
+        for slug, name in CATEGORIES:
+            for i in range(1, products_per_category + 1):
+                self.create_product({
+                    "cat_no": f"VN-{slug[:4].upper()}-{i:03d}",
+                    "product_name": f"{name} Item {i}",
+                    "description": f"{name} item {i}, vial compatible",
+                    "category": slug,
+                    "pack_size": "100",
+                    "hsn_code": "90279090",
+                }, seeded=True)
+
+    def create_user(self, email: str, password_hash: str, full_name: str, role: str = "user") -> Dict[str, Any]:
+        user = {"id": str(uuid.uuid4()), "email": email, "password_hash": password_hash, "full_name": full_name,
+                "role": role, "is_active": True, "created_at": now_iso()}
+        self.users[user["id"]] = user
+        return user
+
+    def create_product(self, data: Dict[str, Any], seeded: bool = False) -> Dict[str, Any]:
+        product = dict(data)
+        product["id"] = str(uuid.uuid5(uuid.NAMESPACE_URL, data["cat_no"]) if seeded else uuid.uuid4())
+        product["created_at"] = now_iso()
+        self.products[product["id"]] = product
+        return product
+
+    def profile(self, collection: str, filter: Dict[str, Any], returned: int, started: float,
+                sort: Optional[Dict[str, int]] = None):
+        """Record the query the backend would send for this lookup, when profiling is on"""
+        if self.profiler:
+            size = len(self.categories if collection == "categories" else getattr(self, collection))
+            self.profiler.record(collection, filter, size, returned, (time.perf_counter() - started) * 1000, sort)
+
+    def load_principal(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a user for authentication; the stand-in's equivalent of a database read"""
+        started = time.perf_counter()
+        self.user_reads += 1
+        user = self.users.get(user_id)
+        self.profile("users", {"id": user_id}, int(user is not None), started)
+        return public_user(user) if user else None
+
+    def find_user(self, email: str) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        user = next((u for u in self.users.values() if u["email"] == email), None)
+        self.profile("users", {"email": email}, int(user is not None), started)
+        return user
+
+    def log_audit(self, action: str, user_email: str, resource: str, details: str = ""):
+        entry = {"id": str(uuid.uuid4()), "action": action, "user_email": user_email,
+                 "resource": resource, "details": details, "timestamp": now_iso()}
+        if self.audit_writer:
+            self.audit_writer.append(entry)
+        elif getattr(self.request_audit, "entries", None) is not None:
+            self.request_audit.entries.append(entry)
+        else:
+            self.insert_audit_batch([entry])
+
+    @contextmanager
+    def deferred_audit(self):
+        """Insert a request's inline audit entries once its handler has released the store lock
+
+        A backend awaits each insert without holding up other requests, so the round-trip must
+        not be paid under the lock that serialises the stand-in's handlers.
+        """
+        self.request_audit.entries = []
+        try:
+            yield
+        finally:
+            entries, self.request_audit.entries = self.request_audit.entries, None
+            for entry in entries:
+                self.insert_audit_batch([entry])
+
+    def insert_audit_batch(self, entries: List[Dict[str, Any]]):
+        """Audit sink: one round-trip per call; ids already stored (spool replays) are skipped"""
+        time.sleep(self.audit_insert_cost)
+        with self.lock:
+            self.audit_inserts += 1
+            self.audit_logs.insert(entries)
+            today = now_iso()[:10]
+            if today != self.audit_retention_day:
+                self.audit_retention_day = today
+                self.audit_logs.enforce_retention()
+
+
+def encode_cursor(item: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps([item["created_at"], item["id"]]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return created_at, item_id
+    except (ValueError, TypeError):
+        raise APIError(400, "Invalid cursor")
+
+
+def paginate(items: List[Dict[str, Any]], query: Dict[str, str]) -> Tuple[int, List[Dict[str, Any]], Dict[str, str]]:
+    """Keyset pagination on (created_at, id), opted into with ?limit=
+
+    Pages are stable while items are inserted or deleted: the cursor is the last key seen, not an
+    offset. The next cursor and, with include_total=true, the total count travel in headers so the
+    body stays a plain array. Without limit the full list is returned as before.
+    """
+    if "limit" not in query:
+        return 200, items, {}
+    try:
+        limit = int(query["limit"])
+    except ValueError:
+        raise APIError(400, "Invalid limit")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise APIError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    headers = {"X-Pagination": "cursor"}  # Tells clients limit was honoured and cursors follow
+    if query.get("include_total") == "true":
+        headers["X-Total-Count"] = str(len(items))
+    ordered = sorted(items, key=lambda item: (item["created_at"], item["id"]))
+    if query.get("cursor"):
+        after = decode_cursor(query["cursor"])
+        ordered = [item for item in ordered if (item["created_at"], item["id"]) > after]
+    page = ordered[:limit]
+    if len(ordered) > limit:
+        headers["X-Next-Cursor"] = encode_cursor(page[-1])
+    return 200, page, headers
+
+
+def public_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in user.items() if k != "password_hash"}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Route /api requests to handler methods on the stand-in server"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body are separate writes; Nagle would hold the body for a delayed ACK
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        encoding = negotiate(self.headers.get("Accept-Encoding", "")) if len(body) >= COMPRESSION_MIN_BYTES else None
+        if encoding:
+            body = compress(body, encoding)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_ndjson(self, items: List[Any], headers: Optional[Dict[str, str]] = None):
+        """Stream a list as newline-delimited JSON in chunked batches, never serialising it whole"""
+        # The total size is unknown up front, so any accepted encoding is used
+        encoding = negotiate(self.headers.get("Accept-Encoding", ""))
+        compressor = StreamCompressor(encoding) if encoding else None
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(items), NDJSON_BATCH):
+            chunk = "".join(json.dumps(item) + "\n" for item in items[start:start + NDJSON_BATCH]).encode("utf-8")
+            self.write_chunk(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            self.write_chunk(compressor.finish())
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_bytes(self, data: bytes, headers: Dict[str, str]):
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def dispatch(self, method: str):
+        server = self.server
+        with server.stats_lock:
+            server.request_count += 1
+        if server.latency:
+            time.sleep(server.latency)
+
+        parsed = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX) else parsed.path
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        try:
+            body = json.loads(raw) if raw else {}
+            if server.store.limiter.applies(method, path):
+                # Rejected before the store lock or any password work, so a 429 stays cheap
+                retry_after = server.store.limiter.check(path, self.client_ip(), str(body.get("email", "")))
+                if retry_after is not None:
+                    self.send_json(429, {"detail": "Too many attempts"}, {"Retry-After": str(retry_after)})
+                    return
+            for route_method, pattern, handler in ROUTES:
+                match = pattern.fullmatch(path.rstrip("/") or "/")
+                if route_method == method and match:
+                    with server.store.deferred_audit():
+                        with nullcontext() if handler in SELF_LOCKING_HANDLERS else server.store.lock:
+                            status, payload, *extra = handler(self, server.store, body, query, *match.groups())
+                    headers = extra[0] if extra else None
+                    if headers and not server.cursor_pagination:
+                        # Like a backend that applies limit but has no cursors: the rest of the list is unreachable
+                        headers = {k: v for k, v in headers.items() if k not in ("X-Pagination", "X-Next-Cursor", "X-Total-Count")}
+                    if isinstance(payload, bytes):
+                        self.send_bytes(payload, headers or {})
+                    elif status == 200 and isinstance(payload, list) and "application/x-ndjson" in self.headers.get("Accept", ""):
+                        self.send_ndjson(payload, headers)
+                    else:
+                        self.send_json(status, payload, headers)
+                    return
+            raise APIError(404, "Not Found")
+        except APIError as e:
+            self.send_json(e.status, {"detail": e.detail})
+        except ValueError:
+            self.send_json(422, {"detail": "Invalid JSON body"})
+
+    def client_ip(self) -> str:
+        if self.server.trust_forwarded_for and self.headers.get("X-Forwarded-For"):
+            # Behind a load balancer the client is the first hop it recorded
+            return self.headers["X-Forwarded-For"].split(",")[0].strip()
+        return self.client_address[0]
+
+    def current_user(self, store: StandInStore, required: bool = True) -> Optional[Dict[str, Any]]:
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer "):
+            if required:
+                raise APIError(403, "Not authenticated")
+            return None
+        token = authorization[7:]
+        user_id = store.tokens.get(token)
+        user = store.principals.resolve(token, user_id, store.load_principal) if user_id else None
+        if not user:
+            raise APIError(401, "Invalid authentication credentials")
+        if not user["is_active"]:
+            raise APIError(403, "Account is disabled")
+        return user
+
+    def admin_user(self, store: StandInStore) -> Dict[str, Any]:
+        user = self.current_user(store)
+        if user["role"] != "admin":
+            raise APIError(403, "Admin access required")
+        return user
+
+    # Authentication
+
+    def root(self, store, body, query):
+        return 200, {"message": "Vian Scientific API"}
+
+    # The password handlers lock the store themselves and hash on the server's pool in between,
+    # so a burst of logins never holds up unrelated requests
+
+    def register(self, store, body, query):
+        with store.lock:
+            if store.find_user(body.get("email", "")):
+                raise APIError(400, "Email already registered")
+        if not is_strong_password(body.get("password", "")):
+            raise APIError(400, "Password is too weak")
+        password_hash = self.server.hashing.hash(body["password"])
+        with store.lock:
+            if store.find_user(body["email"]):
+                raise APIError(400, "Email already registered")
+            user = store.create_user(body["email"], password_hash, body.get("full_name", ""))
+        if self.server.mailer:
+            self.server.mailer.send_welcome_email(user["email"], user["full_name"])  # Queued; SMTP runs after we reply
+        return 200, public_user(user)
+
+    def login(self, store, body, query):
+        with store.lock:
+            user = store.find_user(body.get("email", ""))
+            stored = user["password_hash"] if user else None
+        # An unknown email is checked against a dummy hash, so it costs as much as a wrong password
+        valid, new_hash = self.server.hashing.verify_and_update(str(body.get("password", "")), stored)
+        with store.lock:
+            if not valid:
+                store.log_audit("LOGIN_FAILED", body.get("email", ""), "auth")
+                raise APIError(401, "Invalid email or password")
+            if not user["is_active"]:
+                raise APIError(403, "Account is disabled")
+            if new_hash and user["password_hash"] == stored:
+                user["password_hash"] = new_hash  # Upgraded to the current work factor
+            token = uuid.uuid4().hex
+            store.tokens[token] = user["id"]
+            store.log_audit("LOGIN_SUCCESS", user["email"], "auth")
+            return 200, {"access_token": token, "token_type": "bearer", "user": public_user(user)}
+
+    def me(self, store, body, query):
+        return 200, public_user(self.current_user(store))
+
+    def forgot_password(self, store, body, query):
+        with store.lock:
+            user = store.find_user(body.get("email", ""))
+        # Only a real account's code is hashed: hashing for unknown emails would let anyone burn
+        # CPU with made-up addresses. The IP limit bounds how fast existence can be probed.
+        if user:
+            code = f"{secrets.randbelow(1000000):06d}"
+            code_hash = self.server.hashing.hash(code)  # Stored hashed like a password
+            with store.lock:
+                store.reset_codes[body["email"]] = (code_hash, time.time() + 1800)
+                store.outbox.append({"to": body["email"], "reset_code": code})
+            if self.server.mailer:
+                self.server.mailer.send_password_reset_email(user["email"], user["full_name"], code)
+        return 200, {"message": "If the email exists, a reset code has been sent"}
+
+    def reset_password(self, store, body, query):
+        with store.lock:
+            issued = store.reset_codes.get(body.get("email", ""))
+        code_hash, expires = issued or (None, 0)
+        if not self.server.hashing.verify_and_update(str(body.get("reset_code", "")), code_hash)[0]:
+            raise APIError(400, "Invalid reset code")
+        if time.time() > expires:
+            raise APIError(400, "Reset code expired")
+        password_hash = self.server.hashing.hash(body["new_password"])
+        with store.lock:
+            # The code is single use: a concurrent reset with the same code may have consumed it
+            if store.reset_codes.get(body["email"]) != issued:
+                raise APIError(400, "Invalid reset code")
+            user = store.find_user(body["email"])
+            user["password_hash"] = password_hash
+            store.principals.invalidate_user(user["id"])
+            del store.reset_codes[body["email"]]
+            return 200, {"message": "Password reset successfully"}
+
+    def change_password(self, store, body, query):
+        with store.lock:
+            user = store.users[self.current_user(store)["id"]]
+            stored = user["password_hash"]
+        if not self.server.hashing.verify_and_update(str(body.get("current_password", "")), stored)[0]:
+            raise APIError(400, "Current password is incorrect")
+        password_hash = self.server.hashing.hash(body["new_password"])
+        with store.lock:
+            user["password_hash"] = password_hash
+            store.principals.invalidate_user(user["id"])
+            return 200, {"message": "Password changed successfully"}
+
+    # Catalog
+
+    def list_products(self, store, body, query):
+        started = time.perf_counter()
+        products = list(store.products.values())
+        filter = {}
+        if query.get("category"):
+            products = [p for p in products if p.get("category") == query["category"]]
+            filter["category"] = query["category"]
+        if query.get("search"):
+            term = query["search"].lower()
+            products = [p for p in products if any(term in str(p.get(field, "")).lower()
+                                                   for field in ("product_name", "description", "cat_no"))]
+            filter["$or"] = [{field: {"$regex": re.escape(term), "$options": "i"}}
+                             for field in ("product_name", "description", "cat_no")]
+        status, page, headers = paginate(products, query)
+        store.profile("products", filter, len(page), started, PAGE_SORT if "limit" in query else None)
+        return status, page, headers
+
+    def get_product(self, store, body, query, product_id):
+        started = time.perf_counter()
+        product = store.products.get(product_id)
+        store.profile("products", {"id": product_id}, int(product is not None), started)
+        if not product:
+            raise APIError(404, "Product not found")
+        return 200, product
+
+    def create_product(self, store, body, query):
+        admin = self.admin_user(store)
+        product = store.create_product(body)
+        store.log_audit("PRODUCT_CREATED", admin["email"], "product", product["id"])
+        return 200, product
+
+    def update_product(self, store, body, query, product_id):
+        admin = self.admin_user(store)
+        if product_id not in store.products:
+            raise APIError(404, "Product not found")
+        store.products[product_id].update(body)
+        store.log_audit("PRODUCT_UPDATED", admin["email"], "product", product_id)
+        return 200, store.products[product_id]
+
+    def bulk_upsert_products(self, store, body, query):
+        """Create or update products matched by cat_no, as one write per batch"""
+        admin = self.admin_user(store)
+        items = body.get("products")
+        if not isinstance(items, list) or not items:
+            raise APIError(422, "products must be a non-empty list")
+        if len(items) > MAX_BULK_PRODUCTS:
+            raise APIError(413, f"At most {MAX_BULK_PRODUCTS} products per request")
+        if not all(isinstance(item, dict) and item.get("cat_no") for item in items):
+            raise APIError(422, "Every product needs a cat_no")
+        by_cat_no = {p.get("cat_no"): p for p in store.products.values()}
+        created = updated = 0
+        for item in items:
+            existing = by_cat_no.get(item["cat_no"])
+            if existing:
+                existing.update(item)
+                updated += 1
+            else:
+                by_cat_no[item["cat_no"]] = store.create_product(item)
+                created += 1
+        store.log_audit("PRODUCTS_BULK_UPSERTED", admin["email"], "product", f"{created} created, {updated} updated")
+        return 200, {"created": created, "updated": updated}
+
+    def delete_product(self, store, body, query, product_id):
+        admin = self.admin_user(store)
+        if store.products.pop(product_id, None) is None:
+            raise APIError(404, "Product not found")
+        store.log_audit("PRODUCT_DELETED", admin["email"], "product", product_id)
+        return 200, {"message": "Product deleted"}
+
+    def bulk_delete(self, store, body, query, collection):
+        """Delete many records by id in one call; ids that are already gone count as missing"""
+        admin = self.admin_user(store)
+        ids = body.get("ids")
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            raise APIError(400, "ids must be a non-empty list of strings")
+        if len(ids) > MAX_BULK_DELETE:
+            raise APIError(400, f"At most {MAX_BULK_DELETE} ids per request")
+        records = getattr(store, collection)
+        deleted, skipped = [], 0
+        for record_id in dict.fromkeys(ids):
+            if collection == "users" and record_id == admin["id"]:
+                skipped += 1  # Never the account doing the deleting
+            elif records.pop(record_id, None) is not None:
+                deleted.append(record_id)
+        if collection == "users" and deleted:
+            gone = set(deleted)
+            store.tokens = {t: uid for t, uid in store.tokens.items() if uid not in gone}
+            for user_id in deleted:
+                store.principals.invalidate_user(user_id)
+        store.log_audit("BULK_DELETED", admin["email"], collection, f"{len(deleted)} deleted")
+        return 200, {"deleted": len(deleted), "missing": len(set(ids)) - len(deleted) - skipped, "skipped": skipped}
+
+    def list_categories(self, store, body, query):
+        return 200, store.categories
+
+    def get_category(self, store, body, query, slug):
+        started = time.perf_counter()
+        category = next((c for c in store.categories if c["slug"] == slug), None)
+        store.profile("categories", {"slug": slug}, int(category is not None), started)
+        if not category:
+            raise APIError(404, "Category not found")
+        return 200, category
+
+    def media(self, store, body, query, path):
+        """Files from the thumbnail cache directory; objects are content-addressed, so cache them forever"""
+        media_dir = self.server.media_dir
+        if not media_dir:
+            raise APIError(404, "Not Found")
+        root = os.path.realpath(media_dir)
+        full_path = os.path.realpath(os.path.join(root, path))
+        if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+            raise APIError(404, "Not Found")
+        with open(full_path, "rb") as f:
+            data = f.read()
+        return 200, data, {"Content-Type": mimetypes.guess_type(full_path)[0] or "application/octet-stream",
+                           "Cache-Control": "public, max-age=31536000, immutable"}
+
+    # Quotes
+
+    def create_quote(self, store, body, query):
+        user = self.current_user(store)
+        quote = {"id": str(uuid.uuid4()), "user_id": user["id"], "user_email": user["email"],
+                 "items": body.get("items", []), "message": body.get("message", ""),
+                 "status": "pending", "created_at": now_iso()}
+        store.quotes[quote["id"]] = quote
+        return 200, quote
+
+    def my_quotes(self, store, body, query):
+        user = self.current_user(store)
+        started = time.perf_counter()
+        quotes = [q for q in store.quotes.values() if q["user_id"] == user["id"]]
+        store.profile("quotes", {"user_id": user["id"]}, len(quotes), started)
+        return 200, quotes
+
+    def get_quote(self, store, body, query, quote_id):
+        user = self.current_user(store)
+        started = time.perf_counter()
+        quote = store.quotes.get(quote_id)
+        store.profile("quotes", {"id": quote_id}, int(quote is not None), started)
+        if not quote or (quote["user_id"] != user["id"] and user["role"] != "admin"):
+            raise APIError(404, "Quote not found")
+        return 200, quote
+
+    def admin_quotes(self, store, body, query):
+        self.admin_user(store)
+        started = time.perf_counter()
+        status, page, headers = paginate(list(store.quotes.values()), query)
+        store.profile("quotes", {}, len(page), started, PAGE_SORT if "limit" in query else None)
+        return status, page, headers
+
+    def update_quote_status(self, store, body, query, quote_id):
+        admin = self.admin_user(store)
+        if quote_id not in store.quotes:
+            raise APIError(404, "Quote not found")
+        store.quotes[quote_id]["status"] = body.get("status")
+        store.log_audit("QUOTE_STATUS_UPDATED", admin["email"], "quote", quote_id)
+        return 200, store.quotes[quote_id]
+
+    def delete_quote(self, store, body, query, quote_id):
+        admin = self.admin_user(store)
+        if store.quotes.pop(quote_id, None) is None:
+            raise APIError(404, "Quote not found")
+        store.log_audit("QUOTE_DELETED", admin["email"], "quote", quote_id)
+        return 200, {"message": "Quote deleted"}
+
+    # Admin users
+
+    def admin_users(self, store, body, query):
+        self.admin_user(store)
+        status, users, headers = paginate(list(store.users.values()), query)
+        return status, [public_user(u) for u in users], headers
+
+    def admin_create_user(self, store, body, query):
+        with store.lock:
+            admin = self.admin_user(store)
+            if store.find_user(body.get("email", "")):
+                raise APIError(400, "Email already registered")
+        if not is_strong_password(body.get("password", "")):
+            raise APIError(400, "Password is too weak")
+        password_hash = self.server.hashing.hash(body["password"])
+        with store.lock:
+            if store.find_user(body["email"]):
+                raise APIError(400, "Email already registered")
+            user = store.create_user(body["email"], password_hash, body.get("full_name", ""), body.get("role", "user"))
+            store.log_audit("USER_CREATED_BY_ADMIN", admin["email"], "user", user["email"])
+            return 200, public_user(user)
+
+    def admin_delete_user(self, store, body, query, user_id):
+        admin = self.admin_user(store)
+        if user_id == admin["id"]:
+            raise APIError(400, "Cannot delete your own account")
+        user = store.users.pop(user_id, None)
+        if not user:
+            raise APIError(404, "User not found")
+        store.tokens = {t: uid for t, uid in store.tokens.items() if uid != user_id}
+        store.principals.invalidate_user(user_id)
+        store.log_audit("USER_DELETED", admin["email"], "user", user["email"])
+        return 200, {"message": "User deleted"}
+
+    def admin_user_status(self, store, body, query, user_id):
+        admin = self.admin_user(store)
+        if user_id not in store.users:
+            raise APIError(404, "User not found")
+        if user_id == admin["id"] and not body.get("is_active", True):
+            raise APIError(400, "Cannot disable your own account")
+        store.users[user_id]["is_active"] = bool(body.get("is_active"))
+        store.principals.invalidate_user(user_id)
+        store.log_audit("USER_STATUS_CHANGED", admin["email"], "user", user_id)
+        return 200, {"message": "User status updated"}
+
+    def admin_reset_password(self, store, body, query, user_id):
+        with store.lock:
+            admin = self.admin_user(store)
+            if user_id not in store.users:
+                raise APIError(404, "User not found")
+        password_hash = self.server.hashing.hash(str(body.get("new_password", "")))
+        with store.lock:
+            if user_id not in store.users:
+                raise APIError(404, "User not found")
+            store.users[user_id]["password_hash"] = password_hash
+            store.principals.invalidate_user(user_id)
+            store.log_audit("PASSWORD_RESET_BY_ADMIN", admin["email"], "user", user_id)
+            return 200, {"message": "Password reset successfully"}
+
+    def audit_logs(self, store, body, query):
+        self.admin_user(store)
+        try:
+            skip = int(query.get("skip", 0))
+            limit = int(query.get("limit", 100))
+        except ValueError:
+            raise APIError(400, "Invalid skip or limit")
+        started = time.perf_counter()
+        logs = store.audit_logs.query(query.get("action"), query.get("user_email"),
+                                      query.get("since"), query.get("until"), skip, limit)
+        filter = {field: query[field] for field in ("action", "user_email") if query.get(field)}
+        window = {op: query[field] for op, field in (("$gte", "since"), ("$lte", "until")) if query.get(field)}
+        if window:
+            filter["timestamp"] = window
+        store.profile("audit_logs", filter, len(logs), started, {"timestamp": -1})
+        return 200, logs
+
+    def audit_rollups(self, store, body, query):
+        self.admin_user(store)
+        try:
+            return 200, store.audit_logs.rollup(query.get("granularity", "day"), query.get("since"), query.get("until"))
+        except ValueError as e:
+            raise APIError(400, str(e))
+
+    def audit_stats(self, store, body, query):
+        self.admin_user(store)
+        if not store.audit_writer:
+            return 200, {"mode": "inline", "entries": len(store.audit_logs), "batches": store.audit_inserts}
+        return 200, dict(store.audit_writer.stats(), mode="group_commit")
+
+    def auth_cache_stats(self, store, body, query):
+        self.admin_user(store)
+        return 200, dict(store.principals.stats(), user_reads=store.user_reads)
+
+    # Site content
+
+    def public_content(self, store, body, query):
+        return 200, list(store.content.values())
+
+    def admin_content(self, store, body, query):
+        self.admin_user(store)
+        content = list(store.content.values())
+        if query.get("page"):
+            content = [c for c in content if c["page"] == query["page"]]
+        return 200, content
+
+    def create_content(self, store, body, query):
+        admin = self.admin_user(store)
+        content = {"id": str(uuid.uuid4()), "page": body.get("page"), "section": body.get("section"),
+                   "content": body.get("content"), "updated_at": now_iso()}
+        store.content[content["id"]] = content
+        store.log_audit("CONTENT_CREATED", admin["email"], "content", content["id"])
+        return 200, content
+
+    def update_content(self, store, body, query, content_id):
+        admin = self.admin_user(store)
+        if content_id not in store.content:
+            raise APIError(404, "Content not found")
+        store.content[content_id].update({"content": body.get("content"), "updated_at": now_iso()})
+        store.log_audit("CONTENT_UPDATED", admin["email"], "content", content_id)
+        return 200, store.content[content_id]
+
+    def delete_content(self, store, body, query, content_id):
+        admin = self.admin_user(store)
+        if store.content.pop(content_id, None) is None:
+            raise APIError(404, "Content not found")
+        store.log_audit("CONTENT_DELETED", admin["email"], "content", content_id)
+        return 200, {"message": "Content deleted"}
+
+
+ROUTES = [(method, re.compile(pattern), handler) for method, pattern, handler in [
+    ("GET", r"/", StandInHandler.root),
+    ("POST", r"/auth/register", StandInHandler.register),
+    ("POST", r"/auth/login", StandInHandler.login),
+    ("GET", r"/auth/me", StandInHandler.me),
+    ("POST", r"/auth/forgot-password", StandInHandler.forgot_password),
+    ("POST", r"/auth/reset-password", StandInHandler.reset_password),
+    ("POST", r"/user/change-password", StandInHandler.change_password),
+    ("GET", r"/products", StandInHandler.list_products),
+    ("POST", r"/products", StandInHandler.create_product),
+    ("GET", r"/products/([^/]+)", StandInHandler.get_product),
+    ("PUT", r"/products/([^/]+)", StandInHandler.update_product),
+    ("DELETE", r"/products/([^/]+)", StandInHandler.delete_product),
+    ("GET", r"/categories", StandInHandler.list_categories),
+    ("GET", r"/categories/([^/]+)", StandInHandler.get_category),
+    ("GET", r"/media/(.+)", StandInHandler.media),
+    ("POST", r"/quotes", StandInHandler.create_quote),
+    ("GET", r"/quotes/my", StandInHandler.my_quotes),
+    ("GET", r"/quotes/([^/]+)", StandInHandler.get_quote),
+    ("GET", r"/admin/quotes", StandInHandler.admin_quotes),
+    ("PUT", r"/admin/quotes/([^/]+)/status", StandInHandler.update_quote_status),
+    ("DELETE", r"/admin/quotes/([^/]+)", StandInHandler.delete_quote),
+    ("GET", r"/admin/users", StandInHandler.admin_users),
+    ("POST", r"/admin/users", StandInHandler.admin_create_user),
+    ("DELETE", r"/admin/users/([^/]+)", StandInHandler.admin_delete_user),
+    ("PUT", r"/admin/users/([^/]+)/status", StandInHandler.admin_user_status),
+    ("POST", r"/admin/users/([^/]+)/reset-password", StandInHandler.admin_reset_password),
+    ("POST", r"/admin/products/bulk", StandInHandler.bulk_upsert_products),
+    ("POST", r"/admin/(users|products|quotes|content)/bulk-delete", StandInHandler.bulk_delete),
+    ("GET", r"/admin/audit-logs", StandInHandler.audit_logs),
+    ("GET", r"/admin/audit-stats", StandInHandler.audit_stats),
+    ("GET", r"/admin/audit-rollups", StandInHandler.audit_rollups),
+    ("GET", r"/admin/auth-cache-stats", StandInHandler.auth_cache_stats),
+    ("GET", r"/content", StandInHandler.public_content),
+    ("GET", r"/admin/content", StandInHandler.admin_content),
+    ("POST", r"/admin/content", StandInHandler.create_content),
+    ("PUT", r"/admin/content/([^/]+)", StandInHandler.update_content),
+    ("DELETE", r"/admin/content/([^/]+)", StandInHandler.delete_content),
+]]
+SELF_LOCKING_HANDLERS = {StandInHandler.register, StandInHandler.login, StandInHandler.forgot_password,
+                         StandInHandler.reset_password, StandInHandler.change_password,
+                         StandInHandler.admin_create_user, StandInHandler.admin_reset_password}
+
+
+class APIStandIn(ThreadingHTTPServer):
+    """Threaded in-memory API bound to localhost; use as a context manager"""
+
+    daemon_threads = True
+    request_queue_size = 128  # The default backlog of 5 drops connects in a burst, costing a 1s SYN retry
+
+    def __init__(self, port: int = 0, latency: float = 0.0, products_per_category: int = PRODUCTS_PER_CATEGORY,
+                 hash_cost: float = HASH_COST, rate_limit_attempts: int = RATE_LIMIT_ATTEMPTS,
+                 media_dir: Optional[str] = None, audit_insert_cost: float = 0.0,
+                 audit_group_commit: bool = False, audit_spool: Optional[str] = None,
+                 audit_retention_days: Optional[int] = None, audit_archive_dir: Optional[str] = None,
+                 principal_ttl: float = PRINCIPAL_TTL, profile_indexes: Optional[Dict[str, List[Any]]] = None,
+                 ip_rate_limit_attempts: Optional[int] = None, rate_limit_backend=None,
+                 trust_forwarded_for: bool = False, cursor_pagination: bool = True, mailer=None):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        hasher = stand_in_hasher(hash_cost)
+        if ip_rate_limit_attempts is None:
+            # Tests that raise the per-email limit for load raise the per-IP one with it
+            ip_rate_limit_attempts = max(RATE_LIMIT_IP_ATTEMPTS, 10 * rate_limit_attempts)
+        # Pass one backend to several stand-ins to model instances sharing a limiter store
+        limiter = RateLimiter(rate_limit_attempts, ip_rate_limit_attempts, backend=rate_limit_backend)
+        self.store = StandInStore(products_per_category, rate_limit_attempts, audit_insert_cost,
+                                  audit_retention_days, audit_archive_dir, hasher, principal_ttl, limiter)
+        self.trust_forwarded_for = trust_forwarded_for  # Key the limiter on X-Forwarded-For, as behind a proxy
+        self.cursor_pagination = cursor_pagination  # False: limit truncates lists without advertising cursors
+        self.hashing = HashingPool(hasher)
+        if profile_indexes is not None:
+            # Queries are profiled as if MongoDB had only _id plus these indexes, e.g. {"users": [[("email", 1)]]}
+            self.store.profiler = QueryProfiler(profile_indexes)
+        if audit_group_commit:
+            self.store.audit_writer = AuditWriter(self.store.insert_audit_batch, audit_spool).start()
+        self.media_dir = media_dir  # Served under /media, e.g. a thumbnail cache directory
+        self.mailer = mailer  # An EmailDispatcher for welcome and reset emails; None sends nothing
+        self.latency = latency
+        self.request_count = 0
+        self.stats_lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{API_PREFIX}"
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up early (abandoned streams, hedged losers, timeouts) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def start(self) -> "APIStandIn":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.hashing.close()
+        if self.store.audit_writer:
+            self.store.audit_writer.close(AUDIT_CLOSE_TIMEOUT)
+
+    def __enter__(self) -> "APIStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    """Run the API stand-in until interrupted"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local in-memory stand-in for the Vian Scientific API")
+    parser.add_argument("--port", type=int, default=8001, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--products-per-category", type=int, default=PRODUCTS_PER_CATEGORY,
+                        help="Seeded products per category (8 categories)")
+    parser.add_argument("--media-dir", help="Directory served under /api/media, e.g. a thumbnail cache")
+    args = parser.parse_args()
+
+    server = APIStandIn(args.port, args.latency, args.products_per_category, media_dir=args.media_dir)
+    print(f"🧪 API stand-in listening on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 Served {server.request_count} requests")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Partitioned Audit Storage for Vian Scientific Platform
+Day-partitioned audit log with retention, gzip archival and incrementally maintained rollups
+"""
+
+import bisect
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_QUERY_LIMIT = 100
+ROLLUP_RETENTION_DAYS = 400  # Rollups are tiny, so they outlive the raw entries they summarise
+GRANULARITIES = {"hour": 13, "day": 10}  # ISO timestamp prefix length per rollup bucket
+
+
+def after(timestamp: str, until: str) -> bool:
+    """Whether a timestamp or bucket falls after an inclusive bound; a date-only bound covers its whole day"""
+    return timestamp[:len(until)] > until
+
+
+def read_archive(path: str) -> Iterator[Dict[str, Any]]:
+    """Entries of an archived partition, oldest first"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class PartitionedAuditStore:
+    """Audit entries partitioned by UTC day, newest-first queries and per-hour/per-day rollups
+
+    Entries are bucketed on their ISO 'timestamp'. Rollups are updated on insert rather than
+    recomputed, so dashboards read counts without touching entries, and filtered queries skip
+    the days and hours whose rollups have no match. Partitions older than the retention period
+    are written to <archive_dir>/audit-YYYY-MM-DD.jsonl.gz and dropped from memory; their ids
+    are remembered as long as their rollups, so a spool replayed afterwards is not counted again.
+    """
+
+    def __init__(self, retention_days: Optional[int] = None, archive_dir: Optional[str] = None,
+                 rollup_retention_days: int = ROLLUP_RETENTION_DAYS):
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.rollup_retention_days = rollup_retention_days
+        self.partitions: Dict[str, List[Dict[str, Any]]] = {}
+        self.partition_ids: Dict[str, set] = {}
+        self.archived_ids: Dict[str, set] = {}  # Kept while the day's rollups are, so replays don't count twice
+        self.expired_before: Optional[str] = None  # Days before this have neither entries nor rollups
+        self.unsorted = set()  # Days holding late arrivals, re-sorted by timestamp on next read
+        self.rollups: Dict[str, Dict[str, Dict[str, Any]]] = {name: {} for name in GRANULARITIES}
+        self.size = 0
+        self.last_scan = {"partitions": 0, "skipped": 0, "entries": 0}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def insert(self, entries: List[Dict[str, Any]]) -> int:
+        """Add entries, skipping ids already stored (e.g. replayed from a spool); returns how many were new"""
+        added = 0
+        for entry in entries:
+            day = entry["timestamp"][:10]
+            if self.expired_before and day < self.expired_before:
+                continue
+            ids = self.partition_ids.setdefault(day, set())
+            if entry["id"] in ids or entry["id"] in self.archived_ids.get(day, ()):
+                continue
+            ids.add(entry["id"])
+            partition = self.partitions.setdefault(day, [])
+            if partition and entry["timestamp"] < partition[-1]["timestamp"]:
+                self.unsorted.add(day)
+            partition.append(entry)
+            for granularity, width in GRANULARITIES.items():
+                bucket = self.rollups[granularity].setdefault(entry["timestamp"][:width], {
+                    "total": 0, "actions": Counter(), "users": Counter()
+                })
+                bucket["total"] += 1
+                bucket["actions"][entry.get("action")] += 1
+                bucket["users"][entry.get("user_email")] += 1
+            added += 1
+        self.size += added
+        return added
+
+    def query(self, action: Optional[str] = None, user_email: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, skip: int = 0, limit: int = DEFAULT_QUERY_LIMIT) -> List[Dict[str, Any]]:
+        """Newest-first entries matching every given filter; since/until are inclusive ISO timestamps or dates
+
+        Stops as soon as skip + limit matches are found, and reads only the partitions and hours
+        whose rollups show a possible match.
+        """
+        wanted = skip + limit
+        matches: List[Dict[str, Any]] = []
+        scan = {"partitions": 0, "skipped": 0, "entries": 0}
+        for day in sorted(self.partitions, reverse=True):
+            if len(matches) >= wanted or (since and day < since[:10]):
+                break
+            if until and after(day, until):
+                continue
+            if not self.may_match(self.rollups["day"].get(day), action, user_email):
+                scan["skipped"] += 1
+                continue
+            scan["partitions"] += 1
+            for entry in self.candidates(day, action, user_email):
+                scan["entries"] += 1
+                if ((action and entry.get("action") != action) or (user_email and entry.get("user_email") != user_email)
+                        or (since and entry["timestamp"] < since) or (until and after(entry["timestamp"], until))):
+                    continue
+                matches.append(entry)
+                if len(matches) >= wanted:
+                    break
+        self.last_scan = scan
+        return matches[skip:wanted]
+
+    @staticmethod
+    def may_match(counts: Optional[Dict[str, Any]], action: Optional[str], user_email: Optional[str]) -> bool:
+        return counts is None or not ((action and not counts["actions"][action]) or (user_email and not counts["users"][user_email]))
+
+    def candidates(self, day: str, action: Optional[str], user_email: Optional[str]) -> Iterator[Dict[str, Any]]:
+        """A partition's entries newest first, skipping hours whose rollup rules out the filters"""
+        entries = self.sorted_partition(day)
+        if not (action or user_email):
+            yield from reversed(entries)
+            return
+        hour_of = lambda entry: entry["timestamp"][:13]
+        for hour in range(23, -1, -1):
+            bucket = f"{day}T{hour:02d}"
+            if not self.may_match(self.rollups["hour"].get(bucket), action, user_email):
+                continue
+            start = bisect.bisect_left(entries, bucket, key=hour_of)
+            end = bisect.bisect_right(entries, bucket, key=hour_of)
+            for index in range(end - 1, start - 1, -1):
+                yield entries[index]
+
+    def sorted_partition(self, day: str) -> List[Dict[str, Any]]:
+        if day in self.unsorted:
+            self.partitions[day].sort(key=lambda entry: entry["timestamp"])
+            self.unsorted.discard(day)
+        return self.partitions[day]
+
+    def rollup(self, granularity: str = "day", since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Counts per action and per user for each bucket in range, newest first"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        width = GRANULARITIES[granularity]
+        rows = []
+        for bucket in sorted(self.rollups[granularity], reverse=True):
+            if since and bucket < since[:width]:
+                break
+            if until and after(bucket, until):
+                continue
+            counts = self.rollups[granularity][bucket]
+            rows.append({"bucket": bucket, "total": counts["total"],
+                         "actions": dict(counts["actions"]), "users": dict(counts["users"])})
+        return rows
+
+    def archive(self, day: str) -> Optional[str]:
+        """Write one partition to a gzip JSONL file and drop it; returns the file path"""
+        entries = self.sorted_partition(day) if day in self.partitions else []
+        self.partitions.pop(day, None)
+        self.archived_ids.setdefault(day, set()).update(self.partition_ids.pop(day, ()))
+        self.size -= len(entries)
+        if not self.archive_dir or not entries:
+            return None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"audit-{day}.jsonl.gz")
+        partial = f"{path}.tmp"
+        # Appends to an existing archive, for entries that arrived late for an already archived day
+        existing = list(read_archive(path)) if os.path.exists(path) else []
+        with gzip.open(partial, "wt", encoding="utf-8") as f:
+            for entry in existing + entries:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(partial, path)
+        return path
+
+    def enforce_retention(self, now: Optional[datetime] = None) -> List[str]:
+        """Archive partitions and expire rollups older than their retention; returns archive paths"""
+        now = now or datetime.now(timezone.utc)
+        archived = []
+        if self.retention_days is not None:
+            cutoff = (now - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+            for day in sorted(self.partitions):
+                if day >= cutoff:
+                    break
+                path = self.archive(day)
+                if path:
+                    archived.append(path)
+        rollup_cutoff = (now - timedelta(days=self.rollup_retention_days)).strftime("%Y-%m-%d")
+        for buckets in self.rollups.values():
+            for bucket in [b for b in buckets if b[:10] < rollup_cutoff]:
+                del buckets[bucket]
+        for day in [d for d in self.archived_ids if d < rollup_cutoff]:
+            del self.archived_ids[day]
+        self.expired_before = max(self.expired_before or rollup_cutoff, rollup_cutoff)
+        return archived
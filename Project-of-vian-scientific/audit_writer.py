@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Group-Commit Audit Writer for Vian Scientific Platform
+Buffers audit entries and inserts them in batches, with an fsync'd local spool replayed after a crash
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from latency_stats import percentile
+
+try:
+    from pymongo.errors import BulkWriteError, ConnectionFailure, DocumentTooLarge, InvalidDocument, WriteError
+    MONGO_PERMANENT_ERRORS = (BulkWriteError, DocumentTooLarge, InvalidDocument, WriteError)
+    MONGO_TRANSIENT_ERRORS = (ConnectionFailure,)
+except ImportError:  # Optional: only needed for mongo_sink
+    BulkWriteError = None
+    MONGO_PERMANENT_ERRORS = MONGO_TRANSIENT_ERRORS = ()
+
+AUDIT_MAX_BATCH = 500  # Entries per insert
+AUDIT_MAX_DELAY = 0.05  # Seconds an entry may wait for its batch to fill
+AUDIT_MAX_BACKLOG = 100_000  # Appends block beyond this many uninserted entries
+AUDIT_RETRY_DELAY = 0.5  # Seconds before retrying an insert while the database is unavailable, doubled per attempt
+AUDIT_MAX_RETRY_DELAY = 30.0  # ...up to this
+AUDIT_MAX_ATTEMPTS = 5  # Attempts for a batch failing with an unclassified error before it is dead-lettered
+LATENCY_HISTORY = 1000  # Recent samples kept for the latency percentiles
+DUPLICATE_KEY = 11000
+# Errors that retrying cannot fix (bad documents, schema validation): the batch is dead-lettered at once
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError) + MONGO_PERMANENT_ERRORS
+# The database is unreachable: the batch is safe in the spool, so it is retried for as long as that lasts
+TRANSIENT_ERRORS = (OSError,) + MONGO_TRANSIENT_ERRORS
+
+
+def rejected_entries(entries: List[Dict[str, Any]], error: Exception) -> List[Dict[str, Any]]:
+    """The entries an insert error applies to: only the failed ones of an unordered bulk write"""
+    details = getattr(error, "details", None)
+    write_errors = details.get("writeErrors") if isinstance(details, dict) else None
+    if not write_errors:
+        return entries
+    failed = {e["index"] for e in write_errors if e.get("code") != DUPLICATE_KEY}
+    return [entry for i, entry in enumerate(entries) if i in failed]
+
+
+def mongo_sink(collection) -> Callable[[List[Dict[str, Any]]], None]:
+    """Batch insert into a pymongo collection; entries replayed from the spool after a crash are skipped"""
+    def insert(entries: List[Dict[str, Any]]):
+        documents = [dict(entry, _id=entry["id"]) for entry in entries]
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != DUPLICATE_KEY for error in e.details.get("writeErrors", [])):
+                raise
+    return insert
+
+
+class AuditWriter:
+    """Queue audit entries and insert them in batches on size or time thresholds
+
+    A spooler thread appends each batch to the spool file with one fsync (the group commit), and
+    an inserter thread hands spooled batches to the sink and checkpoints the spool offset once
+    they are in. A crash loses at most entries not yet spooled - none whose append() used
+    durable=True - and anything spooled but not checkpointed is replayed after the next start, so
+    entries survive a database outage too. Replays are at-least-once; the sink should ignore
+    duplicate ids.
+
+    While the database is unreachable batches are retried with backoff, in the background: start()
+    never waits for it, and neither does close(), which leaves them spooled for the next start.
+    Batches the sink rejects outright (see PERMANENT_ERRORS), or that keep failing in unexpected
+    ways, are dead-lettered to <spool>.dead so one bad entry cannot stall everything behind it.
+    """
+
+    def __init__(self, sink: Callable[[List[Dict[str, Any]]], None], spool_path: Optional[str] = None,
+                 max_batch: int = AUDIT_MAX_BATCH, max_delay: float = AUDIT_MAX_DELAY,
+                 max_backlog: int = AUDIT_MAX_BACKLOG, retry_delay: float = AUDIT_RETRY_DELAY,
+                 max_retry_delay: float = AUDIT_MAX_RETRY_DELAY, max_attempts: int = AUDIT_MAX_ATTEMPTS):
+        self.sink = sink
+        self.spool_path = spool_path
+        self.checkpoint_path = f"{spool_path}.offset" if spool_path else None
+        self.dead_letter_path = f"{spool_path}.dead" if spool_path else None
+        self.dead_letters: List[Dict[str, Any]] = []  # Kept in memory when there is no spool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_backlog = max_backlog
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.condition = threading.Condition()
+        self.spool_lock = threading.Lock()
+        self.queue: Deque[Any] = deque()  # (sequence, enqueued at, entry), not yet spooled
+        self.spooled_batches: Deque[Any] = deque()  # (last sequence, spool end offset, batch), not yet inserted
+        self.appended = 0  # Sequence number of the last appended entry
+        self.spooled = 0  # ... of the last entry fsync'd to the spool
+        self.inserted = 0  # ... of the last entry accepted by the sink
+        self.closing = False
+        self.spooler_done = False
+        self.abandoned = False  # The inserter gave up on the sink while closing
+        self.threads: List[threading.Thread] = []
+        self.spool = None
+        self.batch_ms: Deque[float] = deque(maxlen=LATENCY_HISTORY)
+        self.fsync_ms: Deque[float] = deque(maxlen=LATENCY_HISTORY)
+        self.visible_ms: Deque[float] = deque(maxlen=LATENCY_HISTORY)
+        self.counts = {"batches": 0, "entries": 0, "sink_errors": 0, "recovered": 0, "dead_lettered": 0,
+                       "max_queue_depth": 0}
+
+    def start(self) -> "AuditWriter":
+        if self.spool_path:
+            self.recover()
+            self.spool = open(self.spool_path, "ab")
+        self.threads = [threading.Thread(target=self.run_spooler, name="audit-spooler", daemon=True),
+                        threading.Thread(target=self.run_inserter, name="audit-inserter", daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def recover(self):
+        """Queue entries spooled after the last checkpoint for the inserter, ahead of new ones
+
+        Only the spool is read here; the entries are inserted in the background like any other
+        batch, so start() returns (and the API can serve) while the database is still down.
+        """
+        if not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, "rb") as f:
+            data = f.read()
+        offset = self.read_checkpoint(data)
+        # A torn final line was never fully fsync'd, so its append was never acknowledged; it is cut
+        # off so the next append starts on a line of its own
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            with open(self.spool_path, "r+b") as f:
+                f.truncate(complete)
+                os.fsync(f.fileno())
+        position, batch = offset, []
+        for line in data[offset:complete].split(b"\n")[:-1]:
+            position += len(line) + 1
+            if line.strip():
+                self.appended += 1
+                batch.append((self.appended, time.perf_counter(), json.loads(line)))
+            if batch and (len(batch) >= self.max_batch or position == complete):
+                self.spooled_batches.append((batch[-1][0], position, batch))
+                batch = []
+        self.spooled = self.appended
+        self.counts["recovered"] += self.appended
+
+    def read_checkpoint(self, data: bytes) -> int:
+        """Offset of the first uninserted spool entry; 0, replaying everything, if the checkpoint is unusable"""
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as f:
+            offset = int(f.read().strip() or 0)
+        # Past the end or inside a line, it belongs to an earlier generation of the spool; replaying
+        # from the start only repeats inserts, which the sink skips
+        if offset > len(data) or (offset and data[offset - 1:offset] != b"\n"):
+            return 0
+        return offset
+
+    def write_checkpoint(self, offset: int, durable: bool = False):
+        # A stale checkpoint only means a batch is replayed twice, as long as it never points past
+        # data spooled after a truncation: resetting it is fsync'd before the spool is reused
+        partial = f"{self.checkpoint_path}.tmp"
+        with open(partial, "w") as f:
+            f.write(str(offset))
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(partial, self.checkpoint_path)
+        if durable:
+            directory = os.open(os.path.dirname(os.path.abspath(self.checkpoint_path)), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+    def append(self, entry: Dict[str, Any], durable: bool = False):
+        """Queue an entry; with durable=True, return only once it is fsync'd to the spool"""
+        with self.condition:
+            while self.appended - self.inserted >= self.max_backlog and not self.closing:
+                self.condition.wait()
+            if self.closing:
+                raise RuntimeError("Audit writer is closed")
+            self.appended += 1
+            sequence = self.appended
+            self.queue.append((sequence, time.perf_counter(), entry))
+            self.counts["max_queue_depth"] = max(self.counts["max_queue_depth"], len(self.queue))
+            if len(self.queue) == 1 or len(self.queue) >= self.max_batch:
+                self.condition.notify_all()  # Starts the batch timer, or cuts it short once the batch is full
+            if durable:
+                self.condition.wait_for(lambda: (self.spooled if self.spool else self.inserted) >= sequence or self.abandoned)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything appended so far has been inserted"""
+        with self.condition:
+            target = self.appended
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.inserted >= target, timeout)
+
+    def next_batch(self) -> Optional[List[Any]]:
+        with self.condition:
+            while True:
+                if self.queue:
+                    age = time.perf_counter() - self.queue[0][1]
+                    if len(self.queue) >= self.max_batch or age >= self.max_delay or self.closing:
+                        return [self.queue.popleft() for _ in range(min(self.max_batch, len(self.queue)))]
+                    self.condition.wait(self.max_delay - age)
+                elif self.closing:
+                    return None
+                else:
+                    self.condition.wait()
+
+    def run_spooler(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                with self.condition:
+                    self.spooler_done = True
+                    self.condition.notify_all()
+                return
+            end = 0
+            if self.spool:
+                data = b"".join(json.dumps(entry).encode("utf-8") + b"\n" for _, _, entry in batch)
+                with self.spool_lock:
+                    self.spool.write(data)
+                    self.spool.flush()
+                    synced = time.perf_counter()
+                    os.fsync(self.spool.fileno())
+                    end = self.spool.tell()
+                self.fsync_ms.append((time.perf_counter() - synced) * 1000)
+            with self.condition:
+                self.spooled = batch[-1][0]
+                self.spooled_batches.append((self.spooled, end, batch))
+                self.condition.notify_all()
+
+    def insert(self, entries: List[Dict[str, Any]]) -> bool:
+        """Hand a batch to the sink; False if the writer is closing while the database is still unavailable"""
+        delay, attempts = self.retry_delay, 0
+        while True:
+            try:
+                self.sink(entries)
+                return True
+            except Exception as e:
+                with self.condition:
+                    self.counts["sink_errors"] += 1
+                attempts += 1
+                if isinstance(e, PERMANENT_ERRORS) or (not isinstance(e, TRANSIENT_ERRORS) and attempts >= self.max_attempts):
+                    self.dead_letter(rejected_entries(entries, e), e)
+                    return True
+                # The entries are safe in the spool; keep the batch and wait for the database, unless
+                # close() is waiting for us, in which case the batch is left for the next start
+                with self.condition:
+                    if self.closing or self.condition.wait_for(lambda: self.closing, delay):
+                        return False
+                delay = min(delay * 2, self.max_retry_delay)
+
+    def dead_letter(self, entries: List[Dict[str, Any]], error: Exception):
+        """Set aside entries the sink will not take, with the reason, for inspection and manual replay"""
+        records = [{"error": f"{type(error).__name__}: {error}", "entry": entry} for entry in entries]
+        with self.condition:
+            self.counts["dead_lettered"] += len(records)
+        if not self.dead_letter_path:
+            self.dead_letters.extend(records)
+            return
+        with open(self.dead_letter_path, "ab") as f:
+            f.write(b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run_inserter(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.spooled_batches or self.spooler_done)
+                if not self.spooled_batches:
+                    return
+                last, end, batch = self.spooled_batches[0]
+            started = time.perf_counter()
+            if not self.insert([entry for _, _, entry in batch]):
+                # Closing during an outage: this batch and those behind it stay spooled, uncheckpointed
+                with self.condition:
+                    self.abandoned = True
+                    self.condition.notify_all()
+                return
+            finished = time.perf_counter()
+            if self.spool:
+                with self.spool_lock:
+                    if self.spool.tell() == end:
+                        # Everything spooled is in the database, so the spool can start over. Both
+                        # steps are made durable before anything new is spooled: otherwise a crash
+                        # could leave the old checkpoint pointing into the new entries
+                        self.spool.truncate(0)
+                        self.spool.seek(0)
+                        os.fsync(self.spool.fileno())
+                        self.write_checkpoint(0, durable=True)
+                    else:
+                        self.write_checkpoint(end)
+            with self.condition:
+                self.spooled_batches.popleft()
+                self.inserted = last
+                self.counts["batches"] += 1
+                self.counts["entries"] += len(batch)
+                self.batch_ms.append((finished - started) * 1000)
+                self.visible_ms.extend((finished - enqueued) * 1000 for _, enqueued, _ in batch[::max(1, len(batch) // 20)])
+                self.condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, backlog and latencies; visible_ms is append-to-insert time per entry"""
+        with self.condition:
+            stats = dict(self.counts, queue_depth=len(self.queue), backlog=self.appended - self.inserted)
+            batch_ms, fsync_ms, visible_ms = list(self.batch_ms), list(self.fsync_ms), list(self.visible_ms)
+        stats["mean_batch"] = stats["entries"] / stats["batches"] if stats["batches"] else 0.0
+        for name, values in (("batch_ms", batch_ms), ("fsync_ms", fsync_ms), ("visible_ms", visible_ms)):
+            stats[f"{name}_p50"] = percentile(values, 0.50) if values else None
+            stats[f"{name}_p95"] = percentile(values, 0.95) if values else None
+        return stats
+
+    def close(self, timeout: Optional[float] = None):
+        """Spool and insert what is queued, then stop; whatever the sink still refuses stays in the spool"""
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if self.spool and not any(thread.is_alive() for thread in self.threads):
+            self.spool.close()
+
+    def __enter__(self) -> "AuditWriter":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Catalog Ingestion for Vian Scientific Platform
+Parses the product catalog PDF page by page in a process pool and upserts changed products in bulk
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend_test import ADMIN_EMAIL, ADMIN_PASSWORD, BASE_URL, VianScientificAPITester
+
+try:
+    import pypdf
+except ImportError:  # Optional: pip install pypdf
+    pypdf = None
+
+PARSER_VERSION = 1  # Bump when parsing rules change so cached page results are discarded
+PAGES_PER_TASK = 8  # Pages handed to a worker process at a time
+BULK_BATCH_SIZE = 200  # Products per bulk upsert request
+FALLBACK_WRITERS = 8  # Concurrent single-product writes when the API has no bulk endpoint
+INGEST_FIELDS = ("product_name", "category", "pack_size")
+PAGE_BREAK = "\f"  # Page separator in text catalogs, as written by pdftotext
+
+# "VN-HPLC-001   HPLC Vial Insert 250uL   Pack of 100": columns are separated by two or more spaces
+PRODUCT_LINE = re.compile(
+    r"^\s*(?P<cat_no>[A-Z]{2,}[A-Z0-9]*(?:[-/][A-Z0-9]+)+)\s{2,}(?P<name>\S.*?)\s{2,}(?P<pack_size>\S.*?)\s*$"
+)
+PACK_PREFIX = re.compile(r"^(?:pack\s+of|pk\s+of)\s+", re.IGNORECASE)
+
+_reader = None  # Per-worker PDF reader, opened once per process
+_reader_path = None
+
+
+def heading_key(text: str) -> str:
+    """Normalised form of a category heading or name, e.g. 'Analytical Vials & Closures' -> 'analyticalvialsandclosures'"""
+    return re.sub(r"[^a-z0-9]", "", text.lower().replace("&", "and"))
+
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def open_pdf(path: str):
+    global _reader, _reader_path
+    if pypdf is None:
+        raise RuntimeError("Reading PDF catalogs requires pypdf (pip install pypdf), or pass pdftotext output")
+    if _reader_path != path:
+        _reader = pypdf.PdfReader(path)
+        _reader_path = path
+    return _reader
+
+
+def catalog_pages(path: str) -> List[Tuple[int, str, Optional[str]]]:
+    """(page number, fingerprint, text) for every page; PDF text is left to the workers
+
+    PDF pages are fingerprinted from their raw content streams, which is far cheaper than
+    extracting their text, so unchanged pages cost almost nothing on an incremental run.
+    """
+    if not path.lower().endswith(".pdf"):
+        with open(path, encoding="utf-8") as f:
+            texts = f.read().split(PAGE_BREAK)
+        if texts and not texts[-1].strip():
+            texts.pop()
+        return [(number, fingerprint(text.encode("utf-8")), text) for number, text in enumerate(texts, 1)]
+
+    pages = []
+    for number, page in enumerate(open_pdf(path).pages, 1):
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b""
+        pages.append((number, fingerprint(data), None))
+    return pages
+
+
+def extract_pdf_text(path: str, number: int) -> str:
+    page = open_pdf(path).pages[number - 1]
+    try:
+        return page.extract_text(extraction_mode="layout")  # Keeps column gaps, which the line pattern relies on
+    except TypeError:  # pypdf < 3.17
+        return page.extract_text()
+
+
+def parse_page(text: str, categories: Dict[str, str]) -> Dict[str, Any]:
+    """Products on one page; rows before the page's first heading have no category yet"""
+    rows = []
+    category = None
+    for line in text.splitlines():
+        slug = categories.get(heading_key(line))
+        if slug:
+            category = slug
+            continue
+        match = PRODUCT_LINE.match(line)
+        if match:
+            rows.append({
+                "cat_no": match.group("cat_no"),
+                "product_name": re.sub(r"\s+", " ", match.group("name")),
+                "pack_size": PACK_PREFIX.sub("", re.sub(r"\s+", " ", match.group("pack_size"))),
+                "category": category,
+            })
+    return {"rows": rows, "last_category": category}
+
+
+def parse_chunk(path: str, pages: List[Tuple[int, Optional[str]]], categories: Dict[str, str]) -> List[Tuple[int, Dict[str, Any]]]:
+    """Worker entry point: extract (if needed) and parse a run of pages"""
+    return [(number, parse_page(text if text is not None else extract_pdf_text(path, number), categories))
+            for number, text in pages]
+
+
+class CatalogIngester:
+    """Reconcile the API catalog with a catalog document, re-parsing only pages that changed"""
+
+    def __init__(self, base_url: str = BASE_URL, admin_token: Optional[str] = None, workers: Optional[int] = None,
+                 batch_size: int = BULK_BATCH_SIZE, state_path: Optional[str] = None):
+        self.client = VianScientificAPITester(base_url, record_ledger=False)  # Ingested products are real data
+        self.admin_token = admin_token
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.state_path = state_path
+
+    def login(self, email: str = ADMIN_EMAIL, password: str = ADMIN_PASSWORD) -> str:
+        response = self.client.make_request("POST", "/auth/login", {"email": email, "password": password})
+        if response.status_code != 200:
+            raise RuntimeError(f"Admin login failed: {response.status_code} {response.text}")
+        self.admin_token = response.json()["access_token"]
+        return self.admin_token
+
+    def load_state(self, categories: Dict[str, str]) -> Dict[str, Any]:
+        empty = {"parser": PARSER_VERSION, "categories": categories, "pages": {}}
+        if not self.state_path or not os.path.exists(self.state_path):
+            return empty
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state.get("parser") != PARSER_VERSION or state.get("categories") != categories:
+            return empty
+        return state
+
+    def save_state(self, state: Dict[str, Any]):
+        if not self.state_path:
+            return
+        partial = f"{self.state_path}.tmp"
+        with open(partial, "w") as f:
+            json.dump(state, f)
+        os.replace(partial, self.state_path)
+
+    def parse_pages(self, path: str, pages: List[Tuple[int, Optional[str]]], categories: Dict[str, str]) -> Dict[int, Dict[str, Any]]:
+        chunks = [pages[i:i + PAGES_PER_TASK] for i in range(0, len(pages), PAGES_PER_TASK)]
+        if len(chunks) <= 1 or self.workers <= 1:
+            # A handful of changed pages is quicker to parse than a pool is to start
+            return dict(result for chunk in chunks for result in parse_chunk(path, chunk, categories))
+        parsed = {}
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks))) as pool:
+            for results in pool.map(parse_chunk, [path] * len(chunks), chunks, [categories] * len(chunks)):
+                parsed.update(results)
+        return parsed
+
+    def extract(self, path: str, categories: Dict[str, str]) -> Dict[str, Any]:
+        """Catalog products keyed by cat_no, reusing cached results for unchanged pages"""
+        state = self.load_state(categories)
+        cached = state["pages"]
+        pages = catalog_pages(path)
+        changed = [(number, text) for number, digest, text in pages
+                   if cached.get(str(number), {}).get("fingerprint") != digest]
+        parsed = self.parse_pages(path, changed, categories)
+
+        state["pages"] = {}
+        for number, digest, _ in pages:
+            result = parsed[number] if number in parsed else cached[str(number)]
+            state["pages"][str(number)] = dict(result, fingerprint=digest)
+
+        # Headings carry over page breaks, so categories are resolved in page order once all pages are in
+        products: Dict[str, Dict[str, Any]] = {}
+        duplicates = []
+        uncategorised = []
+        category = None
+        for number, _, _ in pages:
+            page = state["pages"][str(number)]
+            for row in page["rows"]:
+                product = dict(row, category=row["category"] or category)
+                if not product["category"]:
+                    uncategorised.append(product["cat_no"])
+                    continue
+                if product["cat_no"] in products:
+                    duplicates.append(product["cat_no"])
+                products[product["cat_no"]] = product  # Later pages win, like a catalog errata section
+            category = page["last_category"] or category
+
+        return {"state": state, "products": products, "pages": len(pages), "pages_parsed": len(changed),
+                "duplicates": duplicates, "uncategorised": uncategorised}
+
+    def diff(self, products: Dict[str, Dict[str, Any]], snapshot: Dict[str, Dict[str, Any]]) -> Tuple[List, List, int]:
+        creates, updates = [], []
+        unchanged = 0
+        for cat_no, product in products.items():
+            current = snapshot.get(cat_no)
+            if current is None:
+                creates.append(product)
+            elif any(current.get(field) != product[field] for field in INGEST_FIELDS):
+                updates.append(dict(product, id=current["id"]))
+            else:
+                unchanged += 1
+        return creates, updates, unchanged
+
+    def write_bulk(self, products: List[Dict[str, Any]]) -> Optional[int]:
+        """Upsert in batches; None if the API has no bulk endpoint"""
+        batches = 0
+        for start in range(0, len(products), self.batch_size):
+            batch = [{k: v for k, v in p.items() if k != "id"} for p in products[start:start + self.batch_size]]
+            response = self.client.make_request("POST", "/admin/products/bulk", {"products": batch}, token=self.admin_token)
+            if response.status_code in (404, 405) and batches == 0:
+                return None
+            if response.status_code != 200:
+                raise RuntimeError(f"Bulk upsert failed: {response.status_code} {response.text}")
+            batches += 1
+        return batches
+
+    def write_single(self, creates: List[Dict[str, Any]], updates: List[Dict[str, Any]]):
+        def write(product: Dict[str, Any]):
+            if "id" in product:
+                fields = {k: v for k, v in product.items() if k != "id"}
+                response = self.client.make_request("PUT", f"/products/{product['id']}", fields, token=self.admin_token)
+            else:
+                response = self.client.make_request("POST", "/products", product, token=self.admin_token)
+            if response.status_code != 200:
+                raise RuntimeError(f"Writing {product['cat_no']} failed: {response.status_code} {response.text}")
+
+        with ThreadPoolExecutor(max_workers=FALLBACK_WRITERS) as pool:
+            list(pool.map(write, creates + updates))
+
+    def run(self, path: str, dry_run: bool = False) -> Dict[str, Any]:
+        if not self.admin_token and not dry_run:
+            self.login()
+        timer = time.perf_counter()
+        categories = {}
+        for category in self.client.make_request("GET", "/categories").json():
+            categories[heading_key(category["name"])] = category["slug"]
+            categories[heading_key(category["slug"])] = category["slug"]
+
+        extracted = self.extract(path, categories)
+        extract_s = time.perf_counter() - timer
+
+        snapshot = {p["cat_no"]: p for p in self.client.iter_pages("/products") if p.get("cat_no")}
+        creates, updates, unchanged = self.diff(extracted["products"], snapshot)
+        snapshot_s = time.perf_counter() - timer - extract_s
+
+        batches = 0
+        if not dry_run and (creates or updates):
+            batches = self.write_bulk(creates + updates)
+            if batches is None:
+                batches = 0
+                self.write_single(creates, updates)
+        if not dry_run:
+            # Only remembered once written, so a failed run re-parses and retries the same pages
+            self.save_state(extracted["state"])
+
+        return {
+            "pages": extracted["pages"],
+            "pages_parsed": extracted["pages_parsed"],
+            "products": len(extracted["products"]),
+            "duplicates": extracted["duplicates"],
+            "uncategorised": extracted["uncategorised"],
+            "created": len(creates),
+            "updated": len(updates),
+            "unchanged": unchanged,
+            "batches": batches,
+            "dry_run": dry_run,
+            "extract_s": extract_s,
+            "snapshot_s": snapshot_s,
+            "write_s": time.perf_counter() - timer - extract_s - snapshot_s,
+            "total_s": time.perf_counter() - timer,
+        }
+
+
+def main():
+    """Ingest a catalog PDF (or its pdftotext output) into the API"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest the Vian Scientific product catalog")
+    parser.add_argument("catalog", help="Catalog PDF, or a text file with form-feed page breaks")
+    parser.add_argument("--base-url", default=BASE_URL, help="API base URL")
+    parser.add_argument("--admin-email", default=ADMIN_EMAIL)
+    parser.add_argument("--admin-password", default=ADMIN_PASSWORD)
+    parser.add_argument("--state", help="Page cache for incremental runs, e.g. catalog_state.json")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE, help="Products per bulk upsert")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+
+    ingester = CatalogIngester(args.base_url, workers=args.workers, batch_size=args.batch_size, state_path=args.state)
+    if not args.dry_run:
+        ingester.login(args.admin_email, args.admin_password)
+
+    print("📚 CATALOG INGESTION")
+    print("=" * 50)
+    print(f"   Catalog: {args.catalog}")
+    print(f"   Target: {args.base_url}{' (dry run)' if args.dry_run else ''}")
+
+    summary = ingester.run(args.catalog, dry_run=args.dry_run)
+    print(f"📄 {summary['pages_parsed']}/{summary['pages']} pages parsed, {summary['products']} products "
+          f"in {summary['extract_s']:.2f}s")
+    print(f"🔁 {summary['created']} to create, {summary['updated']} to update, {summary['unchanged']} unchanged")
+    if summary["duplicates"]:
+        print(f"⚠️ {len(summary['duplicates'])} duplicate cat_no entries, last one kept: {', '.join(summary['duplicates'][:10])}")
+    if summary["uncategorised"]:
+        print(f"⚠️ {len(summary['uncategorised'])} products before any category heading were skipped")
+    if not args.dry_run:
+        print(f"✅ Written in {summary['batches']} bulk batches, {summary['total_s']:.2f}s total")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Test Data Reaper for Vian Scientific Platform
+Finds records left behind by test runs, by run ledger or by pattern, and deletes them in bounded-concurrency batches
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+REAPER_CONCURRENCY = 4  # Delete calls in flight at once, so a sweep never crowds out real traffic
+REAPER_BATCH_SIZE = 100  # Ids per bulk-delete call
+SWEEP_GRACE = timedelta(hours=6)  # Pattern sweeps skip younger records, which may belong to a run still in progress
+SWEEP_INTERVAL = 3600.0  # Seconds between periodic sweeps
+
+# example.com/.org/.net are reserved for documentation (RFC 2606), so no real customer uses them
+TEST_EMAIL = re.compile(r"@example\.(com|org|net)$", re.IGNORECASE)
+TEST_CAT_NO = re.compile(r"^VN-(TEST|AUDIT-TEST|PAGE|GROW)-")
+TEST_TEXT = re.compile(r"^(Updated )?Test (Content|quote request|Product) for ", re.IGNORECASE)
+
+
+def is_test_text(value: Any) -> bool:
+    return isinstance(value, str) and bool(TEST_TEXT.match(value))
+
+
+# Deleted in this order, so quotes go before the users who own them
+COLLECTIONS = {
+    "quotes": {
+        "list": "/admin/quotes", "delete": "/admin/quotes/{id}", "created": "/quotes",
+        "matches": lambda r: bool(TEST_EMAIL.search(r.get("user_email") or "")) or is_test_text(r.get("message")),
+    },
+    "content": {
+        "list": "/admin/content", "delete": "/admin/content/{id}", "created": "/admin/content",
+        "matches": lambda r: is_test_text(r.get("content")),
+    },
+    "products": {
+        "list": "/products", "delete": "/products/{id}", "created": "/products",
+        "matches": lambda r: bool(TEST_CAT_NO.match(r.get("cat_no") or "")) or is_test_text(r.get("product_name")),
+    },
+    "users": {
+        "list": "/admin/users", "delete": "/admin/users/{id}", "created": ("/auth/register", "/admin/users"),
+        "matches": lambda r: bool(TEST_EMAIL.search(r.get("email") or "")),
+    },
+}
+
+
+def record_age(record: Dict[str, Any], now: datetime) -> Optional[timedelta]:
+    stamp = record.get("created_at") or record.get("updated_at")
+    if not stamp:
+        return None
+    created = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return now - created
+
+
+class RunLedger:
+    """Request hook that notes the id of every record a test run creates, tagged with the run id
+
+    With a directory the ledger is also appended to <directory>/<run_id>.jsonl as records are
+    created, so a run that crashes before its own cleanup can be reaped later with --run-id.
+    """
+
+    def __init__(self, run_id: str, directory: Optional[str] = None):
+        self.run_id = run_id
+        self.lock = threading.Lock()
+        self.created: Dict[str, List[str]] = {name: [] for name in COLLECTIONS}
+        self.path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f"{run_id}.jsonl")
+
+    def __call__(self, record: Dict[str, Any]):
+        response = record["response"]
+        if record["method"].upper() != "POST" or response is None or response.status_code != 200 or record["stream"]:
+            return
+        path = record["endpoint"].split("?")[0]
+        collection = next((name for name, spec in COLLECTIONS.items()
+                           if path in ((spec["created"],) if isinstance(spec["created"], str) else spec["created"])), None)
+        if collection is None:
+            return
+        try:
+            record_id = response.json().get("id")
+        except (ValueError, AttributeError):
+            return
+        if record_id:
+            self.add(collection, record_id)
+
+    def add(self, collection: str, record_id: str):
+        with self.lock:
+            self.created[collection].append(record_id)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"run_id": self.run_id, "collection": collection, "id": record_id}) + "\n")
+
+    def ids(self) -> Dict[str, List[str]]:
+        with self.lock:
+            return {name: list(dict.fromkeys(ids)) for name, ids in self.created.items()}
+
+    @classmethod
+    def load(cls, directory: str, run_id: str) -> "RunLedger":
+        ledger = cls(run_id)
+        with open(os.path.join(directory, f"{run_id}.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    ledger.created[entry["collection"]].append(entry["id"])
+        return ledger
+
+
+class DataReaper:
+    """Delete test records through the admin API, at most `concurrency` calls at a time
+
+    Ids are sent to POST /admin/<collection>/bulk-delete in batches; against a backend without
+    that endpoint it falls back to one DELETE per record, still through the same bounded pool.
+    """
+
+    def __init__(self, client, admin_token: str, concurrency: int = REAPER_CONCURRENCY,
+                 batch_size: int = REAPER_BATCH_SIZE):
+        self.client = client  # Anything with make_request and iter_pages, e.g. VianScientificAPITester
+        self.admin_token = admin_token
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.bulk: Dict[str, bool] = {name: True for name in COLLECTIONS}
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+
+    def find(self, grace: timedelta = SWEEP_GRACE, now: Optional[datetime] = None,
+             predicate: Optional[Callable[[str, Dict[str, Any]], bool]] = None) -> Dict[str, List[str]]:
+        """Ids of test records older than grace, by collection; predicate(collection, record) overrides the patterns"""
+        now = now or datetime.now(timezone.utc)
+        found = {}
+        for name, spec in COLLECTIONS.items():
+            ids = []
+            for record in self.client.iter_pages(spec["list"], token=self.admin_token):
+                if not (predicate(name, record) if predicate else spec["matches"](record)):
+                    continue
+                # Without a timestamp a record's age is unknown, so it may belong to a run in progress
+                age = record_age(record, now)
+                if age is not None and age >= grace:
+                    ids.append(record["id"])
+            found[name] = ids
+        return found
+
+    def call(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None):
+        with self.lock:
+            self.in_flight += 1
+            self.calls += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return self.client.make_request(method, endpoint, data, token=self.admin_token)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def delete_batch(self, collection: str, ids: List[str]) -> Dict[str, int]:
+        if self.bulk[collection]:
+            response = self.call("POST", f"/admin/{collection}/bulk-delete", {"ids": ids})
+            if response.status_code == 200:
+                result = response.json()
+                return {"deleted": result.get("deleted", 0), "missing": result.get("missing", 0), "failed": 0}
+            if response.status_code not in (404, 405):
+                return {"deleted": 0, "missing": 0, "failed": len(ids)}
+            self.bulk[collection] = False
+        counts = {"deleted": 0, "missing": 0, "failed": 0}
+        for record_id in ids:
+            status = self.call("DELETE", COLLECTIONS[collection]["delete"].format(id=record_id)).status_code
+            counts["deleted" if status == 200 else "missing" if status == 404 else "failed"] += 1
+        return counts
+
+    def delete(self, ids: Dict[str, List[str]]) -> Dict[str, Any]:
+        """Delete the given ids per collection; returns deleted/missing/failed counts per collection"""
+        started, calls = time.perf_counter(), self.calls
+        totals = {name: {"deleted": 0, "missing": 0, "failed": 0} for name in COLLECTIONS}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reaper") as pool:
+            # One collection at a time, in COLLECTIONS order; its batches run concurrently
+            for name in COLLECTIONS:
+                batch_size = self.batch_size if self.bulk[name] else 1
+                wanted = ids.get(name, [])
+                jobs = [pool.submit(self.delete_batch, name, wanted[start:start + batch_size])
+                        for start in range(0, len(wanted), batch_size)]
+                for job in jobs:
+                    for key, value in job.result().items():
+                        totals[name][key] += value
+        return {"collections": totals, "calls": self.calls - calls, "max_in_flight": self.max_in_flight,
+                "seconds": time.perf_counter() - started}
+
+    def reap_run(self, ledger: RunLedger) -> Dict[str, Any]:
+        """End-of-run cleanup: delete exactly what one run's ledger recorded"""
+        return self.delete(ledger.ids())
+
+    def sweep(self, grace: timedelta = SWEEP_GRACE, dry_run: bool = False) -> Dict[str, Any]:
+        """Periodic cleanup: delete pattern-matched records older than grace, whichever run left them"""
+        found = self.find(grace)
+        if dry_run:
+            return {"collections": {name: {"found": len(ids)} for name, ids in found.items()}}
+        return self.delete(found)
+
+
+def admin_reaper(base_url: str, concurrency: int = REAPER_CONCURRENCY,
+                 batch_size: int = REAPER_BATCH_SIZE) -> DataReaper:
+    """A reaper logged in as the admin, on a client that records nothing in a ledger of its own"""
+    from backend_test import ADMIN_EMAIL, ADMIN_PASSWORD, VianScientificAPITester
+
+    client = VianScientificAPITester(base_url, record_ledger=False)
+    response = client.make_request("POST", "/auth/login", {"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+    if response.status_code != 200:
+        raise RuntimeError(f"Admin login failed: {response.status_code} {response.text}")
+    return DataReaper(client, response.json()["access_token"], concurrency, batch_size)
+
+
+def reap_ledger(base_url: str, ledger: RunLedger) -> Optional[Dict[str, Any]]:
+    """End-of-run cleanup for tools that create test data outside a tester run; None if there is nothing to delete"""
+    if not any(ledger.ids().values()):
+        return None
+    return admin_reaper(base_url).reap_run(ledger)
+
+
+def reaped_count(result: Optional[Dict[str, Any]]) -> int:
+    return sum(counts["deleted"] for counts in result["collections"].values()) if result else 0
+
+
+def print_summary(result: Dict[str, Any]):
+    for name, counts in result["collections"].items():
+        print(f"   {name}: " + ", ".join(f"{value} {key}" for key, value in counts.items()))
+    if "calls" in result:
+        print(f"   {result['calls']} calls, at most {result['max_in_flight']} in flight, {result['seconds']:.1f}s")
+
+
+def main():
+    """Reap one run's records from its ledger, or sweep old test records by pattern, once or periodically"""
+    import argparse
+    from backend_test import BASE_URL
+
+    parser = argparse.ArgumentParser(description="Delete test data left behind by API test runs")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--run-id", help="Reap the records in this run's ledger instead of sweeping")
+    parser.add_argument("--ledger-dir", default=os.getenv("VIAN_LEDGER_DIR"), help="Where run ledgers are written")
+    parser.add_argument("--grace-hours", type=float, default=SWEEP_GRACE.total_seconds() / 3600,
+                        help="Sweeps skip records younger than this")
+    parser.add_argument("--interval", type=float, nargs="?", const=SWEEP_INTERVAL,
+                        help=f"Keep sweeping, every this many seconds (default {SWEEP_INTERVAL:.0f})")
+    parser.add_argument("--concurrency", type=int, default=REAPER_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=REAPER_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Only count what a sweep would delete")
+    args = parser.parse_args()
+
+    try:
+        reaper = admin_reaper(args.base_url, args.concurrency, args.batch_size)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+    print("🧹 TEST DATA REAPER")
+    print("=" * 50)
+    if args.run_id:
+        if not args.ledger_dir:
+            raise SystemExit("--run-id needs --ledger-dir (or VIAN_LEDGER_DIR)")
+        result = reaper.reap_run(RunLedger.load(args.ledger_dir, args.run_id))
+        print(f"🗑️ Reaped run {args.run_id}")
+        print_summary(result)
+        return result
+
+    grace = timedelta(hours=args.grace_hours)
+    while True:
+        result = reaper.sweep(grace, args.dry_run)
+        print(f"{'🔍 Would delete' if args.dry_run else '🗑️ Swept'} test records older than {args.grace_hours:g}h")
+        print_summary(result)
+        if not args.interval:
+            return result
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Bulk Notification Campaigns for Vian Scientific Platform
+Streams recipients, renders messages lazily and fans out over a pool of SMTP sessions
+"""
+
+import json
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from email_templates import CATALOG_UPDATE_TEMPLATE, QUOTE_STATUS_TEMPLATE, CompiledEmailTemplate
+
+# Configuration
+BASE_URL = "https://scientific-shop.preview.vianscientific.com/api"
+BACKEND_ENV_FILE = "/app/backend/.env"
+DEFAULT_SESSIONS = 4  # Concurrent SMTP sessions
+DEFAULT_RATE_PER_SECOND = 10.0  # Provider send limit shared by all sessions
+CHECKPOINT_FSYNC_EVERY = 50  # Sent addresses between fsyncs of the checkpoint file
+USER_PAGE_SIZE = 500  # Recipients per page read from the admin user list
+
+TEMPLATES = {
+    "catalog-update": CATALOG_UPDATE_TEMPLATE,
+    "quote-status": QUOTE_STATUS_TEMPLATE,
+}
+
+
+def load_smtp_config(env_file: str = BACKEND_ENV_FILE) -> Dict[str, Any]:
+    """Read the SMTP relay settings used by the backend email service"""
+    from dotenv import load_dotenv
+
+    load_dotenv(env_file)
+    return {
+        "host": os.getenv("EMAIL_HOST", "smtp-relay.brevo.com"),
+        "port": int(os.getenv("EMAIL_PORT", "587")),
+        "username": os.getenv("EMAIL_USERNAME"),
+        "password": os.getenv("EMAIL_PASSWORD"),
+        "sender": os.getenv("EMAIL_FROM", os.getenv("EMAIL_USERNAME")),
+        "starttls": True,
+    }
+
+
+def open_smtp_session(config: Dict[str, Any], timeout: float = 30) -> smtplib.SMTP:
+    """Connect, secure and authenticate one SMTP session"""
+    if config.get("mode") == "tls" or config["port"] == 465:
+        server = smtplib.SMTP_SSL(config["host"], config["port"], timeout=timeout,
+                                  context=ssl.create_default_context())
+    else:
+        server = smtplib.SMTP(config["host"], config["port"], timeout=timeout)
+        server.ehlo()
+        if config.get("starttls", True):
+            server.starttls(context=ssl.create_default_context())
+            server.ehlo()
+    if config.get("username"):
+        server.login(config["username"], config["password"])
+    return server
+
+
+def close_session(session: Optional[smtplib.SMTP], graceful: bool = False):
+    """QUIT a healthy session, or just close the socket of a broken one"""
+    if session is None:
+        return
+    try:
+        if graceful:
+            session.quit()
+            return
+    except (smtplib.SMTPException, OSError):
+        pass
+    session.close()
+
+
+def iter_users_from_api(base_url: str, admin_email: str, admin_password: str,
+                        page_size: int = USER_PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield active users from the admin user list, one cursor page in memory at a time"""
+    from backend_test import VianScientificAPITester
+
+    client = VianScientificAPITester(base_url, record_ledger=False)
+    response = client.make_request("POST", "/auth/login", {"email": admin_email, "password": admin_password})
+    response.raise_for_status()
+    token = response.json()["access_token"]
+
+    for user in client.iter_pages("/admin/users", token, page_size):
+        if user.get("is_active", True):
+            yield user
+
+
+def iter_users_from_file(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield users from a JSON-lines file, one object per line"""
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TokenBucket:
+    """Token bucket shared by all SMTP sessions so the campaign stays within provider limits"""
+
+    def __init__(self, rate_per_second: float, burst: Optional[int] = None):
+        self.rate = rate_per_second
+        self.capacity = burst or 1
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CampaignCheckpoint:
+    """Append-only record of delivered addresses so a restarted campaign skips them"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sent = set()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.sent.update(line.strip() for line in f if line.strip())
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+        self.unsynced = 0
+
+    def __contains__(self, email: str) -> bool:
+        return email in self.sent
+
+    def mark_sent(self, email: str):
+        with self.lock:
+            self.sent.add(email)
+            self.file.write(f"{email}\n")
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= CHECKPOINT_FSYNC_EVERY:
+                os.fsync(self.file.fileno())
+                self.unsynced = 0
+
+    def close(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+
+class CampaignSender:
+    """Send one templated message per recipient over a pool of SMTP sessions"""
+
+    def __init__(self, smtp_config: Dict[str, Any], template: CompiledEmailTemplate,
+                 checkpoint_path: str, sessions: int = DEFAULT_SESSIONS,
+                 rate_per_second: float = DEFAULT_RATE_PER_SECOND,
+                 session_factory: Callable[[Dict[str, Any]], smtplib.SMTP] = open_smtp_session):
+        self.smtp_config = smtp_config
+        self.template = template
+        self.checkpoint = CampaignCheckpoint(checkpoint_path)
+        self.sessions = sessions
+        self.rate_limiter = TokenBucket(rate_per_second)
+        self.session_factory = session_factory
+        self.stats = {"sent": 0, "skipped": 0, "failed": 0, "reconnects": 0, "aborted": None, "errors": []}
+        self.stats_lock = threading.Lock()
+        self.aborted = threading.Event()
+
+    def count(self, key: str, error: Optional[str] = None):
+        with self.stats_lock:
+            self.stats[key] += 1
+            if error:
+                self.stats["errors"].append(error)
+
+    def send_one(self, session: smtplib.SMTP, recipient: Dict[str, Any],
+                 values: Callable[[Dict[str, Any]], Dict[str, str]]):
+        # Rendering happens here, per worker, so only queued recipients are ever materialised
+        email = recipient["email"]
+        message = self.template.render(email, **values(recipient))
+        self.rate_limiter.acquire()
+        session.sendmail(self.smtp_config["sender"], [email], message)
+
+    def worker(self, work: "queue.Queue", values: Callable[[Dict[str, Any]], Dict[str, str]]):
+        session = None
+        try:
+            while True:
+                recipient = work.get()
+                if recipient is None:
+                    return
+                if self.aborted.is_set():
+                    continue  # Drain without sending; the checkpoint leaves these for a resumed run
+                email = recipient["email"]
+                for attempt in range(2):
+                    try:
+                        if session is None:
+                            session = self.session_factory(self.smtp_config)
+                        self.send_one(session, recipient, values)
+                        self.checkpoint.mark_sent(email)
+                        self.count("sent")
+                        break
+                    except smtplib.SMTPRecipientsRefused as e:
+                        self.count("failed", f"{email}: {e}")
+                        break
+                    except smtplib.SMTPAuthenticationError as e:
+                        # Every session uses the same credentials, so no later message can succeed either
+                        close_session(session)
+                        session = None
+                        self.abort(f"SMTP authentication failed: {e}")
+                        break
+                    # SMTP errors are OSErrors too: only a lost connection is worth a reconnect,
+                    # an error reply from a working session fails just this message
+                    except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                        self.reconnect(session, email, attempt, e)
+                        session = None
+                    except (smtplib.SMTPException, ValueError, KeyError) as e:
+                        self.count("failed", f"{email}: {e}")
+                        break
+                    except OSError as e:
+                        self.reconnect(session, email, attempt, e)
+                        session = None
+        finally:
+            close_session(session, graceful=True)
+
+    def reconnect(self, session: Optional[smtplib.SMTP], email: str, attempt: int, error: Exception):
+        """Close a broken session; the message is retried once on a fresh connection"""
+        close_session(session)
+        if attempt == 0:
+            self.count("reconnects")
+        else:
+            self.count("failed", f"{email}: {error}")
+
+    def abort(self, error: str):
+        with self.stats_lock:
+            if not self.aborted.is_set():
+                self.stats["aborted"] = error
+                self.stats["errors"].append(error)
+        self.aborted.set()
+
+    def run(self, recipients: Iterable[Dict[str, Any]],
+            values: Callable[[Dict[str, Any]], Dict[str, str]],
+            max_messages: Optional[int] = None) -> Dict[str, Any]:
+        """Deliver the campaign; max_messages stops early, as a crash would"""
+        # A small bounded queue keeps memory flat no matter how many recipients stream in
+        work = queue.Queue(maxsize=self.sessions * 2)
+        workers = [
+            threading.Thread(target=self.worker, args=(work, values), daemon=True)
+            for _ in range(self.sessions)
+        ]
+        for thread in workers:
+            thread.start()
+
+        started = time.perf_counter()
+        queued = 0
+        try:
+            for recipient in recipients:
+                email = recipient.get("email")
+                if not email or email in self.checkpoint:
+                    self.count("skipped")
+                    continue
+                if self.aborted.is_set() or (max_messages is not None and queued >= max_messages):
+                    break
+                work.put(recipient)
+                queued += 1
+        finally:
+            for _ in workers:
+                work.put(None)
+            for thread in workers:
+                thread.join()
+            self.checkpoint.close()
+
+        self.stats["duration"] = time.perf_counter() - started
+        return self.stats
+
+
+def default_values(recipient: Dict[str, Any], extra: Dict[str, str]) -> Dict[str, str]:
+    """Template values for one recipient: their name plus the campaign-wide fields"""
+    values = {"name": recipient.get("full_name") or recipient["email"].split("@")[0]}
+    values.update(extra)
+    for key in ("quote_id", "status"):
+        if key in recipient:
+            values[key] = str(recipient[key])
+    return values
+
+
+def main():
+    """Run a notification campaign from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Send a bulk notification campaign")
+    parser.add_argument("template", choices=sorted(TEMPLATES), help="Campaign template")
+    parser.add_argument("--checkpoint", required=True, help="Checkpoint file; reuse it to resume")
+    parser.add_argument("--recipients", help="JSON-lines recipient file (default: active users from the API)")
+    parser.add_argument("--base-url", default=BASE_URL, help="API base URL for the user list")
+    parser.add_argument("--message", default="", help="Body text for catalog-update campaigns")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="Concurrent SMTP sessions")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SECOND, help="Messages per second")
+    args = parser.parse_args()
+
+    print("📨 BULK NOTIFICATION CAMPAIGN")
+    print("=" * 50)
+
+    if args.recipients:
+        recipients = iter_users_from_file(args.recipients)
+    else:
+        recipients = iter_users_from_api(args.base_url, os.environ["ADMIN_EMAIL"], os.environ["ADMIN_PASSWORD"])
+
+    extra = {"message": args.message} if args.template == "catalog-update" else {}
+    sender = CampaignSender(load_smtp_config(), TEMPLATES[args.template], args.checkpoint,
+                            sessions=args.sessions, rate_per_second=args.rate)
+    print(f"   Resuming with {len(sender.checkpoint.sent)} already delivered")
+
+    stats = sender.run(recipients, lambda recipient: default_values(recipient, extra))
+
+    print(f"✅ Sent: {stats['sent']}")
+    print(f"⏭️ Skipped: {stats['skipped']}")
+    print(f"❌ Failed: {stats['failed']}")
+    print(f"🔁 Reconnects: {stats['reconnects']}")
+    if stats["aborted"]:
+        print(f"🛑 Aborted: {stats['aborted']}")
+    print(f"⏱️ Duration: {stats['duration']:.1f}s")
+    for error in stats["errors"][:20]:
+        print(f"   {error}")
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,26 @@
 """
 Email Service Diagnosis for Vian Scientific Platform
 Comprehensive diagnosis of Gmail SMTP authentication issues
+and concurrent latency ranking of candidate relays
 """
 
 import os
 import smtplib
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 
+PROBE_TIMEOUT = 10  # Seconds per relay probe
+DEFAULT_RELAYS = [
+    "smtp-relay.brevo.com:587",
+    "smtp-relay.brevo.com:465",
+    "smtp-relay.brevo.com:2525",
+    "smtp.gmail.com:587",
+    "smtp.gmail.com:465",
+]
+
 def diagnose_email_service():
     """Diagnose email service configuration and connectivity"""
     
@@ -30,8 +44,9 @@ def diagnose_email_service():
     print(f"   Password Length: {len(password) if password else 0}")
     print()
     
-    # Test 1: Basic connectivity
+    # Test 1 and 2 share one connection: connectivity first, then authentication
     print("🔍 Test 1: SMTP Server Connectivity")
+    connected = False
     try:
         with smtplib.SMTP(host, port) as server:
             print("   ✅ Successfully connected to SMTP server")
@@ -47,20 +62,10 @@ def diagnose_email_service():
             # Test EHLO after TLS
             code, message = server.ehlo()
             print(f"   ✅ EHLO after TLS successful: {code}")
+            connected = True
             
-    except Exception as e:
-        print(f"   ❌ Connection failed: {e}")
-        return False
-    
-    print()
-    
-    # Test 2: Authentication
-    print("🔐 Test 2: SMTP Authentication")
-    try:
-        with smtplib.SMTP(host, port) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
+            print()
+            print("🔐 Test 2: SMTP Authentication")
             
             # Try authentication
             server.login(username, password)
@@ -100,9 +105,99 @@ def diagnose_email_service():
         return False
         
     except Exception as e:
-        print(f"   ❌ Unexpected error: {e}")
+        if connected:
+            print(f"   ❌ Unexpected error: {e}")
+        else:
+            print(f"   ❌ Connection failed: {e}")
         return False
 
+def parse_relay(spec: str) -> Dict[str, Any]:
+    """Parse a relay given as host:port[:mode], where mode is starttls, tls or plain"""
+    parts = spec.strip().split(":")
+    host = parts[0]
+    port = int(parts[1]) if len(parts) > 1 else 587
+    mode = parts[2] if len(parts) > 2 else ("tls" if port == 465 else "starttls")
+    return {"host": host, "port": port, "mode": mode}
+
+def probe_relay(relay: Dict[str, Any], username: Optional[str] = None, password: Optional[str] = None,
+                timeout: float = PROBE_TIMEOUT) -> Dict[str, Any]:
+    """Probe one relay over a single connection, timing each handshake phase"""
+    host, port, mode = relay["host"], relay["port"], relay["mode"]
+    result = {"relay": f"{host}:{port}", "mode": mode, "phases": {}, "ok": False,
+              "authenticated": False, "failed_phase": None, "error": None}
+    phases = result["phases"]
+    phase = "connect"
+    context = ssl.create_default_context()
+    # With implicit TLS the handshake happens inside connect(), before the server says anything,
+    # so it is timed as part of the connect phase
+    server = smtplib.SMTP_SSL(timeout=timeout, context=context) if mode == "tls" else smtplib.SMTP(timeout=timeout)
+    
+    def timed(name, action):
+        nonlocal phase
+        phase = name
+        started = time.perf_counter()
+        value = action()
+        phases[name] = (time.perf_counter() - started) * 1000
+        return value
+    
+    try:
+        # TCP connect and the 220 banner
+        code, banner = timed("connect", lambda: server.connect(host, port))
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, banner)
+        timed("ehlo", server.ehlo)
+        
+        if mode == "starttls":
+            def starttls():
+                server.starttls(context=context)
+                server.ehlo()
+            timed("tls", starttls)
+        result["ok"] = True
+        
+        if username and password:
+            timed("auth", lambda: server.login(username, password))
+            result["authenticated"] = True
+    except Exception as e:
+        result["failed_phase"] = phase
+        result["error"] = str(e) or e.__class__.__name__
+    finally:
+        try:
+            server.close()
+        except Exception:
+            pass
+    
+    result["total_ms"] = sum(phases.values())
+    return result
+
+def rank_relays(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Order relays by success (authenticated, then reachable) and then by handshake latency"""
+    return sorted(results, key=lambda r: (not r["authenticated"], not r["ok"], r["total_ms"]))
+
+def diagnose_relays(relays: List[Dict[str, Any]], username: Optional[str] = None,
+                    password: Optional[str] = None, timeout: float = PROBE_TIMEOUT) -> List[Dict[str, Any]]:
+    """Probe candidate relays concurrently and print them ranked for failover decisions"""
+    print("\n🌐 MULTI-RELAY DIAGNOSIS")
+    print("=" * 50)
+    print(f"   Probing {len(relays)} relays concurrently (timeout {timeout:.0f}s)")
+    
+    with ThreadPoolExecutor(max_workers=len(relays) or 1) as pool:
+        results = list(pool.map(lambda relay: probe_relay(relay, username, password, timeout), relays))
+    ranked = rank_relays(results)
+    
+    for position, result in enumerate(ranked, 1):
+        timings = ", ".join(f"{name} {ms:.0f}ms" for name, ms in result["phases"].items())
+        if result["authenticated"]:
+            status = "✅ AUTH OK"
+        elif result["ok"]:
+            status = "⚠️ REACHABLE"
+        else:
+            status = f"❌ FAILED at {result['failed_phase']}"
+        print(f"   {position}. {result['relay']} ({result['mode']}) {status} - {result['total_ms']:.0f}ms [{timings}]")
+        if result["error"]:
+            print(f"      Error: {result['error']}")
+    
+    return ranked
+
 def test_email_service_integration():
     """Test the email service integration"""
     print("\n🧪 Test 3: Email Service Integration")
@@ -140,6 +235,20 @@ def test_email_service_integration():
 
 def main():
     """Run complete email service diagnosis"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Diagnose the email service SMTP configuration")
+    parser.add_argument("--relays", nargs="?", const=",".join(DEFAULT_RELAYS),
+                        help="Probe a comma-separated list of host:port[:mode] relays concurrently "
+                             "(default list when no value is given, or EMAIL_RELAYS)")
+    args = parser.parse_args()
+    
+    if args.relays or os.getenv("EMAIL_RELAYS"):
+        load_dotenv('/app/backend/.env')
+        specs = (args.relays or os.getenv("EMAIL_RELAYS")).split(",")
+        ranked = diagnose_relays([parse_relay(spec) for spec in specs if spec.strip()],
+                                 os.getenv('EMAIL_USERNAME'), os.getenv('EMAIL_PASSWORD'))
+        return bool(ranked) and ranked[0]["authenticated"]
     
     connectivity_ok = diagnose_email_service()
     integration_ok = test_email_service_integration()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Non-Blocking Email Dispatch for Vian Scientific Platform
+Queues transactional emails for background SMTP sessions, with completion callbacks and delivery metrics
+"""
+
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+from email_campaign import close_session, open_smtp_session
+from email_templates import render_password_reset_email, render_welcome_email
+from latency_stats import percentile
+from smtp_relays import RelayPool
+
+DISPATCH_SESSIONS = 2  # Background SMTP sessions; transactional volume is low, latency is what matters
+DISPATCH_QUEUE_SIZE = 1000  # Messages waiting for a session; beyond this submit() fails fast
+DISPATCH_LATENCY_HISTORY = 1000  # Recent send times kept for the percentiles in stats()
+
+
+class EmailDispatcher:
+    """Fire-and-forget sends: submit() queues a message and returns a Future at once
+
+    Request handlers call send_welcome_email() or send_password_reset_email() and return without
+    waiting on SMTP. Each Future resolves to the recipient when the message is accepted, or to
+    the SMTP error, and runs its callbacks on the session thread, so callbacks must be quick.
+    Error handling per message follows CampaignSender: a refused recipient or error reply fails
+    that message, a lost connection is retried once on a fresh session. Given a RelayPool, sends
+    go through it instead, failing over between its relays; smtp_config then only needs "sender".
+    """
+
+    def __init__(self, smtp_config: Dict[str, Any], sessions: int = DISPATCH_SESSIONS,
+                 max_queue: int = DISPATCH_QUEUE_SIZE, on_complete: Optional[Callable[[Future], None]] = None,
+                 session_factory: Callable[[Dict[str, Any]], smtplib.SMTP] = open_smtp_session,
+                 relays: Optional[RelayPool] = None):
+        self.smtp_config = smtp_config
+        self.relays = relays
+        self.sessions = sessions
+        self.session_factory = session_factory
+        self.on_complete = on_complete  # Called for every message, e.g. to log failures the caller never waits for
+        self.work: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.counts = {"submitted": 0, "sent": 0, "failed": 0, "rejected": 0, "reconnects": 0}
+        self.send_ms: List[float] = []  # Submit to accepted, queueing included
+        self.errors: List[str] = []
+        self.idle = threading.Condition(self.lock)
+        self.pending = 0
+        self.threads: List[threading.Thread] = []
+
+    def start(self) -> "EmailDispatcher":
+        self.threads = [threading.Thread(target=self.worker, name=f"email-dispatch-{n}", daemon=True)
+                        for n in range(self.sessions)]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def submit(self, to_email: str, message: bytes, callback: Optional[Callable[[Future], None]] = None) -> Future:
+        """Queue one message; never blocks, a full queue fails the Future straight away"""
+        future: Future = Future()
+        for done in (callback, self.on_complete):
+            if done:
+                future.add_done_callback(done)
+        with self.lock:
+            self.counts["submitted"] += 1
+            self.pending += 1
+        try:
+            self.work.put_nowait((to_email, message, future, time.perf_counter()))
+        except queue.Full:
+            self.finish(future, "rejected", error=RuntimeError("Email dispatch queue is full"))
+        return future
+
+    def send_welcome_email(self, to_email: str, name: str, callback: Optional[Callable[[Future], None]] = None) -> Future:
+        return self.submit(to_email, render_welcome_email(to_email, name), callback)
+
+    def send_password_reset_email(self, to_email: str, name: str, code: str,
+                                  callback: Optional[Callable[[Future], None]] = None) -> Future:
+        return self.submit(to_email, render_password_reset_email(to_email, name, code), callback)
+
+    def finish(self, future: Future, outcome: str, submitted: Optional[float] = None,
+               result: Optional[str] = None, error: Optional[Exception] = None):
+        with self.lock:
+            self.counts[outcome] += 1
+            if submitted is not None:
+                self.send_ms.append((time.perf_counter() - submitted) * 1000)
+                del self.send_ms[:-DISPATCH_LATENCY_HISTORY]
+            if error is not None:
+                self.errors.append(str(error))
+        # Outside the lock: callbacks run now and may call stats() or submit()
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        finally:
+            with self.lock:
+                self.pending -= 1  # Only now, so drain() returns after the callbacks have run
+                if not self.pending:
+                    self.idle.notify_all()
+
+    def worker(self):
+        session = None
+        try:
+            while True:
+                item = self.work.get()
+                if item is None:
+                    return
+                to_email, message, future, submitted = item
+                try:
+                    if self.relays is not None:
+                        self.send_via_relays(to_email, message, future, submitted)
+                        continue
+                    for attempt in range(2):
+                        try:
+                            if session is None:
+                                session = self.session_factory(self.smtp_config)
+                            session.sendmail(self.smtp_config["sender"], [to_email], message)
+                            self.finish(future, "sent", submitted, result=to_email)
+                            break
+                        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                            close_session(session)
+                            session = None
+                            if attempt:
+                                self.finish(future, "failed", submitted, error=e)
+                            else:
+                                with self.lock:
+                                    self.counts["reconnects"] += 1
+                        except (smtplib.SMTPException, ValueError) as e:
+                            self.finish(future, "failed", submitted, error=e)
+                            break
+                        except OSError as e:
+                            close_session(session)
+                            session = None
+                            if attempt:
+                                self.finish(future, "failed", submitted, error=e)
+                except Exception as e:
+                    # A bug, say in a session factory, fails this message; the worker lives on for the rest
+                    close_session(session)
+                    session = None
+                    if not future.done():
+                        self.finish(future, "failed", submitted, error=e)
+        finally:
+            close_session(session, graceful=True)
+
+    def send_via_relays(self, to_email: str, message: bytes, future: Future, submitted: float):
+        """The pool keeps the sessions and fails over; a message every relay refuses fails here"""
+        try:
+            self.relays.send(self.smtp_config["sender"], [to_email], message)
+        except (smtplib.SMTPException, OSError, ValueError) as e:
+            self.finish(future, "failed", submitted, error=e)
+            return
+        self.finish(future, "sent", submitted, result=to_email)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every submitted message has been sent or failed"""
+        with self.idle:
+            return self.idle.wait_for(lambda: not self.pending, timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Deliver what is queued, then end the sessions; gives up after timeout if the queue will not drain"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        remaining = lambda: None if deadline is None else max(0.0, deadline - time.monotonic())
+        for _ in self.threads:
+            try:
+                self.work.put(None, timeout=remaining())
+            except queue.Full:
+                break
+        for thread in self.threads:
+            thread.join(remaining())
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            latencies = list(self.send_ms)
+            stats = dict(self.counts, pending=self.pending, errors=self.errors[-10:],
+                         p50_ms=percentile(latencies, 0.50), p99_ms=percentile(latencies, 0.99))
+        if self.relays is not None:
+            stats["relays"] = self.relays.snapshot()
+        return stats
+
+    def __enter__(self) -> "EmailDispatcher":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
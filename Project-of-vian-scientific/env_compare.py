@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Environment Comparison for Vian Scientific Platform
+Runs the same scenario set against several base URLs at once and reports correctness and latency side by side
+"""
+
+import contextlib
+import io
+import json
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from latency_stats import percentile
+
+BACKEND_TESTS = ["test_root_endpoint", "test_user_registration", "test_user_login", "test_admin_login",
+                 "test_get_current_user", "test_products_endpoints", "test_categories_endpoints",
+                 "test_quote_management", "test_admin_quotes_management", "test_site_content_management_api"]
+EMAIL_TESTS = ["test_email_dispatch_latency"]  # Only checks that go through the API, not local backend logs
+SUITES = {"backend": BACKEND_TESTS, "email": EMAIL_TESTS}
+START_TIMEOUT = 120.0  # Seconds to wait for every worker process to be ready to start
+SLOWDOWN_RATIO = 1.5  # p50 this many times the baseline's counts as an environment-specific slowdown
+SLOWDOWN_FLOOR_MS = 20.0  # ...and only if it is also at least this many milliseconds slower
+
+
+def parse_target(spec: str) -> Tuple[str, str]:
+    """(name, base_url) from 'name=https://host/api', or a bare URL named after its host"""
+    name, separator, url = spec.partition("=")
+    if not separator:
+        url = spec
+        name = spec.split("//", 1)[-1].split("/", 1)[0]
+    if not url.startswith(("http://", "https://")):
+        raise ValueError(f"Target URL must start with http:// or https://: {spec}")
+    return name, url.rstrip("/")
+
+
+start_barrier = None  # Shared by the worker processes of one run_targets() call
+
+
+def init_worker(barrier):
+    global start_barrier
+    start_barrier = barrier
+
+
+def run_target(name: str, base_url: str, suites: Dict[str, List[str]], reap: bool = True) -> Dict[str, Any]:
+    """Run the suites against one base URL, in its own process; returns per-check results and per-endpoint latency"""
+    from backend_test import VianScientificAPITester, endpoint_key
+    from email_test import EmailServiceTester
+
+    latencies: Dict[str, List[float]] = {}
+    errors = Counter()
+    checks: Dict[str, bool] = {}
+
+    def record(entry: Dict[str, Any]):
+        key = endpoint_key(entry["method"], entry["endpoint"])
+        latencies.setdefault(key, []).append(entry["elapsed"] * 1000)
+        response = entry["response"]
+        if entry["error"] is not None or (response is not None and response.status_code >= 500):
+            errors[key] += 1
+
+    def observe(tester, suite: str):
+        log_result = tester.log_result
+
+        def log_check(test_name: str, success: bool, message: str = ""):
+            key = f"{suite}: {test_name}"
+            checks[key] = checks.get(key, True) and bool(success)
+            log_result(test_name, success, message)
+        tester.log_result = log_check
+        tester.request_hooks.append(record)
+        return tester
+
+    testers = {"backend": VianScientificAPITester, "email": EmailServiceTester}
+    if start_barrier is not None:
+        start_barrier.wait(START_TIMEOUT)  # Imports done everywhere: all targets start together
+    started_at, started = time.time(), time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for suite, tests in suites.items():
+            tester = observe(testers[suite](base_url), suite)
+            for test in tests:
+                getattr(tester, test)()
+            if reap:
+                tester.reap_test_data()
+    return {
+        "name": name,
+        "base_url": base_url,
+        "started_at": started_at,
+        "seconds": time.perf_counter() - started,
+        "checks": checks,
+        "endpoints": {key: {"count": len(values), "p50_ms": percentile(values, 0.50),
+                            "p95_ms": percentile(values, 0.95), "errors": errors[key]}
+                      for key, values in latencies.items()},
+    }
+
+
+def run_targets(targets: List[Tuple[str, str]], suites: Optional[Dict[str, List[str]]] = None,
+                reap: bool = True) -> List[Dict[str, Any]]:
+    """Run every target at the same moment, one process each, so no target's client work slows another's"""
+    suites = suites or {"backend": BACKEND_TESTS}
+    # Spawned, not forked: the caller may have server threads running that a fork would copy mid-request
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(len(targets))
+    with ProcessPoolExecutor(max_workers=len(targets), mp_context=context,
+                             initializer=init_worker, initargs=(barrier,)) as pool:
+        futures = [pool.submit(run_target, name, url, suites, reap) for name, url in targets]
+        return [future.result() for future in futures]
+
+
+def compare(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Side-by-side checks and endpoint latencies; the first report is the baseline for deltas"""
+    names = [report["name"] for report in reports]
+    baseline = reports[0]
+
+    check_names = list(dict.fromkeys(check for report in reports for check in report["checks"]))
+    checks = []
+    for check in check_names:
+        results = {report["name"]: report["checks"].get(check) for report in reports}
+        checks.append({"check": check, "results": results, "consistent": len(set(results.values())) == 1})
+
+    endpoint_names = sorted({key for report in reports for key in report["endpoints"]})
+    endpoints = []
+    for key in endpoint_names:
+        stats = {report["name"]: report["endpoints"].get(key) for report in reports}
+        base = baseline["endpoints"].get(key)
+        deltas, slower = {}, []
+        for name in names[1:]:
+            if base is None or stats[name] is None:
+                continue
+            delta = stats[name]["p50_ms"] - base["p50_ms"]
+            deltas[name] = delta
+            if delta >= SLOWDOWN_FLOOR_MS and stats[name]["p50_ms"] >= base["p50_ms"] * SLOWDOWN_RATIO:
+                slower.append(name)
+        endpoints.append({"endpoint": key, "stats": stats, "p50_delta_ms": deltas, "slower": slower})
+
+    return {
+        "targets": [{"name": report["name"], "base_url": report["base_url"], "started_at": report["started_at"],
+                     "seconds": report["seconds"]} for report in reports],
+        "checks": checks,
+        "mismatches": [row for row in checks if not row["consistent"]],
+        "endpoints": endpoints,
+        "slowdowns": [row for row in endpoints if row["slower"]],
+    }
+
+
+def print_comparison(comparison: Dict[str, Any]):
+    names = [target["name"] for target in comparison["targets"]]
+    width = max(12, *(len(name) + 2 for name in names))
+    mark = {True: "✅", False: "❌", None: "–"}
+
+    print(f"\n{'CHECK':<60}" + "".join(f"{name:>{width}}" for name in names))
+    for row in comparison["checks"]:
+        flag = "" if row["consistent"] else "  ⚠️"
+        print(f"{row['check'][:59]:<60}" + "".join(f"{mark[row['results'][name]]:>{width - 1}}" for name in names) + flag)
+
+    print(f"\n{'ENDPOINT (p50 / p95 ms)':<45}" + "".join(f"{name:>{width + 14}}" for name in names) + "   Δp50 vs " + names[0])
+    for row in comparison["endpoints"]:
+        cells = []
+        for name in names:
+            stats = row["stats"][name]
+            if not stats:
+                cells.append("–")
+                continue
+            errors = f" ({stats['errors']} err)" if stats["errors"] else ""
+            cells.append(f"{stats['p50_ms']:.0f} / {stats['p95_ms']:.0f}{errors}")
+        deltas = ", ".join(f"{name} {delta:+.0f}" for name, delta in row["p50_delta_ms"].items())
+        flag = "  🐢 " + ", ".join(row["slower"]) if row["slower"] else ""
+        print(f"{row['endpoint'][:44]:<45}" + "".join(f"{cell:>{width + 14}}" for cell in cells) + f"   {deltas}{flag}")
+
+    print()
+    for target in comparison["targets"]:
+        print(f"   {target['name']}: {target['base_url']} in {target['seconds']:.1f}s")
+    print(f"⚖️ {len(comparison['mismatches'])} checks differ, {len(comparison['slowdowns'])} endpoints slower than {names[0]}")
+
+
+def main():
+    """Compare environments, e.g. env_compare.py staging=https://staging/api production=https://prod/api"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the same API scenarios against several environments at once")
+    parser.add_argument("targets", nargs="+", help="name=base_url per environment; the first is the baseline")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="Suites to run (default: backend)")
+    parser.add_argument("--tests", help="Comma-separated backend test methods instead of the default scenario")
+    parser.add_argument("--no-reap", action="store_true", help="Leave the records each run created")
+    parser.add_argument("--json", help="Also write the comparison to this file")
+    args = parser.parse_args()
+
+    targets = [parse_target(spec) for spec in args.targets]
+    if len({name for name, _ in targets}) != len(targets):
+        parser.error("Target names must be unique")
+    suites = {suite: list(SUITES[suite]) for suite in (args.suite or ["backend"])}
+    if args.tests and "backend" in suites:
+        suites["backend"] = [test.strip() for test in args.tests.split(",") if test.strip()]
+
+    print("⚖️ ENVIRONMENT COMPARISON")
+    print("=" * 50)
+    for name, url in targets:
+        print(f"   {name}: {url}")
+    comparison = compare(run_targets(targets, suites, reap=not args.no_reap))
+    print_comparison(comparison)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(comparison, f, indent=2)
+        print(f"💾 Comparison written to {args.json}")
+    return comparison
+
+
+if __name__ == "__main__":
+    main()
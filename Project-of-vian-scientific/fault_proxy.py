@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Fault-Injecting Proxy for Vian Scientific Platform
+Local HTTP proxy that adds latency, bandwidth caps, connection resets and 5xx bursts per endpoint
+"""
+
+import http.client
+import json
+import random
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding",
+                      "te", "trailer", "upgrade", "host", "content-length"}
+THROTTLE_TICK = 0.05  # Seconds between bandwidth-capped writes
+
+
+class FaultRule:
+    """Faults applied to requests whose path matches a regular expression"""
+
+    def __init__(self, pattern: str, methods: Optional[List[str]] = None, latency: float = 0.0,
+                 jitter: float = 0.0, bandwidth: Optional[int] = None, reset_rate: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, burst: int = 1,
+                 stall_rate: float = 0.0, stall: float = 0.0):
+        self.pattern = re.compile(pattern)
+        self.methods = [m.upper() for m in methods] if methods else None
+        self.latency = latency  # Seconds added before forwarding
+        self.jitter = jitter  # Extra uniformly random seconds on top of latency
+        self.bandwidth = bandwidth  # Response bytes per second, None for unlimited
+        self.reset_rate = reset_rate  # Probability the connection is reset instead of answered
+        self.error_rate = error_rate  # Probability a 5xx burst starts
+        self.error_status = error_status
+        self.burst = burst  # Consecutive requests failed once a burst starts
+        self.burst_remaining = 0
+        self.stall_rate = stall_rate  # Probability of a long stall, like a load-balancer hiccup
+        self.stall = stall  # Seconds added when a stall hits
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.methods is None or method in self.methods) and bool(self.pattern.search(path))
+
+    @classmethod
+    def parse(cls, spec: str) -> "FaultRule":
+        """Build a rule from 'PATTERN:key=value,...', e.g. '/products:latency=0.2,reset_rate=0.05'"""
+        pattern, _, options = spec.rpartition(":") if "=" in spec else (spec, "", "")
+        kwargs: Dict[str, Any] = {}
+        for option in filter(None, options.split(",")):
+            key, value = option.split("=", 1)
+            if key == "methods":
+                kwargs[key] = value.split("|")
+            elif key in ("bandwidth", "error_status", "burst"):
+                kwargs[key] = int(value)
+            else:
+                kwargs[key] = float(value)
+        return cls(pattern or ".*", **kwargs)
+
+
+class FaultProxyHandler(BaseHTTPRequestHandler):
+    """Forward each request upstream unless a matching rule decides to fail it"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.proxy("GET")
+
+    def do_POST(self):
+        self.proxy("POST")
+
+    def do_PUT(self):
+        self.proxy("PUT")
+
+    def do_DELETE(self):
+        self.proxy("DELETE")
+
+    def proxy(self, method: str):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else None
+        rule = server.match(method, self.path)
+
+        if rule:
+            delay = rule.latency + (server.random.uniform(0, rule.jitter) if rule.jitter else 0)
+            if rule.stall_rate and server.random.random() < rule.stall_rate:
+                server.count("stalls")
+                delay += rule.stall
+            if delay:
+                server.count("delayed")
+                time.sleep(delay)
+            if rule.reset_rate and server.random.random() < rule.reset_rate:
+                server.count("resets")
+                self.reset_connection()
+                return
+            if server.start_error(rule):
+                server.count("errors")
+                payload = json.dumps({"detail": "Injected fault"}).encode()
+                self.send_response(rule.error_status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+        headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        upstream = server.upstream_connection(server.upstream_host, server.upstream_port, timeout=server.upstream_timeout)
+        try:
+            upstream.request(method, server.upstream_prefix + self.path, body=body, headers=headers)
+            response = upstream.getresponse()
+            payload = response.read()
+        except OSError:
+            server.count("upstream_errors")
+            try:
+                self.send_error(502, "Upstream unavailable")
+            except OSError:
+                self.close_connection = True
+            return
+        finally:
+            upstream.close()
+
+        server.count("forwarded")
+        self.send_response(response.status)
+        for key, value in response.getheaders():
+            if key.lower() not in HOP_BY_HOP_HEADERS:
+                self.send_header(key, value)
+        self.send_header("Content-Length", str(len(payload)))
+        try:
+            self.end_headers()
+            self.write_throttled(payload, rule.bandwidth if rule else None)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up first, e.g. its timeout fired during injected latency
+            server.count("client_aborts")
+            self.close_connection = True
+
+    def write_throttled(self, payload: bytes, bandwidth: Optional[int]):
+        if not bandwidth:
+            self.wfile.write(payload)
+            return
+        chunk = max(1, int(bandwidth * THROTTLE_TICK))
+        for offset in range(0, len(payload), chunk):
+            self.wfile.write(payload[offset:offset + chunk])
+            self.wfile.flush()
+            if offset + chunk < len(payload):
+                time.sleep(THROTTLE_TICK)
+
+    def reset_connection(self):
+        """Close with SO_LINGER 0 so the client sees a TCP RST rather than a clean FIN"""
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self.close_connection = True
+        self.connection.close()
+
+
+class FaultProxy(ThreadingHTTPServer):
+    """Threaded fault-injecting proxy in front of one upstream base URL; use as a context manager"""
+
+    daemon_threads = True
+
+    def __init__(self, upstream: str, rules: Optional[List[FaultRule]] = None, port: int = 0,
+                 seed: Optional[int] = None, upstream_timeout: float = 60.0):
+        super().__init__(("127.0.0.1", port), FaultProxyHandler)
+        parsed = urlparse(upstream)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported upstream scheme: {parsed.scheme}")
+        self.upstream_connection = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        self.upstream_host = parsed.hostname
+        self.upstream_port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.upstream_prefix = parsed.path.rstrip("/")
+        self.upstream_timeout = upstream_timeout
+        self.rules = rules or []
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"forwarded": 0, "delayed": 0, "stalls": 0, "resets": 0, "errors": 0,
+                      "upstream_errors": 0, "client_aborts": 0}
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """Drop-in replacement for the upstream base URL"""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def match(self, method: str, path: str) -> Optional[FaultRule]:
+        """First rule matching the request, in the order given"""
+        return next((rule for rule in self.rules if rule.matches(method, path)), None)
+
+    def start_error(self, rule: FaultRule) -> bool:
+        with self.lock:
+            if rule.burst_remaining:
+                rule.burst_remaining -= 1
+                return True
+            if rule.error_rate and self.random.random() < rule.error_rate:
+                rule.burst_remaining = rule.burst - 1
+                return True
+            return False
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up early (abandoned streams, hedged losers, timeouts) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def start(self) -> "FaultProxy":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FaultProxy":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    """Run the fault proxy in front of an upstream API until interrupted"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fault-injecting proxy for client timeout and retry tests")
+    parser.add_argument("--upstream", required=True, help="Upstream base URL, e.g. http://localhost:8001/api")
+    parser.add_argument("--port", type=int, default=8002, help="Port to listen on")
+    parser.add_argument("--rule", action="append", default=[],
+                        help="PATTERN:key=value,... e.g. '/products:latency=0.2,jitter=0.5' "
+                             "or '/quotes:error_rate=0.1,burst=3,methods=POST' or '/content:stall_rate=0.02,stall=10'")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible fault sequences")
+    args = parser.parse_args()
+
+    proxy = FaultProxy(args.upstream, [FaultRule.parse(spec) for spec in args.rule], args.port, args.seed)
+    print(f"💥 Fault proxy listening on {proxy.base_url} -> {args.upstream} (Ctrl+C to stop)")
+    print(f"   Point the suites at it with VIAN_BASE_URL={proxy.base_url}")
+    for spec in args.rule:
+        print(f"   Rule: {spec}")
+    try:
+        proxy.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {proxy.stats}")
+    finally:
+        proxy.server_close()
+
+
+if __name__ == "__main__":
+    main()
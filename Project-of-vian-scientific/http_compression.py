@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+HTTP Response Compression for Vian Scientific Platform
+Content-Encoding negotiation, codecs and measured decoding for gzip, deflate, brotli and zstd
+"""
+
+import gzip
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import requests
+import urllib3
+
+try:
+    import brotli
+except ImportError:  # Optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: pip install zstandard
+    zstandard = None
+
+COMPRESSION_MIN_BYTES = 1024  # Smaller bodies are sent as-is; the framing overhead outweighs the saving
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Dynamic responses: higher qualities cost more CPU than they save on the wire
+ZSTD_LEVEL = 3
+
+
+def available_encodings() -> List[str]:
+    """Encodings this process can both produce and decode, most preferred first"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.extend(["gzip", "deflate"])
+    return encodings
+
+
+ACCEPT_ENCODING = ", ".join(available_encodings())
+
+
+def negotiate(accept_encoding: str, supported: Optional[List[str]] = None) -> Optional[str]:
+    """Pick the Content-Encoding for a response from an Accept-Encoding header, or None for identity
+
+    Highest q-value wins; ties go to the server's preference order. q=0 rules an encoding out.
+    """
+    supported = supported or available_encodings()
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        match = re.search(r"q=([0-9.]+)", params)
+        weights[token] = float(match.group(1)) if match else 1.0
+
+    best = None
+    best_weight = 0.0
+    for encoding in supported:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "deflate":
+        return zlib.compress(data, GZIP_LEVEL)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decompress(data: bytes, content_encoding: str) -> bytes:
+    """Undo a Content-Encoding header value, which may list several codings in the order applied"""
+    for encoding in reversed([e.strip().lower() for e in content_encoding.split(",") if e.strip()]):
+        if encoding == "identity":
+            continue
+        if encoding in ("gzip", "x-gzip"):
+            data = gzip.decompress(data)
+        elif encoding == "deflate":
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                data = zlib.decompress(data, -zlib.MAX_WBITS)  # Raw deflate, as some servers send
+        elif encoding == "br" and brotli is not None:
+            data = brotli.decompress(data)
+        elif encoding == "zstd" and zstandard is not None:
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+    return data
+
+
+class StreamCompressor:
+    """Incremental compressor for chunked responses; each compress() call returns a decodable block"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding in ("gzip", "deflate"):
+            self.codec = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+        elif encoding == "br" and brotli is not None:
+            self.codec = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == "zstd" and zstandard is not None:
+            self.codec = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self.codec.process(data) + self.codec.flush()
+        if self.encoding == "zstd":
+            return self.codec.compress(data) + self.codec.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self.codec.compress(data) + self.codec.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.codec.finish()
+        return self.codec.flush()
+
+
+def read_measured(response: requests.Response) -> Dict[str, Any]:
+    """Read a stream=True response's body as sent on the wire, then decode it with timing
+
+    The decoded body is installed on the response, so .content, .text and .json() behave as
+    for a normal request.
+    """
+    try:
+        encoded = response.raw.read(decode_content=False)
+    except urllib3.exceptions.ReadTimeoutError as e:
+        raise requests.exceptions.ReadTimeout(e, response=response)
+    except urllib3.exceptions.HTTPError as e:
+        raise requests.exceptions.ConnectionError(e, response=response)
+    encoding = response.headers.get("Content-Encoding", "identity")
+    started = time.perf_counter()
+    try:
+        decoded = decompress(encoded, encoding)
+    except (OSError, EOFError, ValueError, zlib.error) as e:
+        raise requests.exceptions.ContentDecodingError(e, response=response)
+    decode_ms = (time.perf_counter() - started) * 1000
+    response._content = decoded
+    response._content_consumed = True
+    response.close()  # Hands the connection back to the pool; the body has been read
+    return {
+        "encoding": encoding,
+        "encoded_bytes": len(encoded),
+        "decoded_bytes": len(decoded),
+        "decode_ms": decode_ms,
+    }
+
+
+def summarize_encoding(stats: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Per-endpoint wire savings, largest decoded volume first"""
+    rows = []
+    for endpoint, totals in stats.items():
+        decoded = totals["decoded_bytes"]
+        rows.append({
+            "endpoint": endpoint,
+            "requests": totals["requests"],
+            "encodings": sorted(totals["encodings"]),
+            "encoded_bytes": totals["encoded_bytes"],
+            "decoded_bytes": decoded,
+            "saving": 1 - totals["encoded_bytes"] / decoded if decoded else 0.0,
+            "decode_ms": totals["decode_ms"],
+        })
+    return sorted(rows, key=lambda row: -row["decoded_bytes"])
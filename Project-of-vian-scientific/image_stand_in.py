@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Local Image Server Stand-In for Vian Scientific Platform
+Serves generated product images with ETag/Last-Modified validators, like a remote image host
+"""
+
+import hashlib
+import struct
+import sys
+import threading
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+
+def png_image(width: int, height: int, seed: int = 0) -> bytes:
+    """A valid RGB PNG with a seed-dependent gradient, built without any imaging library"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = []
+    for y in range(height):
+        green = (y * 255 // max(1, height - 1) + seed * 37) % 256
+        row = bytearray(b"\x00")  # Filter type 0 per scanline
+        for x in range(width):
+            row += bytes(((x * 255 // max(1, width - 1) + seed * 11) % 256, green, (seed * 53) % 256))
+        rows.append(bytes(row))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows), 6)) + chunk(b"IEND", b""))
+
+
+class ImageStandInHandler(BaseHTTPRequestHandler):
+    """GET /<name> with conditional request support"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        image = server.images.get(self.path.split("?", 1)[0])
+        if image is None:
+            server.count("not_found")
+            self.send_error(404, "Image not found")
+            return
+        data, etag, modified = image
+        if self.not_modified(etag, modified):
+            server.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        server.count("served")
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(modified, usegmt=True))
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def not_modified(self, etag: str, modified: float) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class ImageStandIn(ThreadingHTTPServer):
+    """Threaded image host bound to localhost; use as a context manager"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0):
+        super().__init__(("127.0.0.1", port), ImageStandInHandler)
+        self.latency = latency
+        self.images: Dict[str, Tuple[bytes, str, float]] = {}
+        self.lock = threading.Lock()
+        self.stats = {"served": 0, "not_modified": 0, "not_found": 0}
+        self.thread: Optional[threading.Thread] = None
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def put(self, path: str, data: bytes) -> str:
+        """Publish (or replace) an image and return its URL"""
+        etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+        with self.lock:
+            self.images[path] = (data, etag, time.time())
+        return self.url(path)
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def start(self) -> "ImageStandIn":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "ImageStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
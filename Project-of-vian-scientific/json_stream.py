@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Streaming JSON Decoding for Vian Scientific Platform
+Yields list items from JSON array or NDJSON response bodies without materialising the whole payload
+"""
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator
+
+import requests
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+NDJSON_ACCEPT = f"{NDJSON_CONTENT_TYPE}, application/json;q=0.9"
+STREAM_CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\r\n"
+NUMBER_CHARS = "0123456789.eE+-"
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Incrementally decode a top-level JSON array, yielding each element as soon as it is complete
+
+    Only the unparsed tail of the stream is buffered, so memory stays bounded by the largest
+    single element rather than the whole array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    opened = False
+    expect_item = True  # False once an element has been read and a ',' or ']' must follow
+    closed = False
+    seen_item = False
+
+    def parse(final: bool) -> Iterator[Any]:
+        nonlocal pos, opened, expect_item, closed, seen_item
+        while not closed:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos >= len(buffer):
+                return
+            char = buffer[pos]
+            if not opened:
+                if char != "[":
+                    raise ValueError(f"Expected a JSON array, found {char!r}")
+                opened = True
+                pos += 1
+            elif char == "]":
+                if expect_item and seen_item:
+                    raise ValueError(f"Trailing comma before ']' at offset {pos}")
+                closed = True
+                pos += 1
+            elif not expect_item:
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' at offset {pos}, found {char!r}")
+                expect_item = True
+                pos += 1
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    return  # The element continues in the next chunk
+                # A number not yet followed by a delimiter may still be missing digits, e.g. "2" of "2.5"
+                if (not final and isinstance(item, (int, float)) and not isinstance(item, bool)
+                        and not buffer[end:].lstrip(NUMBER_CHARS)):
+                    return
+                yield item
+                pos = end
+                expect_item = False
+                seen_item = True
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer = buffer[pos:] + utf8.decode(chunk)
+        pos = 0
+        yield from parse(final=False)
+    buffer = buffer[pos:] + utf8.decode(b"", final=True)
+    pos = 0
+    yield from parse(final=True)
+
+    if not closed:
+        raise ValueError("Truncated JSON array")
+    if buffer[pos:].strip(WHITESPACE):
+        raise ValueError("Unexpected data after JSON array")
+
+
+def iter_ndjson(lines: Iterable[bytes]) -> Iterator[Any]:
+    """Decode newline-delimited JSON, one document per non-empty line"""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_response_items(response: requests.Response, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield list items from a response opened with stream=True, as NDJSON or a JSON array"""
+    try:
+        if response.headers.get("Content-Type", "").startswith(NDJSON_CONTENT_TYPE):
+            yield from iter_ndjson(response.iter_lines(chunk_size=chunk_size))
+        else:
+            yield from iter_json_array(response.iter_content(chunk_size=chunk_size))
+    finally:
+        response.close()
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Latency Statistics for Vian Scientific Platform
+Small summary helpers shared by the test tools, writers and senders that report latency percentiles
+"""
+
+from typing import List
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Distributed Load Generation for Vian Scientific Platform
+A coordinator that spreads an open-loop request rate over worker processes and merges their latency histograms live
+"""
+
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend_test import BASE_URL, VianScientificAPITester, endpoint_key
+from data_reaper import reap_ledger, reaped_count
+
+HISTOGRAM_GROWTH = 1.01  # Bucket width ratio: percentiles are within 1% of the exact value
+SNAPSHOT_INTERVAL = 1.0  # Seconds between histogram snapshots sent by each worker
+JOIN_TIMEOUT = 30.0  # Seconds to wait for every worker to connect
+START_DELAY = 0.5  # Seconds between the start message and the first request, so all workers begin together
+FINISH_GRACE = 30.0  # Seconds past the duration to wait for in-flight requests and final snapshots
+WORKER_CONCURRENCY = 32  # Request threads per worker
+MAX_BACKLOG = 1000  # Due requests a worker may have waiting for a thread before it drops new arrivals
+
+
+class LatencyHistogram:
+    """Log-bucketed latency counts that merge exactly, so workers ship counts instead of raw samples"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        index = int(math.log(max(ms, 0.001) * 1000) / math.log(HISTOGRAM_GROWTH))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        return self
+
+    def percentile(self, fraction: float) -> float:
+        """Nearest-rank percentile, reported as the upper edge of its bucket"""
+        if not self.count:
+            return 0.0
+        rank = min(self.count - 1, int(fraction * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return min(HISTOGRAM_GROWTH ** (index + 1) / 1000, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, float]:
+        return {"count": self.count, "mean_ms": self.sum_ms / self.count if self.count else 0.0,
+                "p50_ms": self.percentile(0.50), "p95_ms": self.percentile(0.95),
+                "p99_ms": self.percentile(0.99), "max_ms": self.max_ms}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"counts": {str(index): count for index, count in self.counts.items()},
+                "count": self.count, "sum_ms": self.sum_ms, "max_ms": self.max_ms}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count, histogram.sum_ms, histogram.max_ms = data["count"], data["sum_ms"], data["max_ms"]
+        return histogram
+
+
+# Workloads: prepare(tester) -> state once per worker, then operation(tester, rng, state) -> (key, ok) per arrival
+
+def prepare_catalog(tester) -> Dict[str, Any]:
+    return {"product_ids": [p["id"] for p in tester.make_request("GET", "/products?limit=100").json()]}
+
+
+def catalog_operation(tester, rng: random.Random, state: Dict[str, Any]) -> Tuple[str, bool]:
+    """One storefront read; the body is decoded, since JSON decoding is much of the client's cost"""
+    roll = rng.random()
+    if roll < 0.5:
+        endpoint = "/products?limit=50"
+    elif roll < 0.7:
+        endpoint = "/categories"
+    elif roll < 0.9 and state["product_ids"]:
+        endpoint = f"/products/{rng.choice(state['product_ids'])}"
+    else:
+        endpoint = "/content"
+    response = tester.make_request("GET", endpoint)
+    ok = response.status_code == 200
+    if ok:
+        response.json()
+    return endpoint_key("GET", endpoint), ok
+
+
+def scenario_operation(tester, rng: random.Random, state: Dict[str, Any]) -> Tuple[str, bool]:
+    """The full user/catalog scenario; it logs the admin in, so keep the rate under the login limiter"""
+    run = tester.run_scenario_quietly(tester.base_url, user_email=f"load{uuid.uuid4().hex[:12]}@example.com",
+                                      ledger=tester.ledger)
+    return "scenario", run.results["failed"] == 0
+
+
+WORKLOADS: Dict[str, Tuple[Callable, Callable]] = {
+    "catalog": (prepare_catalog, catalog_operation),
+    "scenario": (lambda tester: {}, scenario_operation),
+}
+
+
+class Channel:
+    """Newline-delimited JSON messages over a TCP connection"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+        self.lock = threading.Lock()
+
+    def send(self, message: Dict[str, Any]):
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        with self.lock:
+            self.sock.sendall(data)
+
+    def receive(self) -> Optional[Dict[str, Any]]:
+        line = self.reader.readline()
+        return json.loads(line) if line else None
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class LoadWorker:
+    """Issue requests on a fixed open-loop schedule and report histogram deltas to the coordinator
+
+    Latency is measured from each request's scheduled time, not from when a thread got to it,
+    so a backed-up worker shows the queueing delay real users would see instead of hiding it.
+    """
+
+    def __init__(self, channel: Channel, worker_id: str, assignment: Dict[str, Any]):
+        self.channel = channel
+        self.worker_id = worker_id
+        self.assignment = assignment
+        self.tester = VianScientificAPITester(assignment["base_url"])
+        self.prepare, self.operation = WORKLOADS[assignment["workload"]]
+        self.rng = random.Random(assignment["seed"])
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.counts = {"scheduled": 0, "completed": 0, "errors": 0, "dropped": 0}
+        self.backlog = 0
+
+    def execute(self, intended: float, state: Dict[str, Any]):
+        try:
+            key, ok = self.operation(self.tester, self.rng, state)
+        except Exception:
+            key, ok = "exception", False
+        ms = (time.perf_counter() - intended) * 1000
+        with self.lock:
+            self.backlog -= 1
+            self.histograms.setdefault(key, LatencyHistogram()).record(ms)
+            self.counts["completed"] += 1
+            self.counts["errors"] += not ok
+
+    def snapshot(self, kind: str = "snapshot") -> Dict[str, Any]:
+        """Histograms since the last snapshot, plus running counts"""
+        with self.lock:
+            histograms, self.histograms = self.histograms, {}
+            counts = dict(self.counts)
+        return {"type": kind, "worker": self.worker_id, "counts": counts,
+                "histograms": {key: histogram.to_dict() for key, histogram in histograms.items()}}
+
+    def report(self, stopping: threading.Event):
+        while not stopping.wait(self.assignment["snapshot_interval"]):
+            self.channel.send(self.snapshot())
+
+    def run(self):
+        state = self.prepare(self.tester)
+        rate, duration = self.assignment["rate"], self.assignment["duration"]
+        # The coordinator's start time is wall-clock; schedule against the local monotonic clock
+        origin = time.perf_counter() + (self.assignment["start_at"] - time.time())
+        stopping = threading.Event()
+        reporter = threading.Thread(target=self.report, args=(stopping,), daemon=True)
+        reporter.start()
+        with ThreadPoolExecutor(max_workers=self.assignment["concurrency"], thread_name_prefix="load") as pool:
+            for n in range(int(rate * duration)):
+                intended = origin + n / rate
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                with self.lock:
+                    self.counts["scheduled"] += 1
+                    if self.backlog >= MAX_BACKLOG:
+                        self.counts["dropped"] += 1
+                        continue
+                    self.backlog += 1
+                pool.submit(self.execute, intended, state)
+        stopping.set()
+        reporter.join()
+        done = self.snapshot("done")
+        # Delete what the workload created once its requests are all in, so cleanup is never timed
+        try:
+            done["reaped"] = reaped_count(reap_ledger(self.assignment["base_url"], self.tester.ledger))
+        except Exception as e:
+            done["reap_error"] = str(e)
+        self.channel.send(done)
+
+
+def run_worker(coordinator: str, worker_id: Optional[str] = None, pin_core: Optional[int] = None):
+    """Connect to a coordinator at HOST:PORT, take an assignment, generate load and report until done"""
+    if pin_core is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {pin_core % (os.cpu_count() or 1)})
+    host, port = coordinator.rsplit(":", 1)
+    channel = Channel(socket.create_connection((host, int(port)), timeout=JOIN_TIMEOUT))
+    channel.sock.settimeout(None)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        channel.send({"type": "hello", "worker": worker_id, "host": socket.gethostname(), "pid": os.getpid()})
+        assignment = channel.receive()
+        if assignment and assignment.get("type") == "assign":
+            LoadWorker(channel, worker_id, assignment).run()
+    finally:
+        channel.close()
+
+
+class LoadCoordinator:
+    """Spread a target request rate over worker processes and merge their histograms into one live report
+
+    spawn workers are started as local processes, each pinned to its own core where the OS
+    allows it; any others are expected to connect from other machines with
+    `load_cluster.py --worker HOST:PORT`. The listening socket is open from construction, so
+    workers may connect before run() is called.
+    """
+
+    def __init__(self, base_url: str, workers: int = os.cpu_count() or 1, rate: float = 100.0,
+                 duration: float = 10.0, workload: str = "catalog", spawn: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0, concurrency: int = WORKER_CONCURRENCY,
+                 snapshot_interval: float = SNAPSHOT_INTERVAL,
+                 on_report: Optional[Callable[[Dict[str, Any]], None]] = None):
+        if workload not in WORKLOADS:
+            raise ValueError(f"workload must be one of {', '.join(WORKLOADS)}")
+        self.base_url = base_url
+        self.workers = workers
+        self.rate = rate
+        self.duration = duration
+        self.workload = workload
+        self.spawn = workers if spawn is None else spawn
+        self.concurrency = concurrency
+        self.snapshot_interval = snapshot_interval
+        self.on_report = on_report
+        self.server = socket.create_server((host, port), backlog=max(workers, 16))
+        self.lock = threading.Lock()
+        self.totals: Dict[str, LatencyHistogram] = {}
+        self.window = LatencyHistogram()
+        self.window_errors = 0
+        self.members: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.getsockname()[:2]
+        return f"{'127.0.0.1' if host in ('0.0.0.0', '::') else host}:{port}"
+
+    def ingest(self, message: Dict[str, Any]):
+        with self.lock:
+            member = self.members[message["worker"]]
+            member["snapshots"] += 1
+            errors = message["counts"]["errors"] - member["counts"]["errors"]
+            member["counts"] = message["counts"]
+            self.window_errors += errors
+            for key, data in message["histograms"].items():
+                histogram = LatencyHistogram.from_dict(data)
+                self.totals.setdefault(key, LatencyHistogram()).merge(histogram)
+                self.window.merge(histogram)
+            if message["type"] == "done":
+                member["state"] = "done"
+                member["reaped"] = message.get("reaped", 0)
+                member["reap_error"] = message.get("reap_error")
+
+    def listen(self, channel: Channel, worker_id: str):
+        try:
+            while True:
+                message = channel.receive()
+                if message is None:
+                    break
+                self.ingest(message)
+                if message["type"] == "done":
+                    break
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.lock:
+                if self.members[worker_id]["state"] != "done":
+                    self.members[worker_id]["state"] = "lost"
+            channel.close()
+
+    def join(self, deadline: float) -> List[Tuple[Channel, Dict[str, Any]]]:
+        """Accept workers until all have said hello; on failure the workers that did join are disconnected"""
+        joined = []
+        try:
+            while len(joined) < self.workers:
+                self.server.settimeout(max(0.01, deadline - time.monotonic()))
+                try:
+                    sock, _ = self.server.accept()
+                except socket.timeout:
+                    raise TimeoutError(f"Only {len(joined)} of {self.workers} workers connected within {JOIN_TIMEOUT:.0f}s")
+                # A client that connects and says nothing must not hold up the join past its deadline
+                sock.settimeout(max(0.01, deadline - time.monotonic()))
+                channel = Channel(sock)
+                try:
+                    hello = channel.receive()
+                    valid = (isinstance(hello, dict) and hello.get("type") == "hello"
+                             and {"worker", "host", "pid"} <= hello.keys() and hello["worker"] not in self.members)
+                except (OSError, ValueError):
+                    valid = False  # Not a worker, e.g. a port scanner or a client speaking another protocol
+                if not valid:
+                    channel.close()
+                    continue
+                sock.settimeout(None)
+                self.members[hello["worker"]] = {"worker": hello["worker"], "host": hello["host"], "pid": hello["pid"],
+                                                 "state": "running", "snapshots": 0,
+                                                 "counts": {"scheduled": 0, "completed": 0, "errors": 0, "dropped": 0}}
+                joined.append((channel, hello))
+        except BaseException:
+            for channel, _ in joined:
+                channel.close()
+            raise
+        return joined
+
+    def report_window(self, started: float, interval: float) -> Dict[str, Any]:
+        with self.lock:
+            window, self.window = self.window, LatencyHistogram()
+            errors, self.window_errors = self.window_errors, 0
+            live = sum(member["state"] == "running" for member in self.members.values())
+        row = dict(window.summary(), t=time.monotonic() - started, rate=window.count / interval,
+                   errors=errors, workers=live)
+        if self.on_report:
+            self.on_report(row)
+        return row
+
+    def run(self) -> Dict[str, Any]:
+        processes = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", self.address,
+                                       "--worker-id", f"local-{index}", "--pin-core", str(index)],
+                                      stdout=subprocess.DEVNULL)
+                     for index in range(self.spawn)]
+        threads, timeline, joined = [], [], []
+        finished = False
+        try:
+            joined = self.join(time.monotonic() + JOIN_TIMEOUT)
+            start_at = time.time() + START_DELAY
+            for index, (channel, hello) in enumerate(joined):
+                channel.send({"type": "assign", "base_url": self.base_url, "workload": self.workload,
+                              "rate": self.rate / len(joined), "duration": self.duration, "start_at": start_at,
+                              "concurrency": self.concurrency, "snapshot_interval": self.snapshot_interval,
+                              "seed": index})
+                thread = threading.Thread(target=self.listen, args=(channel, hello["worker"]), daemon=True)
+                thread.start()
+                threads.append(thread)
+
+            time.sleep(START_DELAY)
+            started = time.monotonic()
+            deadline = started + self.duration + FINISH_GRACE
+            while any(thread.is_alive() for thread in threads) and time.monotonic() < deadline:
+                tick = time.monotonic()
+                for thread in threads:
+                    thread.join(max(0.0, self.snapshot_interval - (time.monotonic() - tick)))
+                timeline.append(self.report_window(started, max(time.monotonic() - tick, 1e-6)))
+            elapsed = time.monotonic() - started
+            finished = True
+        finally:
+            self.server.close()
+            if not finished:
+                for channel, _ in joined:
+                    channel.close()
+            for process in processes:
+                if not finished:
+                    process.terminate()  # A failed run has nothing to wait for
+                try:
+                    process.wait(timeout=FINISH_GRACE)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+
+        overall = LatencyHistogram()
+        for histogram in self.totals.values():
+            overall.merge(histogram)
+        members = list(self.members.values())
+        completed = sum(member["counts"]["completed"] for member in members)
+        return {
+            "target_rate": self.rate,
+            "achieved_rate": completed / self.duration if self.duration else 0.0,
+            "elapsed": elapsed,
+            "workers": members,
+            "lost_workers": [member["worker"] for member in members if member["state"] != "done"],
+            "overall": overall.summary(),
+            "errors": sum(member["counts"]["errors"] for member in members),
+            "dropped": sum(member["counts"]["dropped"] for member in members),
+            "reaped": sum(member.get("reaped", 0) for member in members),
+            "endpoints": {key: histogram.summary() for key, histogram in sorted(self.totals.items())},
+            "timeline": timeline,
+        }
+
+
+def print_live(row: Dict[str, Any]):
+    print(f"⏱️ {row['t']:5.1f}s  {row['rate']:7.1f} req/s  p50/p95/p99 {row['p50_ms']:.0f}/{row['p95_ms']:.0f}/"
+          f"{row['p99_ms']:.0f}ms  errors {row['errors']}  workers {row['workers']}")
+
+
+def main():
+    """Coordinate a load run, or with --worker HOST:PORT serve as one of its workers"""
+    import argparse
+    from soak_test import parse_duration
+
+    parser = argparse.ArgumentParser(description="Generate API load from several worker processes or machines")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Workers taking part in total")
+    parser.add_argument("--spawn", type=int, help="Workers to start on this machine (default: all of them)")
+    parser.add_argument("--rate", type=float, default=100.0, help="Total requests (or scenarios) per second")
+    parser.add_argument("--duration", default="30s", help="How long to run: 90, 45s, 30m")
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="catalog")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Request threads per worker")
+    parser.add_argument("--listen", default="127.0.0.1:0", help="HOST:PORT for workers; 0.0.0.0 to accept other machines")
+    parser.add_argument("--stand-in", action="store_true", help="Load an in-process API stand-in instead")
+    parser.add_argument("--json", help="Also write the final report to this file")
+    parser.add_argument("--worker", metavar="HOST:PORT", help="Run as a worker of the coordinator at this address")
+    parser.add_argument("--worker-id")
+    parser.add_argument("--pin-core", type=int, help="Pin this worker to one CPU core")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.worker_id, args.pin_core)
+        return None
+
+    stand_in = None
+    base_url = args.base_url
+    if args.stand_in:
+        from api_stand_in import APIStandIn
+        stand_in = APIStandIn().start()
+        base_url = stand_in.base_url
+
+    host, port = args.listen.rsplit(":", 1)
+    coordinator = LoadCoordinator(base_url, args.workers, args.rate, parse_duration(args.duration), args.workload,
+                                  args.spawn, host, int(port), args.concurrency, on_report=print_live)
+    print("🚀 DISTRIBUTED LOAD")
+    print("=" * 50)
+    print(f"   Target: {base_url}, {args.workload} at {args.rate:g}/s for {args.duration} over {args.workers} workers")
+    remote = args.workers - coordinator.spawn
+    if remote > 0:
+        print(f"   Waiting for {remote} remote workers: python load_cluster.py --worker <this host>:{coordinator.address.rsplit(':', 1)[1]}")
+    try:
+        result = coordinator.run()
+    finally:
+        if stand_in:
+            stand_in.stop()
+
+    overall = result["overall"]
+    print(f"\n📊 {overall['count']} requests, {result['achieved_rate']:.1f}/s of {result['target_rate']:g}/s target, "
+          f"p50/p95/p99 {overall['p50_ms']:.0f}/{overall['p95_ms']:.0f}/{overall['p99_ms']:.0f}ms, "
+          f"{result['errors']} errors, {result['dropped']} dropped")
+    for key, summary in result["endpoints"].items():
+        print(f"   {key:<40} {summary['count']:>7}  p50/p99 {summary['p50_ms']:.0f}/{summary['p99_ms']:.0f}ms")
+    if result["reaped"]:
+        print(f"🧹 Workers deleted {result['reaped']} records the workload created")
+    for member in result["workers"]:
+        if member.get("reap_error"):
+            print(f"⚠️ {member['worker']} could not reap its records: {member['reap_error']}")
+        print(f"   👷 {member['worker']} ({member['host']}, pid {member['pid']}): {member['counts']['completed']} done, "
+              f"{member['state']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+if __name__ == "__main__":
+    main()
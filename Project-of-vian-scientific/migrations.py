@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Schema Migrations for Vian Scientific Platform
+Online field backfills and index builds in throttled, resumable batches, with a synthetic dry run
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from latency_stats import percentile
+
+try:
+    import pymongo
+    from bson import json_util
+except ImportError:  # Optional: pip install pymongo, to migrate the real database
+    pymongo = json_util = None
+
+MIGRATION_BATCH_SIZE = 500  # Documents read and updated per batch
+MIGRATION_DUTY_CYCLE = 0.5  # Fraction of wall time spent writing; the rest is left to live traffic
+CHECKPOINT_PATH = "migrations_state.json"
+DRY_RUN_SAMPLE = 20_000  # Synthetic documents per step in a dry run
+DRY_RUN_PREFIX = "migration_dry_run_"
+
+
+def matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """Evaluate the subset of MongoDB query syntax migrations use: equality, $eq, $ne, $in and $exists"""
+    for field, condition in query.items():
+        present, value = field in document, document.get(field)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            for op, operand in condition.items():
+                if op == "$exists":
+                    ok = present == bool(operand)
+                elif op == "$eq":
+                    ok = present and value == operand
+                elif op == "$ne":
+                    ok = value != operand
+                elif op == "$in":
+                    ok = value in operand
+                else:
+                    raise ValueError(f"Unsupported query operator: {op}")
+                if not ok:
+                    return False
+        elif not present or value != condition:
+            return False
+    return True
+
+
+class Backfill:
+    """Set fields on every document matching query; values is a dict or a function of the document"""
+
+    def __init__(self, collection: str, query: Dict[str, Any],
+                 values: Union[Dict[str, Any], Callable[[Dict[str, Any]], Dict[str, Any]]]):
+        self.collection = collection
+        self.query = query
+        self.values = values
+
+    def describe(self) -> str:
+        return f"backfill {self.collection} where {json.dumps(self.query)}"
+
+
+class CreateIndex:
+    """Build an index, e.g. CreateIndex("users", [("email", 1)], unique=True, name="email_unique")"""
+
+    def __init__(self, collection: str, keys: List[Tuple[str, int]], **options):
+        self.collection = collection
+        self.keys = keys
+        self.options = options
+
+    def describe(self) -> str:
+        return f"index {self.collection} on {', '.join(field for field, _ in self.keys)}"
+
+
+class Migration:
+    def __init__(self, migration_id: str, description: str, steps: List[Any]):
+        self.id = migration_id
+        self.description = description
+        self.steps = steps
+
+
+# Applied in order; never edit one that has shipped, add a new one instead
+MIGRATIONS = [
+    Migration("0001_users_is_active", "Default is_active for users created before the field existed", [
+        Backfill("users", {"is_active": {"$exists": False}}, {"is_active": True}),
+        CreateIndex("users", [("email", 1)], unique=True, name="email_unique"),
+    ]),
+]
+
+
+class MongoTarget:
+    """A pymongo collection, paged by _id"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self, query: Dict[str, Any]) -> int:
+        return self.collection.count_documents(query)
+
+    def next_batch(self, query: Dict[str, Any], after: Any, limit: int) -> List[Tuple[Any, Dict[str, Any]]]:
+        bounded = {"$and": [query, {"_id": {"$gt": after}}]} if after is not None else query
+        return [(doc["_id"], doc) for doc in self.collection.find(bounded, sort=[("_id", 1)], limit=limit)]
+
+    def apply(self, query: Dict[str, Any], updates: List[Tuple[Any, Dict[str, Any]]]) -> int:
+        # The query is repeated so a document the API changed since it was read is left alone
+        result = self.collection.bulk_write([pymongo.UpdateOne({"$and": [query, {"_id": key}]}, {"$set": values})
+                                             for key, values in updates], ordered=False)
+        return result.modified_count
+
+    def create_index(self, keys: List[Tuple[str, int]], options: Dict[str, Any]):
+        self.collection.create_index(keys, **options)
+
+    def insert_many(self, documents: List[Dict[str, Any]]):
+        self.collection.insert_many(documents, ordered=False)
+
+    def drop(self):
+        self.collection.drop()
+
+
+class DictTarget:
+    """Documents in a dict keyed by id, guarded by a lock - the API stand-in's store, or a dry-run scratch set"""
+
+    def __init__(self, documents: Optional[Dict[str, Dict[str, Any]]] = None, lock=None):
+        self.documents = documents if documents is not None else {}
+        self.lock = lock or threading.RLock()
+        self.indexes: Dict[str, List[Tuple[str, int]]] = {}
+        self.keys: List[str] = []  # Sorted key snapshot, rebuilt when the dict's keys change
+        self.key_set: Set[str] = set()
+
+    def count(self, query: Dict[str, Any]) -> int:
+        with self.lock:
+            return sum(1 for doc in self.documents.values() if matches(doc, query))
+
+    def next_batch(self, query: Dict[str, Any], after: Any, limit: int) -> List[Tuple[Any, Dict[str, Any]]]:
+        with self.lock:
+            # The API writes to the dict directly, so compare keys rather than count our own writes; a
+            # delete plus an insert leaves the size alone. Cheaper than sorting again every batch
+            if self.documents.keys() != self.key_set:
+                self.key_set = set(self.documents)
+                self.keys = sorted(self.key_set)
+            batch = []
+            for key in self.keys[bisect.bisect_right(self.keys, after) if after is not None else 0:]:
+                doc = self.documents.get(key)
+                if doc is not None and matches(doc, query):
+                    batch.append((key, dict(doc)))
+                    if len(batch) >= limit:
+                        break
+            return batch
+
+    def apply(self, query: Dict[str, Any], updates: List[Tuple[Any, Dict[str, Any]]]) -> int:
+        modified = 0
+        with self.lock:
+            for key, values in updates:
+                doc = self.documents.get(key)
+                if doc is not None and matches(doc, query):
+                    doc.update(values)
+                    modified += 1
+        return modified
+
+    def create_index(self, keys: List[Tuple[str, int]], options: Dict[str, Any]):
+        fields = [field for field, _ in keys]
+        with self.lock:
+            if options.get("unique"):
+                seen = set()
+                for doc in self.documents.values():
+                    value = tuple(doc.get(field) for field in fields)
+                    if value in seen:
+                        raise ValueError(f"Duplicate key {value} for unique index on {', '.join(fields)}")
+                    seen.add(value)
+            self.indexes[options.get("name", "_".join(f"{field}_{order}" for field, order in keys))] = keys
+
+    def insert_many(self, documents: List[Dict[str, Any]]):
+        with self.lock:
+            for doc in documents:
+                self.documents[doc["_id"]] = doc
+
+    def drop(self):
+        with self.lock:
+            self.documents.clear()
+
+
+class MigrationRunner:
+    """Apply migrations online: small batches, a write duty cycle, and a checkpoint after every batch
+
+    A backfill pages through matching documents in key order and re-checks the query on update,
+    so the API keeps serving - and writing - throughout. After each batch the runner sleeps long
+    enough to keep writes to duty_cycle of wall time, and under max_rate documents per second if
+    given. Progress is checkpointed per batch, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, targets: Dict[str, Any], checkpoint_path: Optional[str] = CHECKPOINT_PATH,
+                 batch_size: int = MIGRATION_BATCH_SIZE, duty_cycle: float = MIGRATION_DUTY_CYCLE,
+                 max_rate: Optional[float] = None):
+        if not 0 < duty_cycle <= 1:
+            raise ValueError("duty_cycle must be in (0, 1]")
+        self.targets = targets
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.duty_cycle = duty_cycle
+        self.max_rate = max_rate
+        self.stopping = threading.Event()
+        self.state: Dict[str, Any] = {}
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                self.state = json_util.loads(f.read()) if json_util else json.load(f)
+
+    def save_state(self):
+        if not self.checkpoint_path:
+            return
+        partial = f"{self.checkpoint_path}.tmp"
+        with open(partial, "w") as f:
+            # bson's json_util keeps ObjectId cursors intact
+            f.write(json_util.dumps(self.state) if json_util else json.dumps(self.state))
+        os.replace(partial, self.checkpoint_path)
+
+    def stop(self):
+        """Finish the current batch, checkpoint and return"""
+        self.stopping.set()
+
+    def run(self, migrations: List[Migration] = MIGRATIONS, max_batches: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Apply pending migrations in order; max_batches bounds this run, e.g. for a maintenance window"""
+        self.stopping.clear()
+        budget = {"batches": max_batches}
+        results = []
+        for migration in migrations:
+            state = self.state.setdefault(migration.id, {"steps": {}})
+            if state.get("applied_at"):
+                results.append({"id": migration.id, "status": "already_applied"})
+                continue
+            result = {"id": migration.id, "status": "applied", "processed": 0, "modified": 0, "batches": 0, "batch_ms": []}
+            started = time.perf_counter()
+            for index, step in enumerate(migration.steps):
+                progress = state["steps"].setdefault(str(index), {"done": False, "after": None, "processed": 0})
+                if progress["done"]:
+                    continue
+                if isinstance(step, Backfill):
+                    finished = self.backfill(step, progress, result, budget)
+                else:
+                    self.targets[step.collection].create_index(step.keys, step.options)
+                    progress["done"] = finished = True
+                    self.save_state()
+                if not finished:
+                    result["status"] = "stopped"
+                    break
+            if result["status"] == "applied":
+                state["applied_at"] = datetime.now(timezone.utc).isoformat()
+                self.save_state()
+            result["elapsed_s"] = time.perf_counter() - started
+            batch_ms = result.pop("batch_ms")
+            result["batch_ms_p95"] = percentile(batch_ms, 0.95) if batch_ms else None
+            results.append(result)
+            if result["status"] == "stopped":
+                break
+        return results
+
+    def backfill(self, step: Backfill, progress: Dict[str, Any], result: Dict[str, Any], budget: Dict[str, Any]) -> bool:
+        target = self.targets[step.collection]
+        while True:
+            if self.stopping.is_set() or budget["batches"] == 0:
+                return False
+            started = time.perf_counter()
+            batch = target.next_batch(step.query, progress["after"], self.batch_size)
+            if not batch:
+                progress["done"] = True
+                self.save_state()
+                return True
+            updates = [(key, step.values(doc) if callable(step.values) else step.values) for key, doc in batch]
+            result["modified"] += target.apply(step.query, updates)
+            elapsed = time.perf_counter() - started
+            progress["after"] = batch[-1][0]
+            progress["processed"] += len(batch)
+            result["processed"] += len(batch)
+            result["batches"] += 1
+            result["batch_ms"].append(elapsed * 1000)
+            if budget["batches"] is not None:
+                budget["batches"] -= 1
+            self.save_state()
+
+            pause = elapsed * (1 / self.duty_cycle - 1)
+            if self.max_rate:
+                pause = max(pause, len(batch) / self.max_rate - elapsed)
+            self.stopping.wait(pause)
+
+
+def synthetic_document(query: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """A user-sized document that matches query, for timing a backfill without touching real data"""
+    doc = {"_id": f"{index:012d}", "id": str(uuid.uuid4()), "email": f"synthetic{index}@example.com",
+           "full_name": f"Synthetic User {index}", "role": "user", "created_at": datetime.now(timezone.utc).isoformat(),
+           "password_hash": "$pbkdf2-sha256$600000$" + "A" * 22 + "$" + "B" * 43}
+    for field, condition in query.items():
+        if isinstance(condition, dict) and all(op.startswith("$") for op in condition):
+            if condition.get("$exists") is False or "$ne" in condition:
+                doc.pop(field, None)
+            elif "$in" in condition:
+                doc[field] = condition["$in"][0]
+            elif "$eq" in condition:
+                doc[field] = condition["$eq"]
+            else:
+                doc.setdefault(field, "synthetic")
+        else:
+            doc[field] = condition
+    return doc
+
+
+def dry_run(migration: Migration, targets: Dict[str, Any], scratch: Optional[Callable[[str], Any]] = None,
+            sample_size: int = DRY_RUN_SAMPLE, **runner_options) -> Dict[str, Any]:
+    """Estimate a migration's duration without writing to targets
+
+    Each step runs, with the same batching and throttling, against sample_size synthetic
+    documents in a scratch target from scratch(collection) - an in-memory DictTarget by default,
+    or a scratch collection in the real database for realistic write costs. The measured rate is
+    then applied to how many real documents the step would touch.
+    """
+    scratch = scratch or (lambda collection: DictTarget())
+    steps = []
+    for step in migration.steps:
+        target = targets[step.collection]
+        scratch_target = scratch(step.collection)
+        query = step.query if isinstance(step, Backfill) else {}
+        scratch_target.insert_many([synthetic_document(query, i) for i in range(sample_size)])
+        try:
+            runner = MigrationRunner({step.collection: scratch_target}, None, **runner_options)
+            started = time.perf_counter()
+            runner.run([Migration(f"dry-run-{migration.id}", migration.description, [step])])
+            elapsed = time.perf_counter() - started
+        finally:
+            scratch_target.drop()
+        real = target.count(query)
+        steps.append({"step": step.describe(), "documents": real, "sample": sample_size, "sample_s": elapsed,
+                      "estimated_s": elapsed * real / sample_size})
+    return {"id": migration.id, "steps": steps, "estimated_s": sum(step["estimated_s"] for step in steps)}
+
+
+def main():
+    """Apply pending migrations to the database, or estimate them with --dry-run"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Online, resumable schema migrations")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.getenv("DB_NAME", "vian_scientific"))
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Progress file used to resume")
+    parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    parser.add_argument("--duty-cycle", type=float, default=MIGRATION_DUTY_CYCLE, help="Fraction of time spent writing")
+    parser.add_argument("--max-rate", type=float, help="Documents per second ceiling")
+    parser.add_argument("--max-batches", type=int, help="Stop after this many batches; rerun to resume")
+    parser.add_argument("--only", help="Apply or estimate a single migration id")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Estimate durations on synthetic data in memory; reads counts, writes nothing")
+    parser.add_argument("--sample", type=int, default=DRY_RUN_SAMPLE, help="Synthetic documents per dry-run step")
+    parser.add_argument("--scratch-in-db", action="store_true",
+                        help=f"With --dry-run, time the synthetic data in {DRY_RUN_PREFIX}<collection> collections "
+                             "of the database, for estimates closer to real write costs; they are dropped afterwards")
+    args = parser.parse_args()
+
+    if pymongo is None:
+        raise SystemExit("❌ pymongo is required (pip install pymongo)")
+    db = pymongo.MongoClient(args.mongo_url)[args.db]
+    migrations = [m for m in MIGRATIONS if not args.only or m.id == args.only]
+    collections = {step.collection for m in migrations for step in m.steps}
+    targets = {name: MongoTarget(db[name]) for name in collections}
+    options = {"batch_size": args.batch_size, "duty_cycle": args.duty_cycle, "max_rate": args.max_rate}
+
+    print("🧬 SCHEMA MIGRATIONS" + (" (DRY RUN)" if args.dry_run else ""))
+    print("=" * 50)
+    if args.dry_run:
+        def db_scratch(name):
+            collection = db[f"{DRY_RUN_PREFIX}{name}"]
+            collection.drop()
+            return MongoTarget(collection)
+
+        # In memory unless asked otherwise, so a dry run against production never writes to it
+        scratch = db_scratch if args.scratch_in_db else None
+        estimates = [dry_run(m, targets, scratch, args.sample, **options) for m in migrations]
+        for estimate in estimates:
+            print(f"📋 {estimate['id']}: about {estimate['estimated_s']:.0f}s")
+            for step in estimate["steps"]:
+                print(f"   {step['step']}: {step['documents']} documents, ~{step['estimated_s']:.1f}s "
+                      f"({step['sample']} synthetic in {step['sample_s']:.2f}s)")
+        return estimates
+
+    runner = MigrationRunner(targets, args.checkpoint, **options)
+    results = runner.run(migrations, args.max_batches)
+    for result in results:
+        if result["status"] == "already_applied":
+            print(f"⏭️ {result['id']}: already applied")
+            continue
+        icon = "✅" if result["status"] == "applied" else "⏸️"
+        print(f"{icon} {result['id']}: {result['status']}, {result['processed']} read, {result['modified']} updated "
+              f"in {result['batches']} batches ({result['elapsed_s']:.1f}s)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Password Hashing for Vian Scientific Platform
+Work-factor-tagged password hashes, an off-thread hashing pool and a calibration benchmark
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from latency_stats import percentile
+
+try:
+    import bcrypt
+except ImportError:  # Optional: pip install bcrypt, to verify and issue $2b$ hashes
+    bcrypt = None
+
+PBKDF2_SCHEME = "pbkdf2-sha256"
+BCRYPT_SCHEME = "bcrypt"
+PASSWORD_ITERATIONS = int(os.getenv("VIAN_PASSWORD_ITERATIONS", "600000"))  # PBKDF2 work factor; see calibrate()
+BCRYPT_ROUNDS = int(os.getenv("VIAN_BCRYPT_ROUNDS", "12"))
+TARGET_VERIFY_MS = 250.0  # Default calibration target per verification
+SALT_BYTES = 16
+HASH_WORKERS = os.cpu_count() or 1  # hashlib and bcrypt release the GIL, so threads use every core
+LATENCY_HISTORY = 1000
+
+
+def b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def unb64(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+class PasswordHasher:
+    """Hash and verify passwords, recording the scheme and work factor in every hash
+
+    PBKDF2 hashes look like $pbkdf2-sha256$<iterations>$<salt>$<digest>; bcrypt hashes keep their
+    native $2b$<rounds>$ form. A hash made with any other scheme or work factor still verifies,
+    and needs_rehash() reports it so login can upgrade it in place.
+    """
+
+    def __init__(self, iterations: int = PASSWORD_ITERATIONS, scheme: str = PBKDF2_SCHEME,
+                 bcrypt_rounds: int = BCRYPT_ROUNDS):
+        if scheme == BCRYPT_SCHEME and bcrypt is None:
+            raise RuntimeError("The bcrypt scheme requires the bcrypt package (pip install bcrypt)")
+        self.iterations = iterations
+        self.scheme = scheme
+        self.bcrypt_rounds = bcrypt_rounds
+        # Verified when the user does not exist, so unknown emails cost as much as wrong passwords
+        self.dummy_hash = self.hash(secrets.token_hex(8))
+
+    def hash(self, password: str) -> str:
+        if self.scheme == BCRYPT_SCHEME:
+            return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(self.bcrypt_rounds)).decode("ascii")
+        salt = os.urandom(SALT_BYTES)
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, self.iterations)
+        return f"${PBKDF2_SCHEME}${self.iterations}${b64(salt)}${b64(digest)}"
+
+    def verify(self, password: str, stored: Optional[str]) -> bool:
+        if not stored:
+            self.verify(password, self.dummy_hash)
+            return False
+        if stored.startswith(("$2a$", "$2b$", "$2y$")):
+            if bcrypt is None:
+                raise RuntimeError("Verifying bcrypt hashes requires the bcrypt package")
+            return bcrypt.checkpw(password.encode("utf-8"), stored.encode("ascii"))
+        try:
+            _, scheme, iterations, salt, digest = stored.split("$")
+        except ValueError:
+            raise ValueError("Unrecognised password hash format")
+        if scheme != PBKDF2_SCHEME:
+            raise ValueError(f"Unsupported password hash scheme: {scheme}")
+        candidate = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), unb64(salt), int(iterations))
+        return hmac.compare_digest(candidate, unb64(digest))
+
+    def needs_rehash(self, stored: str) -> bool:
+        if stored.startswith(("$2a$", "$2b$", "$2y$")):
+            return self.scheme != BCRYPT_SCHEME or int(stored.split("$")[2]) != self.bcrypt_rounds
+        parts = stored.split("$")
+        return self.scheme != PBKDF2_SCHEME or len(parts) != 5 or int(parts[2]) != self.iterations
+
+
+class HashingPool:
+    """Run hashing and verification on dedicated worker threads, off the request thread or event loop
+
+    The pool size caps concurrent hashing at the core count, so a login storm queues here instead
+    of oversubscribing the CPU that every other request needs.
+    """
+
+    def __init__(self, hasher: PasswordHasher, workers: int = HASH_WORKERS):
+        self.hasher = hasher
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.verify_ms = []
+
+    def track(self, function, *args):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            with self.lock:
+                self.in_flight -= 1
+                self.verify_ms.append(elapsed)
+                del self.verify_ms[:-LATENCY_HISTORY]
+
+    def check(self, password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Verify, and on success return a replacement hash if the stored one uses old parameters"""
+        hasher = self.hasher  # One snapshot, in case the parameters are swapped mid-call
+        if not hasher.verify(password, stored):
+            return False, None
+        return True, hasher.hash(password) if hasher.needs_rehash(stored) else None
+
+    def hash(self, password: str) -> str:
+        return self.pool.submit(self.track, self.hasher.hash, password).result()
+
+    def verify_and_update(self, password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+        return self.pool.submit(self.track, self.check, password, stored).result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self.track, self.hasher.hash, password)
+
+    async def verify_and_update_async(self, password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self.track, self.check, password, stored)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = list(self.verify_ms)
+            return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight,
+                    "p50_ms": percentile(samples, 0.50), "p95_ms": percentile(samples, 0.95)}
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def time_verification(hasher: PasswordHasher, repeats: int = 3) -> float:
+    """Best-of-N milliseconds for one verification with the hasher's current parameters"""
+    stored = hasher.hash("calibration-password")
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        hasher.verify("calibration-password", stored)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def calibrate(target_ms: float = TARGET_VERIFY_MS, scheme: str = PBKDF2_SCHEME) -> Dict[str, Any]:
+    """Pick the work factor whose verification takes about target_ms on this machine"""
+    if scheme == BCRYPT_SCHEME:
+        # bcrypt doubles per round: take the last round count at or under the target, if any
+        rounds, measured = 4, time_verification(PasswordHasher(scheme=scheme, bcrypt_rounds=4))
+        while rounds < 31:
+            next_ms = time_verification(PasswordHasher(scheme=scheme, bcrypt_rounds=rounds + 1))
+            if next_ms > target_ms:
+                break
+            rounds, measured = rounds + 1, next_ms
+        return {"scheme": scheme, "bcrypt_rounds": rounds, "verify_ms": measured}
+
+    probe = 20_000
+    per_iteration = time_verification(PasswordHasher(iterations=probe)) / probe
+    iterations = max(1, int(target_ms / per_iteration))
+    if iterations >= 10_000:
+        iterations = round(iterations, -3)
+    measured = time_verification(PasswordHasher(iterations=iterations))
+    return {"scheme": scheme, "iterations": iterations, "verify_ms": measured}
+
+
+def main():
+    """Benchmark password verification and recommend a work factor for this hardware"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calibrate the password hashing work factor")
+    parser.add_argument("--target-ms", type=float, default=TARGET_VERIFY_MS, help="Target verification time")
+    parser.add_argument("--scheme", choices=[PBKDF2_SCHEME, BCRYPT_SCHEME], default=PBKDF2_SCHEME)
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS, help="Hashing pool size for the throughput run")
+    args = parser.parse_args()
+
+    print("🔐 PASSWORD HASHING CALIBRATION")
+    print("=" * 50)
+    print(f"   Target: {args.target_ms:.0f}ms per verification, {args.scheme}, {os.cpu_count()} CPUs")
+    result = calibrate(args.target_ms, args.scheme)
+    if args.scheme == BCRYPT_SCHEME:
+        hasher = PasswordHasher(scheme=BCRYPT_SCHEME, bcrypt_rounds=result["bcrypt_rounds"])
+        setting = f"VIAN_BCRYPT_ROUNDS={result['bcrypt_rounds']}"
+    else:
+        hasher = PasswordHasher(iterations=result["iterations"])
+        setting = f"VIAN_PASSWORD_ITERATIONS={result['iterations']}"
+    print(f"🎯 {setting} verifies in {result['verify_ms']:.0f}ms")
+
+    stored = hasher.hash("benchmark-password")
+    pool = HashingPool(hasher, args.workers)
+    count = max(args.workers * 4, 8)
+    started = time.perf_counter()
+    futures = [pool.pool.submit(pool.track, hasher.verify, "benchmark-password", stored) for _ in range(count)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - started
+    pool.close()
+    print(f"📊 {count / elapsed:.1f} logins/s with {args.workers} hashing workers "
+          f"(p95 {pool.stats()['p95_ms']:.0f}ms per verification)")
+    print(f"   Existing hashes are upgraded on the next successful login once {setting} is deployed")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Principal Cache for Vian Scientific Platform
+Short-lived cache of verified bearer tokens to the user principal they authenticate
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+PRINCIPAL_TTL = 30.0  # Seconds a principal is trusted without re-reading the user
+PRINCIPAL_MAX_ENTRIES = 10_000  # Least recently used tokens are evicted beyond this
+
+
+class PrincipalCache:
+    """Map verified tokens to a snapshot of their user, for at most ttl seconds
+
+    Anything that changes what a user may do - disabling, deleting, a password reset or change,
+    a role change - must call invalidate_user(), which drops every cached token of that user.
+    The TTL only bounds staleness for changes made behind the application's back. Each user has
+    a generation number, bumped on invalidation, so a load that started before an invalidation
+    is never cached after it.
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_TTL, max_entries: int = PRINCIPAL_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()  # token -> (expires, user id, principal)
+        self.user_tokens: Dict[str, set] = {}
+        self.generations: Dict[str, int] = {}
+        self.counts = {"hits": 0, "misses": 0, "expired": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            cached = self.entries.get(token)
+            if cached is None:
+                self.counts["misses"] += 1
+                return None
+            expires, user_id, principal = cached
+            if time.monotonic() >= expires:
+                self.discard(token, user_id)
+                self.counts["expired"] += 1
+                self.counts["misses"] += 1
+                return None
+            self.entries.move_to_end(token)
+            self.counts["hits"] += 1
+            return principal
+
+    def generation(self, user_id: str) -> int:
+        with self.lock:
+            return self.generations.get(user_id, 0)
+
+    def put(self, token: str, user_id: str, principal: Dict[str, Any], generation: int):
+        """Cache a principal loaded while the user was at the given generation"""
+        with self.lock:
+            if self.generations.get(user_id, 0) != generation:
+                return  # Invalidated while it was being loaded
+            self.entries[token] = (time.monotonic() + self.ttl, user_id, principal)
+            self.entries.move_to_end(token)
+            self.user_tokens.setdefault(user_id, set()).add(token)
+            while len(self.entries) > self.max_entries:
+                oldest, (_, oldest_user, _) = next(iter(self.entries.items()))
+                self.discard(oldest, oldest_user)
+                self.counts["evictions"] += 1
+
+    def resolve(self, token: str, user_id: str, load: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """The cached principal for a verified token, or load(user_id) cached for next time"""
+        principal = self.get(token)
+        if principal is not None:
+            return principal
+        generation = self.generation(user_id)
+        principal = load(user_id)
+        if principal is not None:
+            self.put(token, user_id, principal, generation)
+        return principal
+
+    def discard(self, token: str, user_id: str):
+        self.entries.pop(token, None)
+        tokens = self.user_tokens.get(user_id)
+        if tokens:
+            tokens.discard(token)
+            if not tokens:
+                del self.user_tokens[user_id]
+
+    def invalidate_user(self, user_id: str):
+        with self.lock:
+            self.generations[user_id] = self.generations.get(user_id, 0) + 1
+            for token in self.user_tokens.pop(user_id, set()):
+                self.entries.pop(token, None)
+            self.counts["invalidations"] += 1
+
+    def invalidate_token(self, token: str):
+        with self.lock:
+            cached = self.entries.get(token)
+            if cached:
+                self.discard(token, cached[1])
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.counts["hits"] + self.counts["misses"]
+            return dict(self.counts, size=len(self.entries),
+                        hit_rate=self.counts["hits"] / lookups if lookups else 0.0)
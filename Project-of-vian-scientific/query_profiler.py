@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Query Profiling for Vian Scientific Platform
+Captures query plans and timings while a suite runs, reports collection scans and ranks index recommendations
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import pymongo
+except ImportError:  # Optional: pip install pymongo, to read a real database's system.profile
+    pymongo = None
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+EQUALITY_OPERATORS = {"$eq", "$in"}
+SCAN_RATIO = 10  # Indexed plans examining this many documents per result are still flagged
+PROFILE_DB = "vian"  # Database name used in stand-in namespaces
+PROFILE_LIMIT = 10_000  # Entries kept, like a capped system.profile collection
+SUITE_TESTS = ["test_root_endpoint", "test_user_registration", "test_user_login", "test_admin_login",
+               "test_get_current_user", "test_products_endpoints", "test_categories_endpoints",
+               "test_quote_management", "test_admin_quotes_management", "test_audit_logs_with_admin_actions"]
+
+Keys = List[Tuple[str, Any]]
+
+
+def query_filter(entry: Dict[str, Any]) -> Dict[str, Any]:
+    command = entry.get("command", {})
+    return command.get("filter") or command.get("q") or command.get("query") or {}
+
+
+def classify(filter: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Fields a filter tests by equality, by range and by regex; $or branches cannot be seeked as one, so count as ranges"""
+    shape = {"equality": [], "range": [], "regex": []}
+    for field, condition in filter.items():
+        if field in ("$or", "$and"):
+            for branch in condition:
+                for kind, fields in classify(branch).items():
+                    kind = "range" if field == "$or" and kind == "equality" else kind
+                    shape[kind].extend(f for f in fields if f not in shape[kind])
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            if "$regex" in condition:
+                shape["regex"].append(field)
+            elif set(condition) & RANGE_OPERATORS:
+                shape["range"].append(field)
+            elif set(condition) & EQUALITY_OPERATORS:
+                shape["equality"].append(field)
+            else:
+                shape["range"].append(field)  # $ne, $exists and friends scan like a range
+        else:
+            shape["equality"].append(field)
+    return shape
+
+
+def index_keys(filter: Dict[str, Any], sort: Optional[Dict[str, int]]) -> Keys:
+    """Equality fields, then sort fields, then range fields - the ESR order a compound index needs"""
+    shape = classify(filter)
+    keys: Keys = [(field, 1) for field in shape["equality"]]
+    keys += [(field, direction) for field, direction in (sort or {}).items() if field not in shape["equality"]]
+    keys += [(field, 1) for field in shape["range"] if field not in dict(keys)]
+    return keys
+
+
+def plan_summary(filter: Dict[str, Any], sort: Optional[Dict[str, int]], indexes: List[Keys]) -> str:
+    """The plan MongoDB would likely pick: an index whose leading key the query can seek on, else a collection scan"""
+    shape = classify(filter)
+    seekable = set(shape["equality"]) | set(shape["range"]) | set(sort or {})
+    for keys in sorted(indexes, key=len, reverse=True):
+        if keys and keys[0][0] != "$**" and keys[0][1] != "text" and keys[0][0] in seekable:
+            return "IXSCAN { " + ", ".join(f"{field}: {direction}" for field, direction in keys) + " }"
+    return "COLLSCAN"
+
+
+def shape_of(entry: Dict[str, Any]) -> str:
+    shape = classify(query_filter(entry))
+    sort = entry.get("command", {}).get("sort") or {}
+    parts = [f"{kind}={','.join(fields)}" for kind, fields in shape.items() if fields]
+    if sort:
+        parts.append("sort=" + ",".join(f"{field}:{direction}" for field, direction in sort.items()))
+    return f"{entry['ns'].split('.', 1)[-1]} {' '.join(parts) or 'all'}"
+
+
+class QueryProfiler:
+    """Record queries as MongoDB system.profile entries, deriving each plan from the declared indexes
+
+    The stand-in keeps documents in dicts, so each entry records what MongoDB would do with the
+    indexes declared here: the plan, and as docsExamined the whole collection for a collection
+    scan or just the matches for an index plan. analyze() reads these entries exactly as it
+    reads a real system.profile.
+    """
+
+    def __init__(self, indexes: Optional[Dict[str, List[Keys]]] = None, db: str = PROFILE_DB,
+                 limit: int = PROFILE_LIMIT):
+        self.indexes = indexes if indexes is not None else {}
+        self.db = db
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.entries: List[Dict[str, Any]] = []
+
+    def add_index(self, collection: str, keys: Keys):
+        with self.lock:
+            if keys not in self.indexes.setdefault(collection, []):
+                self.indexes[collection].append(keys)
+
+    def record(self, collection: str, filter: Dict[str, Any], collection_size: int, returned: int, millis: float,
+               sort: Optional[Dict[str, int]] = None, op: str = "query"):
+        with self.lock:
+            plan = plan_summary(filter, sort, [[("_id", 1)]] + self.indexes.get(collection, []))
+            command = {"find": collection, "filter": filter}
+            if sort:
+                command["sort"] = sort
+            self.entries.append({
+                "op": op, "ns": f"{self.db}.{collection}", "command": command, "planSummary": plan,
+                "docsExamined": collection_size if plan == "COLLSCAN" else returned,
+                "keysExamined": 0 if plan == "COLLSCAN" else returned,
+                "nreturned": returned, "millis": millis, "ts": datetime.now(timezone.utc).isoformat(),
+            })
+            del self.entries[:-self.limit]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def analyze(entries: List[Dict[str, Any]], indexes: Optional[Dict[str, List[Keys]]] = None,
+            min_benefit: int = 1) -> Dict[str, Any]:
+    """Collection scans per query shape and index recommendations ranked by documents they would spare
+
+    A shape is flagged when its plan was a collection scan or examined over SCAN_RATIO documents
+    per result. The recommended B-tree index follows the ESR rule; regex search over several
+    fields cannot seek a B-tree, so it is recommended a text index instead. Indexes that are
+    prefixes of another recommendation are folded into it. Anything an existing index already
+    covers, or that would spare fewer than min_benefit document reads, is dropped.
+    """
+    indexes = indexes or {}
+    shapes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    for entry in entries:
+        if entry.get("ns", "").split(".", 1)[-1].startswith("system."):
+            continue
+        shape = shapes.setdefault(shape_of(entry), {
+            "shape": shape_of(entry), "collection": entry["ns"].split(".", 1)[-1], "queries": 0, "collscans": 0,
+            "examined": 0, "returned": 0, "millis": 0.0, "plans": set(),
+            "filter": query_filter(entry), "sort": entry.get("command", {}).get("sort"),
+        })
+        shape["queries"] += 1
+        shape["collscans"] += entry.get("planSummary") == "COLLSCAN"
+        shape["examined"] += entry.get("docsExamined", 0)
+        shape["returned"] += entry.get("nreturned", 0)
+        shape["millis"] += entry.get("millis", 0)
+        shape["plans"].add(entry.get("planSummary", "?"))
+
+    recommendations: Dict[Tuple[str, str, Tuple], Dict[str, Any]] = {}
+    for shape in shapes.values():
+        shape["plans"] = sorted(shape["plans"])
+        wasteful = shape["examined"] > SCAN_RATIO * max(shape["returned"], 1)
+        if not (shape["collscans"] or wasteful):
+            continue
+        fields = classify(shape["filter"])
+        if fields["regex"]:
+            kind, keys = "text", [(field, "text") for field in fields["regex"]]
+        else:
+            kind, keys = "btree", index_keys(shape["filter"], shape["sort"])
+        if not keys:
+            continue
+        recommendation = recommendations.setdefault((shape["collection"], kind, tuple(keys)), {
+            "collection": shape["collection"], "kind": kind, "keys": keys, "shapes": [], "queries": 0,
+            "benefit_docs": 0, "benefit_ms": 0.0,
+        })
+        recommendation["shapes"].append(shape["shape"])
+        recommendation["queries"] += shape["queries"]
+        recommendation["benefit_docs"] += shape["examined"] - shape["returned"]
+        recommendation["benefit_ms"] += shape["millis"] * (1 - shape["returned"] / max(shape["examined"], 1))
+
+    ranked = sorted(recommendations.values(), key=lambda r: len(r["keys"]), reverse=True)
+    merged: List[Dict[str, Any]] = []
+    for recommendation in ranked:
+        wider = next((m for m in merged if m["collection"] == recommendation["collection"] and m["kind"] == recommendation["kind"]
+                      and m["keys"][:len(recommendation["keys"])] == recommendation["keys"]), None)
+        if wider:
+            for field in ("queries", "benefit_docs", "benefit_ms"):
+                wider[field] += recommendation[field]
+            wider["shapes"] += recommendation["shapes"]
+            continue
+        existing = indexes.get(recommendation["collection"], [])
+        if any(keys[:len(recommendation["keys"])] == recommendation["keys"] for keys in existing):
+            continue
+        merged.append(recommendation)
+    merged = [r for r in merged if r["benefit_docs"] >= min_benefit]
+    merged.sort(key=lambda r: (r["benefit_docs"], r["benefit_ms"]), reverse=True)
+
+    return {
+        "queries": sum(shape["queries"] for shape in shapes.values()),
+        "collscans": sum(shape["collscans"] for shape in shapes.values()),
+        "shapes": sorted(shapes.values(), key=lambda s: s["examined"], reverse=True),
+        "recommendations": merged,
+    }
+
+
+def index_spec(keys: Keys) -> str:
+    return "{ " + ", ".join(f"{field}: {direction if direction != 'text' else repr('text')}" for field, direction in keys) + " }"
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"📊 {report['queries']} queries, {report['collscans']} collection scans")
+    for shape in report["shapes"]:
+        icon = "🐢" if shape["collscans"] else "✅"
+        print(f"   {icon} {shape['shape']}: {shape['queries']}x, examined {shape['examined']} for {shape['returned']} "
+              f"returned, {shape['millis']:.1f}ms, {'/'.join(shape['plans'])}")
+    if not report["recommendations"]:
+        print("🎉 No index recommendations")
+    for rank, recommendation in enumerate(report["recommendations"], 1):
+        print(f"{rank}. db.{recommendation['collection']}.createIndex({index_spec(recommendation['keys'])}) - "
+              f"spares {recommendation['benefit_docs']} document reads (~{recommendation['benefit_ms']:.1f}ms) "
+              f"across {recommendation['queries']} queries")
+        if recommendation["kind"] == "text":
+            print("   Regex search cannot seek a B-tree index; switch the query to $text to use this")
+
+
+def profile_suite(tests: List[str] = SUITE_TESTS, indexes: Optional[Dict[str, List[Keys]]] = None,
+                  **stand_in_options) -> Tuple[List[Dict[str, Any]], Dict[str, List[Keys]]]:
+    """Run suite methods against a profiling API stand-in; returns its entries and declared indexes"""
+    import contextlib
+    import io
+
+    from api_stand_in import APIStandIn
+    from backend_test import VianScientificAPITester
+
+    with APIStandIn(profile_indexes=indexes or {}, **stand_in_options) as server:
+        tester = VianScientificAPITester(server.base_url)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name in tests:
+                getattr(tester, name)()
+        return list(server.store.profiler.entries), server.store.profiler.indexes
+
+
+def main():
+    """Profile the suite against the stand-in, or analyze a database's system.profile"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query profiling and index advisor")
+    parser.add_argument("--mongo-url", help="Read system.profile from this MongoDB instead of profiling the stand-in")
+    parser.add_argument("--db", default=os.getenv("DB_NAME", "vian_scientific"))
+    parser.add_argument("--enable", action="store_true", help="Turn on full profiling (level 2) and exit; run the suite, then rerun without it")
+    parser.add_argument("--products-per-category", type=int, default=50, help="Stand-in catalog size")
+    args = parser.parse_args()
+
+    print("🔬 QUERY PROFILE & INDEX ADVISOR")
+    print("=" * 50)
+    if args.mongo_url:
+        if pymongo is None:
+            raise SystemExit("❌ pymongo is required to read system.profile (pip install pymongo)")
+        db = pymongo.MongoClient(args.mongo_url)[args.db]
+        if args.enable:
+            db.command("profile", 2)
+            print(f"🎙️ Profiling every operation on {args.db}; run the suite, then rerun without --enable")
+            return None
+        entries = list(db["system.profile"].find({"op": {"$in": ["query", "update", "remove", "command"]}}))
+        indexes = {name: [list(info["key"]) for info in db[name].index_information().values()]
+                   for name in db.list_collection_names() if not name.startswith("system.")}
+    else:
+        entries, indexes = profile_suite(products_per_category=args.products_per_category)
+        print(f"🧪 Profiled {len(SUITE_TESTS)} suite tests against the API stand-in")
+    report = analyze(entries, indexes)
+    print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
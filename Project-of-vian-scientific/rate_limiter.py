@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Auth Rate Limiter for Vian Scientific Platform
+Sliding-window limits per client IP and per account on login and reset endpoints, with a pluggable shared store
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Optional: pip install redis, to share limits between API instances
+    redis = None
+
+RATE_LIMIT_ATTEMPTS = 10  # Attempts per email and endpoint within the window
+RATE_LIMIT_IP_ATTEMPTS = 100  # Attempts per client IP and endpoint; higher, since offices and NATs share an IP
+RATE_LIMIT_WINDOW = 60.0  # Sliding window in seconds
+RATE_LIMITED_PATHS = ("/auth/login", "/auth/forgot-password", "/auth/reset-password")
+
+
+class MemoryBackend:
+    """Sliding windows in this process; share one instance between servers to share their limits"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows: Dict[str, List[float]] = {}
+
+    def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        """Record an attempt unless the key is at its limit; returns seconds until a slot frees if it is"""
+        now = time.monotonic()
+        with self.lock:
+            attempts = [t for t in self.windows.get(key, []) if now - t < window]
+            if len(attempts) >= limit:
+                self.windows[key] = attempts
+                return window - (now - attempts[0])
+            attempts.append(now)
+            self.windows[key] = attempts
+            return None
+
+    def reset(self):
+        with self.lock:
+            self.windows.clear()
+
+
+# Prune, count and add in one round-trip, atomically, so concurrent API instances never over-admit
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return tostring(window - (now - tonumber(oldest[2])))
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+return false
+"""
+
+
+class RedisBackend:
+    """Sliding windows in Redis sorted sets, shared by every API instance pointed at the same Redis"""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "vian:ratelimit:"):
+        if redis is None:
+            raise RuntimeError("RedisBackend needs the redis package: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        with self.lock:
+            self.counter += 1
+            member = f"{time.time()}:{id(self)}:{self.counter}"  # Unique, so simultaneous attempts all count
+        retry_after = self.script(keys=[self.prefix + key], args=[time.time(), window, limit, member])
+        return float(retry_after) if retry_after is not None else None
+
+    def reset(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class RateLimiter:
+    """Reject auth attempts over the limit for their client IP or their email, before any password work
+
+    The IP key is checked first, so one client spraying many accounts is stopped without touching
+    per-account state; the email key then stops many clients aiming at one account. A rejected
+    attempt is not counted against the keys it was rejected by, so it never extends a lockout.
+    """
+
+    def __init__(self, email_attempts: int = RATE_LIMIT_ATTEMPTS, ip_attempts: int = RATE_LIMIT_IP_ATTEMPTS,
+                 window: float = RATE_LIMIT_WINDOW, backend=None, paths: Tuple[str, ...] = RATE_LIMITED_PATHS):
+        self.email_attempts = email_attempts
+        self.ip_attempts = ip_attempts
+        self.window = window
+        self.backend = backend or MemoryBackend()  # Anything with hit(key, limit, window) and reset()
+        self.paths = paths
+        self.lock = threading.Lock()
+        self.counts = {"allowed": 0, "ip_limited": 0, "email_limited": 0}
+
+    def applies(self, method: str, path: str) -> bool:
+        return method == "POST" and path in self.paths
+
+    def check(self, path: str, ip: str, email: str) -> Optional[int]:
+        """Count one attempt; returns Retry-After seconds when it must be rejected"""
+        for kind, key, limit in (("ip", f"ip:{path}:{ip}", self.ip_attempts),
+                                 ("email", f"email:{path}:{email.strip().lower()}", self.email_attempts)):
+            if not limit or (kind == "email" and not email):
+                continue
+            retry_after = self.backend.hit(key, limit, self.window)
+            if retry_after is not None:
+                with self.lock:
+                    self.counts[f"{kind}_limited"] += 1
+                return int(retry_after) + 1
+        with self.lock:
+            self.counts["allowed"] += 1
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Health-Scored SMTP Relay Failover for Vian Scientific Platform
+Routes each message to the healthiest relay, with a circuit breaker per relay
+"""
+
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from email_campaign import close_session, open_smtp_session
+from email_diagnosis import parse_relay, probe_relay
+from email_templates import render_password_reset_email, render_welcome_email
+
+HEALTH_ALPHA = 0.2  # Weight of the newest sample in the rolling averages
+LATENCY_REFERENCE_MS = 500.0  # Handshake latency that halves a relay's score
+FAILURE_THRESHOLD = 3  # Consecutive failures that open a relay's circuit
+BREAKER_COOLDOWN = 30.0  # Seconds an open circuit waits before a trial send
+IDLE_SESSIONS = 4  # Authenticated sessions kept open per relay for the next messages
+SESSION_IDLE_TIMEOUT = 60.0  # Seconds an idle session is reused for; relays drop quiet connections after a few minutes
+
+
+def relay_fault(error: Exception) -> bool:
+    """Whether an error says the relay is unusable now, rather than that it refuses this message
+
+    Connection, TLS, login and lost-session errors are the relay's, and so is any 4xx reply (421
+    "service not available" included): another relay may well take the message. A permanent 5xx
+    reply to MAIL or DATA judges the message itself, which every relay would refuse alike.
+    """
+    if isinstance(error, (smtplib.SMTPConnectError, smtplib.SMTPHeloError, smtplib.SMTPAuthenticationError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPException, OSError)) and not isinstance(error, smtplib.SMTPRecipientsRefused)
+
+
+class RelayHealth:
+    """Rolling success rate, handshake latency and circuit breaker state for one relay"""
+
+    def __init__(self, config: Dict[str, Any], position: int):
+        self.config = config
+        self.name = f"{config['host']}:{config['port']}"
+        self.position = position
+        self.success_rate = 1.0
+        self.latency_ms: Optional[float] = None
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.sent = 0
+        self.failed = 0
+        self.idle: List[Any] = []  # (session, returned at), most recently used last
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+            return "half-open"
+        return "open"
+
+    @property
+    def score(self) -> float:
+        latency = LATENCY_REFERENCE_MS if self.latency_ms is None else self.latency_ms
+        return self.success_rate / (1 + latency / LATENCY_REFERENCE_MS)
+
+    def record_success(self, handshake_ms: Optional[float]):
+        """Count a delivery; handshake_ms is None when it went over a reused session"""
+        self.sent += 1
+        self.success_rate += HEALTH_ALPHA * (1.0 - self.success_rate)
+        if handshake_ms is not None and self.latency_ms is None:
+            self.latency_ms = handshake_ms
+        elif handshake_ms is not None:
+            self.latency_ms += HEALTH_ALPHA * (handshake_ms - self.latency_ms)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failed += 1
+        self.success_rate -= HEALTH_ALPHA * self.success_rate
+        self.consecutive_failures += 1
+        # A failed trial re-opens the circuit straight away
+        if self.trial_in_flight or self.consecutive_failures >= FAILURE_THRESHOLD:
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+
+class RelayPool:
+    """An ordered list of relays tried healthiest-first for every message
+
+    Sessions are kept open per relay and reused, so a message pays for connect, TLS and AUTH only
+    when no idle session is at hand; only those handshakes feed a relay's latency score.
+    """
+
+    def __init__(self, relays: List[Dict[str, Any]],
+                 session_factory: Callable[[Dict[str, Any]], smtplib.SMTP] = open_smtp_session):
+        if not relays:
+            raise ValueError("At least one SMTP relay is required")
+        self.relays = [RelayHealth(config, position) for position, config in enumerate(relays)]
+        self.session_factory = session_factory
+        self.lock = threading.Lock()
+
+    def candidates(self) -> List[RelayHealth]:
+        """Relays allowed to take the next message: recovering relays due a trial, then best score first"""
+        with self.lock:
+            closed = [relay for relay in self.relays if relay.state == "closed"]
+            trials = [relay for relay in self.relays
+                      if relay.state == "half-open" and not relay.trial_in_flight]
+            return trials + sorted(closed, key=lambda relay: (-relay.score, relay.position))
+
+    def checkout(self, relay: RelayHealth) -> Optional[smtplib.SMTP]:
+        """An idle session to the relay, if one was used recently enough"""
+        stale = []
+        with self.lock:
+            session = None
+            while relay.idle and session is None:
+                candidate, returned = relay.idle.pop()
+                if time.monotonic() - returned < SESSION_IDLE_TIMEOUT:
+                    session = candidate
+                else:
+                    stale.append(candidate)
+        for candidate in stale:
+            close_session(candidate, graceful=True)
+        return session
+
+    def checkin(self, relay: RelayHealth, session: smtplib.SMTP):
+        with self.lock:
+            if len(relay.idle) < IDLE_SESSIONS:
+                relay.idle.append((session, time.monotonic()))
+                return
+        close_session(session, graceful=True)
+
+    def drop_idle(self, relay: RelayHealth, graceful: bool = False):
+        """Close a relay's idle sessions, e.g. once it has failed and they are likely dead too"""
+        with self.lock:
+            idle, relay.idle = relay.idle, []
+        for session, _ in idle:
+            close_session(session, graceful)
+
+    def send_over(self, relay: RelayHealth, session: smtplib.SMTP, sender: str, recipients: List[str], message: bytes):
+        """sendmail on one session, then keep the session for the next message unless it failed itself"""
+        try:
+            session.sendmail(sender, recipients, message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+            # A refusal is a reply from a working session, and smtplib has reset it
+            if relay_fault(e):
+                close_session(session)
+            else:
+                self.checkin(relay, session)
+            raise
+        except BaseException:
+            close_session(session)
+            raise
+        self.checkin(relay, session)
+
+    def deliver(self, relay: RelayHealth, sender: str, recipients: List[str], message: bytes) -> Optional[float]:
+        """Send over an idle session, or a new one; returns the handshake time if a new one was opened"""
+        session = self.checkout(relay)
+        if session is not None:
+            try:
+                self.send_over(relay, session, sender, recipients, message)
+                return None
+            except (smtplib.SMTPServerDisconnected, OSError):
+                pass  # Dropped while idle, which says nothing yet; a fresh session decides if the relay is down
+        started = time.perf_counter()
+        session = self.session_factory(relay.config)
+        handshake_ms = (time.perf_counter() - started) * 1000
+        self.send_over(relay, session, sender, recipients, message)
+        return handshake_ms
+
+    def send(self, sender: str, recipients: List[str], message: bytes) -> str:
+        """Deliver one message, failing over between relays; returns the relay used
+
+        Errors that refuse the message itself (a refused recipient, a permanent rejection of the
+        sender or content) are raised as they are: every relay would refuse it, and a relay that
+        answered is healthy.
+        """
+        errors = []
+        for relay in self.candidates():
+            trial = False
+            with self.lock:
+                if relay.state == "half-open":
+                    # Only one message at a time probes a recovering relay
+                    if relay.trial_in_flight:
+                        continue
+                    relay.trial_in_flight = trial = True
+
+            try:
+                handshake_ms = self.deliver(relay, sender, recipients, message)
+            except (smtplib.SMTPException, OSError) as e:
+                if not relay_fault(e):
+                    raise
+                with self.lock:
+                    relay.record_failure()
+                self.drop_idle(relay)
+                errors.append(f"{relay.name}: {e}")
+                continue
+            finally:
+                # Whatever was raised, the trial is over; a failed one has re-opened the circuit above
+                if trial:
+                    with self.lock:
+                        relay.trial_in_flight = False
+            with self.lock:
+                relay.record_success(handshake_ms)
+            return relay.name
+
+        raise smtplib.SMTPException(f"All SMTP relays failed: {'; '.join(errors) or 'all circuits open'}")
+
+    def close(self):
+        """QUIT every idle session"""
+        for relay in self.relays:
+            self.drop_idle(relay, graceful=True)
+
+    def warm_up(self, timeout: float = 10) -> List[Dict[str, Any]]:
+        """Seed health scores by probing every relay concurrently, so backups are ranked before first use"""
+        def probe(relay: RelayHealth) -> Dict[str, Any]:
+            config = dict(relay.config)
+            config.setdefault("mode", "tls" if config["port"] == 465 else ("starttls" if config.get("starttls", True) else "plain"))
+            return probe_relay(config, config.get("username"), config.get("password"), timeout)
+
+        with ThreadPoolExecutor(max_workers=len(self.relays)) as pool:
+            results = list(pool.map(probe, self.relays))
+
+        with self.lock:
+            for relay, result in zip(self.relays, results):
+                if result["authenticated"] or (result["ok"] and not relay.config.get("username")):
+                    relay.record_success(result["total_ms"])
+                    relay.sent -= 1  # A probe is not a delivered message
+                else:
+                    relay.record_failure()
+                    relay.failed -= 1
+        return results
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current health of every relay, for logs and monitoring"""
+        with self.lock:
+            return [
+                {
+                    "relay": relay.name,
+                    "state": relay.state,
+                    "score": round(relay.score, 3),
+                    "success_rate": round(relay.success_rate, 3),
+                    "latency_ms": None if relay.latency_ms is None else round(relay.latency_ms, 1),
+                    "sent": relay.sent,
+                    "failed": relay.failed,
+                }
+                for relay in self.relays
+            ]
+
+
+def load_relays_from_env() -> List[Dict[str, Any]]:
+    """Build relay configs from EMAIL_RELAYS (host:port[:mode],...) or the single EMAIL_HOST"""
+    specs = os.getenv("EMAIL_RELAYS") or f"{os.getenv('EMAIL_HOST', 'smtp-relay.brevo.com')}:{os.getenv('EMAIL_PORT', '587')}"
+    relays = []
+    for spec in specs.split(","):
+        if spec.strip():
+            relay = parse_relay(spec)
+            relay.update({
+                "username": os.getenv("EMAIL_USERNAME"),
+                "password": os.getenv("EMAIL_PASSWORD"),
+                "starttls": relay["mode"] == "starttls",
+            })
+            relays.append(relay)
+    return relays
+
+
+class FailoverEmailSender:
+    """Transactional email sender backed by a health-scored relay pool"""
+
+    def __init__(self, pool: RelayPool, sender: str):
+        self.pool = pool
+        self.sender = sender
+
+    def send_password_reset_email(self, to_email: str, name: str, code: str) -> str:
+        return self.pool.send(self.sender, [to_email], render_password_reset_email(to_email, name, code))
+
+    def send_welcome_email(self, to_email: str, name: str) -> str:
+        return self.pool.send(self.sender, [to_email], render_welcome_email(to_email, name))
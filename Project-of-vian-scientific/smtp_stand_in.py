@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Local SMTP Stand-In for Vian Scientific Platform
+Minimal in-process SMTP server that accepts and records messages for tests
+"""
+
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """Speak just enough SMTP for smtplib: EHLO/HELO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.clients.add(self.connection)
+        try:
+            self.converse(server)
+        finally:
+            with server.lock:
+                server.clients.discard(self.connection)
+
+    def converse(self, server: "SMTPStandIn"):
+        if server.banner_delay:
+            time.sleep(server.banner_delay)
+        self.reply("220 localhost Vian SMTP stand-in ready")
+
+        sender = None
+        recipients = []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode("utf-8", "replace").rstrip("\r\n")
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                # One write per reply, so Nagle's algorithm never splits a multiline response
+                lines = ["250-localhost"]
+                if verb == "EHLO":
+                    lines.append("250-8BITMIME")
+                    if server.require_auth:
+                        lines.append("250-AUTH PLAIN LOGIN")
+                lines.append("250 SIZE 10485760")
+                self.reply("\r\n".join(lines))
+            elif verb == "AUTH":
+                if server.reject_auth:
+                    self.reply("535 5.7.8 Authentication credentials invalid")
+                else:
+                    self.reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                sender = command[10:].strip("<> ")
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip("<> "))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b".\r\n":
+                        break
+                    # Undo SMTP dot-stuffing
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                if server.send_delay:
+                    time.sleep(server.send_delay)
+                if server.reject_data_for & set(recipients):
+                    self.reply("554 5.7.1 Message rejected")
+                    continue
+                server.record(sender, recipients, b"".join(lines))
+                self.reply("250 OK queued")
+            elif verb == "RSET":
+                sender = None
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Threaded SMTP sink bound to localhost; use as a context manager"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0, banner_delay: float = 0.0, send_delay: float = 0.0,
+                 require_auth: bool = True, reject_auth: bool = False, reject_data_for: Iterable[str] = ()):
+        super().__init__(("127.0.0.1", port), SMTPStandInHandler)
+        self.banner_delay = banner_delay
+        self.send_delay = send_delay
+        self.require_auth = require_auth
+        self.reject_auth = reject_auth
+        self.reject_data_for = set(reject_data_for)  # Recipients whose messages get a permanent 554 after DATA
+        self.connections = 0
+        self.clients = set()  # Open client sockets, cut off by stop() as a relay going down would
+        self.messages: List[Dict] = []
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def record(self, sender: str, recipients: List[str], data: bytes):
+        with self.lock:
+            self.messages.append({"from": sender, "to": list(recipients), "data": data})
+
+    def received_by(self, email: str) -> int:
+        """Number of messages delivered to one recipient"""
+        with self.lock:
+            return sum(email in message["to"] for message in self.messages)
+
+    def handle_error(self, request, client_address):
+        # Clients dropping a session without QUIT, or cut off by stop(), are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def start(self) -> "SMTPStandIn":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.server_close()
+
+    def __enter__(self) -> "SMTPStandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    """Run the SMTP stand-in until interrupted"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in for email tests")
+    parser.add_argument("--port", type=int, default=2525, help="Port to listen on")
+    parser.add_argument("--send-delay", type=float, default=0.0, help="Seconds to wait before accepting DATA")
+    args = parser.parse_args()
+
+    server = SMTPStandIn(port=args.port, send_delay=args.send_delay)
+    print(f"📮 SMTP stand-in listening on 127.0.0.1:{server.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 Received {len(server.messages)} messages")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Soak Testing for Vian Scientific Platform
+Loops the core API scenario at a steady rate for hours and flags latency or memory drift
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from backend_test import BASE_URL, VianScientificAPITester
+from data_reaper import RunLedger, reap_ledger, reaped_count
+from latency_stats import percentile
+
+SOAK_RATE_PER_MINUTE = 6.0  # Scenarios per minute; each one logs the admin in, so stay under the login limiter
+SOAK_WINDOW = 300.0  # Seconds per sampling window
+MIN_DRIFT_WINDOWS = 3  # Windows needed before a trend is reported
+LATENCY_DRIFT_THRESHOLD = 0.5  # Relative growth in p50/p95 over the run that counts as drift
+LATENCY_DRIFT_FLOOR_MS = 5.0  # Absolute growth below which latency drift is ignored
+RSS_DRIFT_THRESHOLD = 0.2  # Relative RSS growth over the run that counts as drift
+RSS_DRIFT_FLOOR_MB = 10.0  # Absolute RSS growth below which memory drift is ignored
+
+
+def proc_rss_probe(pid: int) -> Callable[[], Optional[float]]:
+    """RSS probe for a local process (e.g. the API stand-in or a uvicorn worker), in MB"""
+    def probe() -> Optional[float]:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+        return None
+    return probe
+
+
+def parse_duration(value: str) -> float:
+    """Seconds from '90', '45s', '30m' or '4h'"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*", value)
+    if not match:
+        raise ValueError(f"Invalid duration: {value}")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+def trend(values: List[float]) -> Dict[str, float]:
+    """Least-squares line through a series; growth is the fitted change from first to last point"""
+    n = len(values)
+    mean_x = (n - 1) / 2
+    mean_y = sum(values) / n
+    spread = sum((x - mean_x) ** 2 for x in range(n))
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / spread if spread else 0.0
+    start = mean_y - slope * mean_x
+    growth = slope * (n - 1)
+    return {"start": start, "growth": growth, "relative": growth / start if start > 0 else 0.0}
+
+
+def detect_drift(windows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Metrics whose fitted trend grew past both the relative threshold and the absolute floor"""
+    if len(windows) < MIN_DRIFT_WINDOWS:
+        return []
+    checks = [
+        ("p50_ms", LATENCY_DRIFT_THRESHOLD, LATENCY_DRIFT_FLOOR_MS),
+        ("p95_ms", LATENCY_DRIFT_THRESHOLD, LATENCY_DRIFT_FLOOR_MS),
+        ("rss_mb", RSS_DRIFT_THRESHOLD, RSS_DRIFT_FLOOR_MB),
+    ]
+    drift = []
+    for metric, threshold, floor in checks:
+        values = [w[metric] for w in windows if w.get(metric) is not None]
+        if len(values) < MIN_DRIFT_WINDOWS:
+            continue
+        fitted = trend(values)
+        if fitted["relative"] > threshold and fitted["growth"] > floor:
+            drift.append({"metric": metric, "start": round(fitted["start"], 1),
+                          "end": round(fitted["start"] + fitted["growth"], 1),
+                          "growth_pct": round(fitted["relative"] * 100, 1)})
+    return drift
+
+
+class WindowSampler:
+    """Request hook that buckets latencies and server errors into the current window"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.requests = 0
+        self.server_errors = 0
+
+    def __call__(self, record: Dict[str, Any]):
+        response = record["response"]
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(record["elapsed"] * 1000)
+            if response is None or response.status_code >= 500:
+                self.server_errors += 1
+
+    def drain(self) -> Dict[str, Any]:
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            sample = {"requests": self.requests, "server_errors": self.server_errors}
+            self.requests = self.server_errors = 0
+        sample.update({
+            "p50_ms": percentile(latencies, 0.50) if latencies else None,
+            "p95_ms": percentile(latencies, 0.95) if latencies else None,
+            "p99_ms": percentile(latencies, 0.99) if latencies else None,
+        })
+        return sample
+
+
+class SoakRunner:
+    """Run the core scenario on a fixed schedule and summarise each time window"""
+
+    def __init__(self, base_url: str = BASE_URL, duration: float = 3600.0,
+                 rate_per_minute: float = SOAK_RATE_PER_MINUTE, window: float = SOAK_WINDOW,
+                 rss_probe: Optional[Callable[[], Optional[float]]] = None,
+                 on_window: Optional[Callable[[Dict[str, Any]], None]] = None, reap: bool = True):
+        self.base_url = base_url
+        self.duration = duration
+        self.interval = 60.0 / rate_per_minute
+        self.window = window
+        self.rss_probe = rss_probe
+        self.on_window = on_window
+        self.sampler = WindowSampler()
+        self.windows: List[Dict[str, Any]] = []
+        self.run_id = uuid.uuid4().hex[:8]
+        self.scenario_failures = 0
+        self.reap = reap
+        self.ledger = RunLedger(f"soak-{self.run_id}", os.getenv("VIAN_LEDGER_DIR"))
+
+    def close_window(self, index: int, scenarios: int):
+        sample = self.sampler.drain()
+        sample.update({
+            "window": index,
+            "scenarios": scenarios,
+            "scenario_failures": self.scenario_failures,
+            "rss_mb": self.rss_probe() if self.rss_probe else None,
+        })
+        self.scenario_failures = 0
+        self.windows.append(sample)
+        if self.on_window:
+            self.on_window(sample)
+
+    def run(self) -> Dict[str, Any]:
+        runner = VianScientificAPITester(record_ledger=False)
+        start = time.monotonic()
+        window_end = start + self.window
+        next_run = start
+        iteration = scenarios = 0
+
+        while time.monotonic() - start < self.duration:
+            now = time.monotonic()
+            if now < next_run:
+                time.sleep(max(0.0, min(next_run, window_end) - now))  # The window may already be over
+            if time.monotonic() >= window_end:
+                self.close_window(len(self.windows), scenarios)
+                scenarios = 0
+                window_end += self.window
+                continue
+            if time.monotonic() < next_run:
+                continue
+
+            tester = runner.run_scenario_quietly(self.base_url, [self.sampler],
+                                                 user_email=f"soak{self.run_id}-{iteration}@example.com",
+                                                 ledger=self.ledger)
+            self.scenario_failures += tester.results["failed"]
+            iteration += 1
+            scenarios += 1
+            # Missed ticks are dropped rather than replayed as a burst
+            next_run = max(next_run + self.interval, time.monotonic())
+
+        if scenarios:
+            self.close_window(len(self.windows), scenarios)
+        # After the last window, so cleanup traffic never shows up in the samples
+        reaped = reap_ledger(self.base_url, self.ledger) if self.reap else None
+        return {"windows": self.windows, "drift": detect_drift(self.windows), "iterations": iteration,
+                "reaped": reaped}
+
+
+def main():
+    """Soak the API and report per-window latency, errors and RSS"""
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Soak test the Vian Scientific API")
+    parser.add_argument("--base-url", default=BASE_URL, help="API base URL")
+    parser.add_argument("--duration", default="1h", help="How long to run: 90, 45s, 30m, 4h")
+    parser.add_argument("--rate", type=float, default=SOAK_RATE_PER_MINUTE, help="Scenarios per minute")
+    parser.add_argument("--window", default="5m", help="Sampling window length")
+    parser.add_argument("--rss-pid", type=int, help="Sample RSS of this local server process")
+    parser.add_argument("--stand-in", action="store_true", help="Soak an in-process API stand-in instead")
+    parser.add_argument("--no-reap", action="store_true", help="Leave the records the soak created")
+    args = parser.parse_args()
+
+    stand_in = None
+    base_url = args.base_url
+    rss_probe = proc_rss_probe(args.rss_pid) if args.rss_pid else None
+    if args.stand_in:
+        from api_stand_in import APIStandIn
+        stand_in = APIStandIn().start()
+        base_url = stand_in.base_url
+        rss_probe = proc_rss_probe(os.getpid())
+
+    def report(window: Dict[str, Any]):
+        rss = f"{window['rss_mb']:.1f}MB" if window["rss_mb"] is not None else "n/a"
+        p50 = window["p50_ms"] or 0
+        p95 = window["p95_ms"] or 0
+        print(f"🕒 Window {window['window']}: {window['scenarios']} scenarios, {window['requests']} requests, "
+              f"p50/p95 {p50:.0f}/{p95:.0f}ms, 5xx {window['server_errors']}, "
+              f"failed checks {window['scenario_failures']}, RSS {rss}")
+
+    print("🔥 SOAK TEST")
+    print("=" * 50)
+    print(f"   Target: {base_url}")
+    print(f"   Duration: {args.duration} at {args.rate:g} scenarios/min, {args.window} windows")
+
+    try:
+        result = SoakRunner(base_url, parse_duration(args.duration), args.rate,
+                            parse_duration(args.window), rss_probe, report, reap=not args.no_reap).run()
+    finally:
+        if stand_in:
+            stand_in.stop()
+
+    print(f"\n📊 {result['iterations']} scenarios over {len(result['windows'])} windows")
+    if result["reaped"]:
+        print(f"🧹 Deleted {reaped_count(result['reaped'])} records the soak created")
+    if result["drift"]:
+        for drift in result["drift"]:
+            print(f"⚠️ Drift in {drift['metric']}: {drift['start']} -> {drift['end']} (+{drift['growth_pct']}%)")
+        sys.exit(1)
+    print("✅ No upward drift detected")
+    return result
+
+
+if __name__ == "__main__":
+    main()
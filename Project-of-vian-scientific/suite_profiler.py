@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Suite Profiler for Vian Scientific Platform
+Opt-in per-test wall/CPU time, sampled stacks for flame graphs and tracemalloc allocation reports
+"""
+
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples (200 Hz)
+TOP_ALLOCATIONS = 10  # Source lines per test in the allocation report
+TRACEMALLOC_FRAMES = 1  # Frames kept per allocation; 1 is enough for per-line deltas and cheapest
+# Leaf functions of a thread blocked on I/O, a lock or a queue; such samples are left out unless include_idle
+IDLE_LEAVES = {"wait", "select", "poll", "accept", "readinto", "recv_into", "_recv_into", "_wait_for_tstate_lock",
+               "get", "sleep", "serve_forever", "_worker", "handle_one_request"}
+SERVER_THREADS = ("process_request_thread", "serve_forever", "password-hash")  # Threads of an in-process API stand-in
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def thread_role(name: str) -> str:
+    """Thread name without its counter, so every request thread of a server folds into one flame graph root"""
+    return re.sub(r"[-_]\d+", "", name).replace(";", ",")
+
+
+class StackSampler:
+    """Background thread that samples every other thread's Python stack into collapsed-stack counts"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.server_samples = 0
+        self.stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="suite-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if not self.include_idle and frame.f_code.co_name in IDLE_LEAVES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(frame_label(frame))
+                    frame = frame.f_back
+                role = thread_role(names.get(ident, "thread"))
+                self.counts[";".join([role] + labels[::-1])] += 1
+                self.samples += 1
+                if any(marker in role for marker in SERVER_THREADS):
+                    self.server_samples += 1
+
+
+class SuiteProfiler:
+    """Profile test methods one at a time: wall and CPU time, sampled stacks and net allocations
+
+    Stacks are written per test to <output_dir>/<test>.folded in the collapsed format that
+    flamegraph.pl and speedscope read. Only the outermost profiled call is measured; tests it
+    runs (or that other threads run meanwhile) are part of its profile, since sampling and
+    tracemalloc see the whole process. In-process API stand-in threads are sampled too, and
+    their share is reported as server_pct.
+    """
+
+    shared_instances: Dict[str, "SuiteProfiler"] = {}
+
+    def __init__(self, output_dir: Optional[str] = None, interval: float = SAMPLE_INTERVAL,
+                 top: int = TOP_ALLOCATIONS, include_idle: bool = False):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.top = top
+        self.include_idle = include_idle
+        self.lock = threading.Lock()
+        self.active = False
+        self.results: List[Dict[str, Any]] = []
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+    @classmethod
+    def shared(cls, output_dir: str) -> "SuiteProfiler":
+        """One profiler per output directory and process, so every tester reports into the same run"""
+        if output_dir not in cls.shared_instances:
+            cls.shared_instances[output_dir] = cls(output_dir)
+        return cls.shared_instances[output_dir]
+
+    def instrument(self, tester):
+        """Route each of the tester's test_* methods through profile()"""
+        for name in dir(type(tester)):
+            if name.startswith("test_") and callable(getattr(tester, name)):
+                setattr(tester, name, self.wrap(name, getattr(tester, name)))
+        return tester
+
+    def wrap(self, name: str, function: Callable) -> Callable:
+        @functools.wraps(function)
+        def profiled(*args, **kwargs):
+            return self.profile(name, function, *args, **kwargs)
+        return profiled
+
+    def profile(self, name: str, function: Callable, *args, **kwargs):
+        with self.lock:
+            nested, self.active = self.active, True
+        if nested:
+            return function(*args, **kwargs)
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        sampler = StackSampler(self.interval, self.include_idle)
+        sampler.start()
+        wall, cpu, thread_cpu = time.perf_counter(), time.process_time(), time.thread_time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            thread_cpu = time.thread_time() - thread_cpu
+            sampler.stop()
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            with self.lock:
+                self.active = False
+            self.record(name, wall, cpu, thread_cpu, sampler, before, after, peak)
+
+    def record(self, name: str, wall: float, cpu: float, thread_cpu: float, sampler: StackSampler,
+               before: "tracemalloc.Snapshot", after: "tracemalloc.Snapshot", peak: int):
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        growth = sorted((stat for stat in diff if stat.size_diff > 0), key=lambda stat: stat.size_diff, reverse=True)
+        result = {
+            "test": name,
+            "wall_ms": wall * 1000,
+            "cpu_ms": cpu * 1000,
+            "test_thread_cpu_ms": thread_cpu * 1000,
+            "samples": sampler.samples,
+            "server_pct": 100.0 * sampler.server_samples / sampler.samples if sampler.samples else 0.0,
+            "net_alloc_kb": sum(stat.size_diff for stat in diff) / 1024,
+            "peak_kb": peak / 1024,
+            "top_allocations": [{"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                                 "size_kb": stat.size_diff / 1024, "count": stat.count_diff}
+                                for stat in growth[:self.top]],
+            "stacks": None,
+        }
+        if self.output_dir:
+            path = os.path.join(self.output_dir, f"{name}.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, count in sampler.counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            result["stacks"] = path
+        with self.lock:
+            self.results.append(result)
+
+    def write_summary(self) -> Optional[str]:
+        """All per-test results as <output_dir>/profile.json"""
+        if not self.output_dir:
+            return None
+        path = os.path.join(self.output_dir, "profile.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=2)
+        return path
+
+    def print_report(self, limit: int = 15):
+        print(f"\n{'TEST':<50}{'wall ms':>9}{'cpu ms':>9}{'cpu %':>7}{'server %':>10}{'net KB':>9}{'peak KB':>9}")
+        for result in sorted(self.results, key=lambda r: r["wall_ms"], reverse=True)[:limit]:
+            cpu_pct = 100 * result["cpu_ms"] / result["wall_ms"] if result["wall_ms"] else 0
+            print(f"{result['test'][:49]:<50}{result['wall_ms']:>9.0f}{result['cpu_ms']:>9.0f}{cpu_pct:>7.0f}"
+                  f"{result['server_pct']:>10.0f}{result['net_alloc_kb']:>9.0f}{result['peak_kb']:>9.0f}")
+            for allocation in result["top_allocations"][:3]:
+                print(f"{'':<6}{allocation['size_kb']:>8.1f} KB in {allocation['count']:>6} blocks  {allocation['where']}")
+        if self.output_dir:
+            print(f"\n🔥 Collapsed stacks in {self.output_dir}/<test>.folded (flamegraph.pl or speedscope)")
+
+
+def main():
+    """Run chosen tester methods with profiling, against a deployment or an in-process API stand-in"""
+    import argparse
+    import contextlib
+    import io
+    from backend_test import BASE_URL, VianScientificAPITester
+    from query_profiler import SUITE_TESTS
+
+    parser = argparse.ArgumentParser(description="Profile API test methods: time, CPU, stacks and allocations")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--stand-in", action="store_true", help="Run against a local API stand-in in this process")
+    parser.add_argument("--tests", help="Comma-separated test methods (default: the core scenario)")
+    parser.add_argument("--out", default="profiles", help="Directory for .folded stacks and profile.json")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="Seconds between stack samples")
+    parser.add_argument("--top", type=int, default=TOP_ALLOCATIONS, help="Allocation sites kept per test")
+    parser.add_argument("--include-idle", action="store_true", help="Keep samples of threads blocked on I/O or locks")
+    args = parser.parse_args()
+
+    tests = [t.strip() for t in args.tests.split(",") if t.strip()] if args.tests else SUITE_TESTS
+    profiler = SuiteProfiler(args.out, args.interval, args.top, args.include_idle)
+    print("🔬 SUITE PROFILER")
+    print("=" * 50)
+    with contextlib.ExitStack() as stack:
+        base_url = args.base_url
+        if args.stand_in:
+            from api_stand_in import APIStandIn
+            base_url = stack.enter_context(APIStandIn()).base_url
+        tester = profiler.instrument(VianScientificAPITester(base_url))
+        with contextlib.redirect_stdout(io.StringIO()):
+            for test in tests:
+                getattr(tester, test)()
+    profiler.print_report()
+    print(f"💾 {profiler.write_summary()}")
+    return profiler.results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Product Image Thumbnails for Vian Scientific Platform
+Fetches product images concurrently and pre-generates resized WebP variants into a content-addressed cache
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional: pip install Pillow
+    Image = ImageOps = None
+
+# Longest edge in pixels per variant; sized for the product grid, the card view and the detail page
+VARIANTS = {"thumb": 160, "card": 400, "detail": 1000}
+WEBP_QUALITY = 80
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = 20.0
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+SOURCE_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+VARIANT_BATCH_SIZE = 200  # Products per bulk update of image_variants
+# Pillow raises OSError/ValueError subclasses for undecodable images, and DecompressionBombError,
+# which is neither, for images whose pixel count exceeds Image.MAX_IMAGE_PIXELS twice over
+DECODE_ERRORS = (OSError, ValueError) + ((Image.DecompressionBombError,) if Image else ())
+
+
+def render_variants(data: bytes, variants: Dict[str, int] = VARIANTS) -> Dict[str, bytes]:
+    """WebP renditions of an image, never upscaled; empty when Pillow is not installed"""
+    if Image is None:
+        return {}
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as source:
+        largest = max(variants.values())
+        source.draft("RGB", (largest, largest))  # Lets JPEG decode at a reduced scale
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for name, edge in variants.items():
+            variant = image.copy()
+            variant.thumbnail((edge, edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+            rendered[name] = buffer.getvalue()
+    return rendered
+
+
+class ThumbnailCache:
+    """Content-addressed variant store with an index of source URLs and their HTTP validators
+
+    Objects live under objects/<aa>/<sha256 of the source image>/, so the same picture behind
+    several URLs is stored and resized once, and a cached object never changes. The original is
+    kept next to its variants, which is all that is produced when Pillow is missing; such
+    objects get their variants on the next refresh after Pillow is installed.
+    """
+
+    def __init__(self, cache_dir: str, variants: Dict[str, int] = VARIANTS, workers: int = FETCH_WORKERS,
+                 timeout: float = FETCH_TIMEOUT):
+        self.cache_dir = cache_dir
+        self.variants = variants
+        self.workers = workers
+        self.timeout = timeout
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        # One lock per digest, so the same picture behind two URLs is resized once even when fetched at once
+        self.lock = threading.Lock()
+        self.object_locks: Dict[str, threading.Lock] = {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def object_dir(self, digest: str) -> str:
+        return os.path.join("objects", digest[:2], digest)
+
+    def save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        partial = f"{self.index_path}.tmp"
+        with open(partial, "w") as f:
+            json.dump(self.index, f)
+        os.replace(partial, self.index_path)
+
+    def store(self, digest: str, data: bytes, content_type: str) -> Tuple[Dict[str, str], bool]:
+        """Write the original and its variants unless this content is already cached; True if written"""
+        with self.lock:
+            object_lock = self.object_locks.setdefault(digest, threading.Lock())
+        with object_lock:
+            return self.write_object(digest, data, content_type)
+
+    def write_object(self, digest: str, data: bytes, content_type: str) -> Tuple[Dict[str, str], bool]:
+        relative = self.object_dir(digest)
+        directory = os.path.join(self.cache_dir, relative)
+        manifest_path = os.path.join(directory, "variants.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                paths = json.load(f)
+            if Image is None or set(self.variants) <= set(paths):
+                return paths, False
+
+        extension = SOURCE_EXTENSIONS.get(content_type.split(";")[0].strip(), "bin")
+        files = {"original": data, **render_variants(data, self.variants)}
+        paths = {}
+        os.makedirs(directory, exist_ok=True)
+        for name, content in files.items():
+            filename = f"{name}.{extension if name == 'original' else 'webp'}"
+            with open(os.path.join(directory, filename), "wb") as f:
+                f.write(content)
+            paths[name] = f"{relative}/{filename}".replace(os.sep, "/")
+        # The manifest goes last: its presence marks the object complete
+        partial = f"{manifest_path}.tmp"
+        with open(partial, "w") as f:
+            json.dump(paths, f)
+        os.replace(partial, manifest_path)
+        return paths, True
+
+    def process(self, url: str) -> Dict[str, Any]:
+        """Fetch one URL conditionally and make sure its variants exist"""
+        entry = self.index.get(url)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True)
+            if response.status_code == 304 and entry:
+                response.close()
+                return {"url": url, "status": "not_modified", "entry": dict(entry, checked=time.time())}
+            if response.status_code != 200:
+                response.close()
+                return {"url": url, "status": "failed", "error": f"HTTP {response.status_code}"}
+            data = response.raw.read(MAX_IMAGE_BYTES + 1, decode_content=True)
+            response.close()
+            if len(data) > MAX_IMAGE_BYTES:
+                return {"url": url, "status": "failed", "error": "Image too large"}
+            digest = hashlib.sha256(data).hexdigest()
+            paths, written = self.store(digest, data, response.headers.get("Content-Type", ""))
+        except (requests.exceptions.RequestException,) + DECODE_ERRORS as e:
+            # One bad image must fail only its own URL, not the whole pool.map in refresh()
+            return {"url": url, "status": "failed", "error": str(e)}
+        return {
+            "url": url,
+            "status": "unchanged" if entry and entry.get("digest") == digest else ("generated" if written else "reused"),
+            "bytes": len(data),
+            "entry": {"digest": digest, "etag": response.headers.get("ETag"),
+                      "last_modified": response.headers.get("Last-Modified"), "variants": paths,
+                      "checked": time.time()},
+        }
+
+    def refresh(self, urls: Iterable[str], max_age: float = 0.0) -> Dict[str, Any]:
+        """Bring the cache up to date for a set of image URLs
+
+        URLs checked within max_age seconds are not contacted at all; the rest are revalidated
+        with If-None-Match/If-Modified-Since, so only new or changed images are downloaded and
+        resized.
+        """
+        now = time.time()
+        pending = sorted({url for url in urls if url})
+        fresh = {url for url in pending if url in self.index and now - self.index[url].get("checked", 0) < max_age}
+        todo = [url for url in pending if url not in fresh]
+
+        summary = {"urls": len(pending), "fresh": len(fresh), "not_modified": 0, "unchanged": 0, "reused": 0,
+                   "generated": 0, "failed": 0, "downloaded_bytes": 0, "errors": {}}
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(self.process, todo))
+        for result in results:
+            summary[result["status"]] += 1
+            summary["downloaded_bytes"] += result.get("bytes", 0)
+            if result["status"] == "failed":
+                summary["errors"][result["url"]] = result["error"]
+            else:
+                self.index[result["url"]] = result["entry"]
+        self.save_index()
+        summary["elapsed_s"] = time.perf_counter() - started
+        return summary
+
+    def variant_urls(self, url: str, media_base: str) -> Dict[str, str]:
+        """Public URLs of a source image's cached variants, given where the cache directory is served"""
+        entry = self.index.get(url)
+        if not entry:
+            return {}
+        return {name: f"{media_base.rstrip('/')}/{path}" for name, path in entry["variants"].items()}
+
+    def prune(self) -> int:
+        """Delete cached objects no longer referenced by any URL; returns how many were removed"""
+        import shutil
+
+        referenced = {entry["digest"] for entry in self.index.values()}
+        removed = 0
+        objects = os.path.join(self.cache_dir, "objects")
+        for prefix in os.listdir(objects) if os.path.isdir(objects) else []:
+            for digest in os.listdir(os.path.join(objects, prefix)):
+                if digest not in referenced:
+                    shutil.rmtree(os.path.join(objects, prefix, digest))
+                    removed += 1
+        return removed
+
+
+def refresh_catalog(client, admin_token: str, cache: ThumbnailCache, media_base: str,
+                    max_age: float = 0.0) -> Dict[str, Any]:
+    """Refresh the cache for every product image and publish changed image_variants on the products
+
+    client is a VianScientificAPITester pointed at the API; products are updated through the
+    bulk upsert endpoint, keyed by cat_no.
+    """
+    products = [p for p in client.iter_pages("/products") if p.get("image_url") and p.get("cat_no")]
+    summary = cache.refresh((p["image_url"] for p in products), max_age)
+
+    changed: List[Dict[str, Any]] = []
+    for product in products:
+        variants = cache.variant_urls(product["image_url"], media_base)
+        # An original alone (no Pillow) is not published: clients would load full-size images as thumbnails
+        if set(variants) - {"original"} and variants != product.get("image_variants"):
+            changed.append({"cat_no": product["cat_no"], "image_variants": variants})
+    for start in range(0, len(changed), VARIANT_BATCH_SIZE):
+        response = client.make_request("POST", "/admin/products/bulk",
+                                        {"products": changed[start:start + VARIANT_BATCH_SIZE]}, token=admin_token)
+        if response.status_code != 200:
+            raise RuntimeError(f"Publishing image variants failed: {response.status_code} {response.text}")
+    summary["products_updated"] = len(changed)
+    return summary
+
+
+def main():
+    """Pre-generate thumbnails for the catalog, once or on an interval"""
+    import argparse
+
+    from backend_test import ADMIN_EMAIL, ADMIN_PASSWORD, BASE_URL, VianScientificAPITester
+
+    parser = argparse.ArgumentParser(description="Pre-generate product image variants")
+    parser.add_argument("--base-url", default=BASE_URL, help="API base URL")
+    parser.add_argument("--admin-email", default=ADMIN_EMAIL)
+    parser.add_argument("--admin-password", default=ADMIN_PASSWORD)
+    parser.add_argument("--cache-dir", default="thumbnail_cache", help="Where variants are written")
+    parser.add_argument("--media-base", required=True, help="Public URL the cache directory is served from")
+    parser.add_argument("--workers", type=int, default=FETCH_WORKERS, help="Concurrent image fetches")
+    parser.add_argument("--max-age", type=float, default=0.0, help="Seconds before a URL is revalidated")
+    parser.add_argument("--interval", type=float, help="Keep running, refreshing every N seconds")
+    parser.add_argument("--prune", action="store_true", help="Delete cached objects no product uses")
+    args = parser.parse_args()
+
+    client = VianScientificAPITester(args.base_url, record_ledger=False)
+    login = client.make_request("POST", "/auth/login", {"email": args.admin_email, "password": args.admin_password})
+    if login.status_code != 200:
+        raise SystemExit(f"❌ Admin login failed: {login.status_code}")
+    cache = ThumbnailCache(args.cache_dir, workers=args.workers)
+
+    print("🖼️ THUMBNAIL PRE-GENERATION")
+    print("=" * 50)
+    if Image is None:
+        print("⚠️ Pillow is not installed: originals are cached, no variants are published to products")
+    while True:
+        summary = refresh_catalog(client, login.json()["access_token"], cache, args.media_base, args.max_age)
+        print(f"📦 {summary['urls']} images: {summary['generated']} generated, {summary['reused']} reused, "
+              f"{summary['unchanged']} unchanged, {summary['not_modified']} not modified, {summary['fresh']} fresh, "
+              f"{summary['failed']} failed in {summary['elapsed_s']:.2f}s; {summary['products_updated']} products updated")
+        for url, error in summary["errors"].items():
+            print(f"   ❌ {url}: {error}")
+        if args.prune:
+            print(f"🧹 Pruned {cache.prune()} unused objects")
+        if not args.interval:
+            return summary
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
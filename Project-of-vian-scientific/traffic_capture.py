@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Traffic Capture and Replay for Vian Scientific Platform
+Records make_request traffic to a compact capture file and replays it at scaled speed
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+from latency_stats import percentile
+
+CAPTURE_VERSION = 2
+REPLAY_CONCURRENCY = 64  # Upper bound on requests in flight during replay
+ALIAS_WAIT_TIMEOUT = 30  # Seconds a replayed request waits for the request that issued its token or id
+RESPONSE_BODY_LIMIT = 64 * 1024  # Larger response bodies are left out of a capture; their size is still kept
+# Body fields and headers whose values never go into a capture; keys are matched case-insensitively
+SECRET_FIELDS = re.compile(r"pass(word)?|secret|reset_code|^code$|api[-_]?key|cookie", re.IGNORECASE)
+TOKEN_FIELDS = ("access_token", "refresh_token", "token")
+SECRET_PLACEHOLDER = re.compile(r"^<secret:(\d+):(\d+):([Aa9#]*)>$")
+CHARACTER_CLASSES = {"A": "ABCDEFGHJKLMNPQRSTUVWXYZ", "a": "abcdefghijkmnopqrstuvwxyz", "9": "23456789", "#": "@#$%&*!?"}
+
+
+def secret_shape(value: str) -> str:
+    """Length and character classes of a secret, so a replay can send one that passes or fails validation alike"""
+    classes = "".join(symbol for symbol, test in (("A", str.isupper), ("a", str.islower), ("9", str.isdigit))
+                      if any(test(c) for c in value))
+    if any(not c.isalnum() for c in value):
+        classes += "#"
+    return f"{len(value)}:{classes}"
+
+
+def make_secret(length: int, classes: str) -> str:
+    """A random value of the given length using exactly the given character classes"""
+    classes = classes or "a"
+    chars = [secrets.choice(CHARACTER_CLASSES[symbol]) for symbol in classes]
+    chars += [secrets.choice(CHARACTER_CLASSES[classes[0]]) for _ in range(length - len(chars))]
+    return "".join(chars[:length])
+
+
+class TrafficRecorder:
+    """Request hook that appends each request/response pair to a gzip'd JSON-lines capture
+
+    Captures are shared and kept, so nothing that works as a credential is written. Password-like
+    fields become <secret:N:length:classes> placeholders: equal values get the same N, so a replayed
+    login still matches its registration, and a weak password is replayed as a weak one. Bearer
+    tokens become tok-N aliases that the replayer maps to the tokens it is issued. Response bodies
+    are recorded with the same substitutions.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.origin: Optional[float] = None
+        self.closed = False
+        self.secrets: Dict[str, str] = {}  # Digest of a secret value -> its placeholder
+        self.tokens: Dict[str, str] = {}  # Digest of a token -> its alias
+        self.file.write(json.dumps({"version": CAPTURE_VERSION, "started": time.time()}) + "\n")
+        atexit.register(self.close)
+
+    def placeholder(self, names: Dict[str, str], value: str, template: str) -> str:
+        """Stable stand-in for a sensitive value; only a digest of the value is kept, to tell values apart"""
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()
+        with self.lock:
+            if digest not in names:
+                names[digest] = template.format(len(names) + 1)
+            return names[digest]
+
+    def token_alias(self, token: str) -> str:
+        return self.placeholder(self.tokens, token, "tok-{}")
+
+    def redact(self, value: Any) -> Any:
+        """A copy of a JSON body with secrets replaced by placeholders and tokens by their aliases"""
+        if isinstance(value, list):
+            return [self.redact(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        redacted = {}
+        for key, item in value.items():
+            if isinstance(item, str) and key in TOKEN_FIELDS:
+                redacted[key] = self.token_alias(item)
+            elif isinstance(item, str) and SECRET_FIELDS.search(key):
+                redacted[key] = self.placeholder(self.secrets, item, "<secret:{}:" + secret_shape(item) + ">")
+            else:
+                redacted[key] = self.redact(item)
+        return redacted
+
+    def __call__(self, record: Dict[str, Any]):
+        response = record["response"]
+        entry = {
+            "m": record["method"].upper(),
+            "e": record["endpoint"],
+            "s": response.status_code if response is not None else None,
+            "ms": round(record["elapsed"] * 1000, 2),
+            "b": self.body_size(record),
+        }
+        if record["data"] is not None:
+            entry["d"] = self.redact(record["data"])
+        authorization = record["headers"].get("Authorization", "")
+        if authorization.startswith("Bearer "):
+            entry["a"] = self.token_alias(authorization[7:])
+        extra_headers = {k: "<secret>" if SECRET_FIELDS.search(k) else v for k, v in record["headers"].items()
+                         if k not in ("Authorization", "Content-Type")}
+        if extra_headers:
+            entry["h"] = extra_headers
+        if record["error"] is not None:
+            entry["x"] = str(record["error"])
+        payload = self.response_body(record)
+        if payload is not None:
+            entry["r"] = payload
+        # Remember issued tokens and created ids so a replay can map them to fresh ones
+        if entry["m"] == "POST" and entry["s"] == 200 and isinstance(payload, dict):
+            if isinstance(payload.get("access_token"), str):
+                entry["tok"] = payload["access_token"]  # Already an alias
+            elif payload.get("id"):
+                entry["rid"] = payload["id"]
+
+        with self.lock:
+            if self.closed:
+                return
+            if self.origin is None:
+                self.origin = record["started"]
+            entry["t"] = round(record["started"] - self.origin, 4)
+            self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    @staticmethod
+    def body_size(record: Dict[str, Any]) -> int:
+        response = record["response"]
+        if response is None:
+            return 0
+        if record.get("stream"):
+            # Reading a streamed body here would consume it before the caller does
+            return int(response.headers.get("Content-Length") or 0)
+        return len(response.content)
+
+    def response_body(self, record: Dict[str, Any]) -> Any:
+        """The redacted response body, decoded if JSON; None for streamed, missing or oversized bodies"""
+        response = record["response"]
+        if response is None or record.get("stream") or not response.content:
+            return None
+        if len(response.content) > RESPONSE_BODY_LIMIT:
+            return None
+        try:
+            return self.redact(response.json())
+        except ValueError:
+            return response.text
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.file.close()
+
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield captured requests in order, skipping the header line"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version: {header.get('version')}")
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TrafficReplayer:
+    """Re-issue a capture against any base URL, preserving the inter-arrival pattern"""
+
+    def __init__(self, base_url: str, speed: float = 1.0, concurrency: int = REPLAY_CONCURRENCY,
+                 timeout: float = 30, credentials: Optional[Dict[str, str]] = None):
+        self.base_url = base_url.rstrip("/")
+        self.speed = speed  # 0 replays as fast as the concurrency limit allows
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+        # Tokens and ids issued during capture, mapped to the ones issued during replay
+        self.aliases: Dict[str, str] = {}
+        self.alias_events: Dict[str, threading.Event] = {}
+        self.issued = set()
+        self.lock = threading.Lock()
+        self.results: List[Dict[str, Any]] = []
+        # Passwords of accounts that already exist on the target, by email; other secrets are made up
+        self.credentials = credentials or {}
+        self.secrets: Dict[str, str] = {}
+        self.credentialed = set()  # Emails whose known password has been assigned to a placeholder
+
+    def secret(self, placeholder: str, email: Any) -> str:
+        """The value to send for a captured secret placeholder, the same one every time it recurs
+
+        The first secret captured with a known account's email is that account's password; later
+        different ones (e.g. a deliberately wrong password) get random values of the captured
+        length and character classes.
+        """
+        with self.lock:
+            if placeholder not in self.secrets:
+                if email in self.credentials and email not in self.credentialed:
+                    self.credentialed.add(email)
+                    self.secrets[placeholder] = self.credentials[email]
+                else:
+                    _, length, classes = SECRET_PLACEHOLDER.match(placeholder).groups()
+                    self.secrets[placeholder] = make_secret(int(length), classes)
+            return self.secrets[placeholder]
+
+    def unredact(self, value: Any) -> Any:
+        """A captured body with secret placeholders filled in and token aliases resolved"""
+        if isinstance(value, list):
+            return [self.unredact(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        filled = {}
+        for key, item in value.items():
+            if isinstance(item, str) and SECRET_PLACEHOLDER.match(item):
+                filled[key] = self.secret(item, value.get("email"))
+            elif isinstance(item, str) and key in TOKEN_FIELDS:
+                filled[key] = self.resolve(item)
+            else:
+                filled[key] = self.unredact(item)
+        return filled
+
+    def alias_event(self, captured: str) -> threading.Event:
+        with self.lock:
+            return self.alias_events.setdefault(captured, threading.Event())
+
+    def resolve(self, captured: str) -> str:
+        """Map a captured token or id to the replayed one, waiting for the request that issues it"""
+        if captured not in self.issued:
+            return captured
+        self.alias_event(captured).wait(ALIAS_WAIT_TIMEOUT)
+        return self.aliases.get(captured, captured)
+
+    def issue(self, entry: Dict[str, Any], scheduled: float, after: List[Any] = ()) -> Dict[str, Any]:
+        wait(after)
+        headers = {"Content-Type": "application/json"}
+        headers.update(entry.get("h", {}))
+        if "a" in entry:
+            headers["Authorization"] = f"Bearer {self.resolve(entry['a'])}"
+        endpoint = "/".join(self.resolve(segment) for segment in entry["e"].split("/"))
+
+        actual = time.perf_counter()
+        result = {"method": entry["m"], "endpoint": entry["e"], "captured_status": entry.get("s"),
+                  "captured_ms": entry.get("ms"), "lag_ms": (actual - scheduled) * 1000}
+        issued = entry.get("tok") or entry.get("rid")
+        try:
+            response = self.session.request(entry["m"], f"{self.base_url}{endpoint}",
+                                            json=self.unredact(entry.get("d")), headers=headers, timeout=self.timeout)
+            result["status"] = response.status_code
+            if issued and response.status_code == 200:
+                payload = response.json()
+                self.aliases[issued] = payload.get("access_token") or payload.get("id") or issued
+        except (requests.exceptions.RequestException, ValueError) as e:
+            result["status"] = None
+            result["error"] = str(e)
+        finally:
+            if issued:
+                self.alias_event(issued).set()
+        result["ms"] = (time.perf_counter() - actual) * 1000
+        with self.lock:
+            self.results.append(result)
+        return result
+
+    def replay(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Dispatch every entry at its captured offset divided by the speed factor
+
+        A request is also held until every request that had completed before it started during
+        capture has completed again, so a sequence like register-then-login stays in order when
+        the target is slower than the captured server.
+        """
+        self.issued = {entry.get("tok") or entry.get("rid") for entry in entries
+                       if entry.get("tok") or entry.get("rid")}
+        start = time.perf_counter()
+        in_flight: List[Any] = []  # (captured end offset, future) of replayed requests not yet done
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for entry in sorted(entries, key=lambda e: e["t"]):
+                scheduled = start + (entry["t"] / self.speed if self.speed else 0)
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                in_flight = [(end, future) for end, future in in_flight if not future.done()]
+                after = [future for end, future in in_flight if end <= entry["t"]]
+                future = pool.submit(self.issue, entry, scheduled, after)
+                in_flight.append((entry["t"] + (entry.get("ms") or 0) / 1000, future))
+        return self.results
+
+
+def summarize_replay(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Latency percentiles, scheduling lag and status mismatches for a replay"""
+    latencies = [r["ms"] for r in results]
+    return {
+        "requests": len(results),
+        "errors": sum(r["status"] is None for r in results),
+        "status_mismatches": sum(r["status"] != r["captured_status"] for r in results),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "captured_p99_ms": percentile([r["captured_ms"] or 0 for r in results], 0.99),
+        "max_lag_ms": max((r["lag_ms"] for r in results), default=0.0),
+    }
+
+
+def main():
+    """Replay a capture file against a base URL"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay captured API traffic")
+    parser.add_argument("capture", help="Capture file written with VIAN_CAPTURE_FILE")
+    parser.add_argument("--base-url", required=True, help="API base URL to replay against")
+    parser.add_argument("--speed", default="1", help="Time scale: 1, 10, ... or 'max'")
+    parser.add_argument("--concurrency", type=int, default=REPLAY_CONCURRENCY, help="Maximum requests in flight")
+    parser.add_argument("--credential", action="append", default=[], metavar="EMAIL=PASSWORD",
+                        help="Password of an account that already exists on the target, e.g. the admin")
+    args = parser.parse_args()
+
+    speed = 0.0 if args.speed == "max" else float(args.speed)
+    entries = list(read_capture(args.capture))
+
+    print("🔁 TRAFFIC REPLAY")
+    print("=" * 50)
+    print(f"   Capture: {args.capture} ({len(entries)} requests)")
+    print(f"   Target: {args.base_url}")
+    print(f"   Speed: {'max' if not speed else f'{speed:g}x'}")
+
+    started = time.perf_counter()
+    credentials = dict(spec.split("=", 1) for spec in args.credential)
+    results = TrafficReplayer(args.base_url, speed, args.concurrency, credentials=credentials).replay(entries)
+    summary = summarize_replay(results)
+
+    print(f"\n⏱️ Duration: {time.perf_counter() - started:.1f}s")
+    print(f"📊 Latency p50/p95/p99: {summary['p50_ms']:.0f}/{summary['p95_ms']:.0f}/{summary['p99_ms']:.0f}ms "
+          f"(captured p99 {summary['captured_p99_ms']:.0f}ms)")
+    print(f"🕒 Max scheduling lag: {summary['max_lag_ms']:.0f}ms")
+    print(f"⚠️ Status mismatches: {summary['status_mismatches']}")
+    print(f"❌ Errors: {summary['errors']}")
+    return summary
+
+
+if __name__ == "__main__":
+    main()